@@ -1,11 +1,24 @@
+import argparse
+import asyncio
 import os
 import shutil
 from pathlib import Path
 
 import uvicorn
+from loguru import logger
+from sqlalchemy.ext.asyncio import create_async_engine
 
+from planet_diseases_backend.db.partitions import maintain_partitions
+from planet_diseases_backend.db.utils import engine_options
 from planet_diseases_backend.gunicorn_runner import GunicornApplication
+from planet_diseases_backend.process import (
+    auto_threads_count,
+    auto_workers_count,
+    available_cpus,
+    memory_limit,
+)
 from planet_diseases_backend.settings import settings
+from planet_diseases_backend.startup_profile import profile_startup
 
 
 def set_multiproc_dir() -> None:
@@ -33,13 +46,108 @@ def set_multiproc_dir() -> None:
     )
 
 
+def set_shared_cache_dir() -> None:
+    """
+    Prepares directory for the cache shared between workers.
+
+    The cache file is removed on every start,
+    so workers never read values left by a previous run
+    or a file created with another slots layout.
+    """
+    shutil.rmtree(settings.shared_cache_dir, ignore_errors=True)
+    Path(settings.shared_cache_dir).mkdir(parents=True)
+
+
+def get_workers_count() -> int:
+    """
+    Resolves number of workers.
+
+    :return: number of workers from settings or
+        the one that fits available resources if it's set to "auto".
+    """
+    if settings.workers_count == "auto":
+        return auto_workers_count(settings.worker_memory_mb * 2**20)
+    return settings.workers_count
+
+
+def get_threads_count() -> int:
+    """
+    Resolves size of the thread pool of every worker.
+
+    :return: number of threads from settings or
+        the one that fits available CPUs if it's set to "auto".
+    """
+    if settings.threads_count == "auto":
+        return auto_threads_count()
+    return settings.threads_count
+
+
+async def run_partition_maintenance() -> None:
+    """Creates upcoming partitions and removes expired ones."""
+    engine = create_async_engine(str(settings.db_url), **engine_options())
+    try:
+        await maintain_partitions(engine)
+    finally:
+        await engine.dispose()
+
+
+def parse_args() -> argparse.Namespace:
+    """
+    Parses command line arguments.
+
+    :return: parsed arguments.
+    """
+    parser = argparse.ArgumentParser(prog="planet_diseases_backend")
+    parser.add_argument(
+        "--profile-startup",
+        action="store_true",
+        help="report import and application construction costs and exit",
+    )
+    parser.add_argument(
+        "--profile-lifespan",
+        action="store_true",
+        help="with --profile-startup, also run startup and shutdown events, "
+        "they connect to the configured database and change it",
+    )
+    parser.add_argument(
+        "--maintain-partitions",
+        action="store_true",
+        help="create upcoming partitions, drop expired ones and exit",
+    )
+    return parser.parse_args()
+
+
 def main() -> None:
     """Entrypoint of the application."""
+    args = parse_args()
+    if args.profile_startup:
+        profile_startup(lifespan=args.profile_lifespan)
+        return
+    if args.maintain_partitions:
+        asyncio.run(run_partition_maintenance())
+        return
     set_multiproc_dir()
+    set_shared_cache_dir()
+    workers = get_workers_count()
+    logger.info(
+        "Starting {} worker(s) ({} CPUs, {:.0f} MiB of memory available). "
+        "Threads per worker: {}. Max requests: {} (jitter {}). "
+        "Max RSS: {} MiB (jitter {}). Timeout: {}s, graceful timeout: {}s",
+        workers,
+        available_cpus(),
+        memory_limit() / 2**20,
+        get_threads_count(),
+        settings.worker_max_requests,
+        settings.worker_max_requests_jitter,
+        settings.worker_max_rss_mb,
+        settings.worker_max_rss_jitter_mb,
+        settings.worker_timeout,
+        settings.worker_graceful_timeout,
+    )
     if settings.reload:
         uvicorn.run(
             "planet_diseases_backend.web.application:get_app",
-            workers=settings.workers_count,
+            workers=workers,
             host=settings.host,
             port=settings.port,
             reload=settings.reload,
@@ -54,8 +162,13 @@ def main() -> None:
             "planet_diseases_backend.web.application:get_app",
             host=settings.host,
             port=settings.port,
-            workers=settings.workers_count,
+            workers=workers,
             factory=True,
+            preload_app=settings.preload,
+            max_requests=settings.worker_max_requests,
+            max_requests_jitter=settings.worker_max_requests_jitter,
+            timeout=settings.worker_timeout,
+            graceful_timeout=settings.worker_graceful_timeout,
             accesslog="-",
             loglevel=settings.log_level.value.lower(),
             access_log_format='%r "-" %s "-" %Tf',
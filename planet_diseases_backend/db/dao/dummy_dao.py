@@ -1,15 +1,24 @@
-from typing import List, Optional
+import re
+from typing import List, Optional, Tuple
 
 from fastapi import Depends
-from sqlalchemy import select
+from sqlalchemy import Row, func, lambda_stmt, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from planet_diseases_backend.db.dependencies import get_db_session
 from planet_diseases_backend.db.models.dummy_model import DummyModel
+from planet_diseases_backend.services.single_flight import coalesce
+
+_LIKE_SPECIAL = re.compile(r"[\\%_]")
 
 
 class DummyDAO:
-    """Class for accessing dummy table."""
+    """
+    Class for accessing dummy table.
+
+    Queries are lambda statements. They are built and compiled
+    only the first time, later calls just substitute parameters.
+    """
 
     def __init__(self, session: AsyncSession = Depends(get_db_session)) -> None:
         self.session = session
@@ -31,11 +40,40 @@ class DummyDAO:
         :return: stream of dummies.
         """
         raw_dummies = await self.session.execute(
-            select(DummyModel).limit(limit).offset(offset),
+            lambda_stmt(lambda: select(DummyModel).limit(limit).offset(offset)),
         )
 
         return list(raw_dummies.scalars().fetchall())
 
+    @coalesce("dummy_list")
+    async def get_dummy_rows(
+        self,
+        limit: int,
+        offset: int,
+    ) -> List["Row[Tuple[int, str]]"]:
+        """
+        Get ids and names of dummies with limit/offset pagination.
+
+        Concurrent calls with the same page share one query,
+        which runs in the session of one of the callers. So the result
+        is immutable rows, not entities attached to that session.
+        A caller may get a page read by another request, without its own
+        uncommitted changes, use :meth:`get_all_dummies` to see them.
+
+        :param limit: limit of dummies.
+        :param offset: offset of dummies.
+        :return: rows with id and name.
+        """
+        rows = await self.session.execute(
+            lambda_stmt(
+                lambda: select(DummyModel.id, DummyModel.name)
+                .order_by(DummyModel.id)
+                .limit(limit)
+                .offset(offset),
+            ),
+        )
+        return list(rows.all())
+
     async def filter(self, name: Optional[str] = None) -> List[DummyModel]:
         """
         Get specific dummy model.
@@ -43,8 +81,40 @@ class DummyDAO:
         :param name: name of dummy instance.
         :return: dummy models.
         """
-        query = select(DummyModel)
+        query = lambda_stmt(lambda: select(DummyModel))
         if name:
-            query = query.where(DummyModel.name == name)
+            query += lambda stmt: stmt.where(DummyModel.name == name)
         rows = await self.session.execute(query)
         return list(rows.scalars().fetchall())
+
+    async def search(
+        self,
+        query: str,
+        limit: int,
+        prefix: bool = False,
+    ) -> List[DummyModel]:
+        """
+        Search dummy models by a part of the name.
+
+        The search is case-insensitive and uses the trigram index.
+        Results are ranked by similarity of the name to the query.
+
+        :param query: part of the name.
+        :param limit: limit of dummies.
+        :param prefix: match only names that start with the query.
+        :return: dummies, most similar first.
+        """
+        escaped = _LIKE_SPECIAL.sub(r"\\\g<0>", query)
+        pattern = f"{escaped}%" if prefix else f"%{escaped}%"
+        rows = await self.session.execute(
+            lambda_stmt(
+                lambda: select(DummyModel)
+                .where(DummyModel.name.ilike(pattern, escape="\\"))
+                .order_by(
+                    func.similarity(DummyModel.name, query).desc(),
+                    DummyModel.name,
+                )
+                .limit(limit),
+            ),
+        )
+        return list(rows.scalars().fetchall())
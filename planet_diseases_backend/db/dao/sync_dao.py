@@ -0,0 +1,162 @@
+import uuid
+from datetime import timedelta
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from fastapi import Depends
+from sqlalchemy import (
+    ColumnElement,
+    Select,
+    String,
+    cast,
+    func,
+    literal_column,
+    null,
+    select,
+    text,
+    union_all,
+)
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from planet_diseases_backend.db.dependencies import get_readonly_session
+from planet_diseases_backend.db.models.dummy_model import DummyModel
+from planet_diseases_backend.db.models.sync_tombstone import SyncTombstone
+from planet_diseases_backend.db.models.usage_event import UsageEvent
+from planet_diseases_backend.services.stats import DIAGNOSIS
+
+
+class Change(NamedTuple):
+    """Changed or deleted row."""
+
+    seq: int
+    id: str
+    # None if the row is deleted.
+    data: Optional[Dict[str, Any]]
+
+
+class SyncDAO:
+    """
+    Class for reading changes of synced tables.
+
+    Changes are ordered by change sequences of their tables,
+    see :mod:`planet_diseases_backend.db.sync`.
+    """
+
+    def __init__(self, session: AsyncSession = Depends(get_readonly_session)) -> None:
+        self.session = session
+
+    async def catalogue_changes(self, since: int, limit: int) -> List[Change]:
+        """
+        Get changes of the catalogue after the sequence number.
+
+        Rows and tombstones are read with one statement,
+        so they come from the same snapshot.
+
+        :param since: the largest sequence number the client has.
+        :param limit: limit of changes.
+        :return: changes ordered by sequence numbers.
+        """
+        rows = select(
+            DummyModel.change_seq.label("seq"),
+            cast(DummyModel.id, String).label("id"),
+            func.jsonb_build_object(
+                "id",
+                DummyModel.id,
+                "name",
+                DummyModel.name,
+                type_=JSONB,
+            ).label("data"),
+        ).where(DummyModel.change_seq > since)
+        tombstones = select(
+            SyncTombstone.change_seq,
+            SyncTombstone.row_id,
+            null(),
+        ).where(
+            SyncTombstone.table_name == DummyModel.__tablename__,
+            SyncTombstone.change_seq > since,
+        )
+        changes = await self.session.execute(
+            union_all(rows, tombstones).order_by(literal_column("seq")).limit(limit),
+        )
+        return [Change(*change) for change in changes]
+
+    async def diagnosis_changes(
+        self,
+        user_id: uuid.UUID,
+        since: int,
+        limit: int,
+        max_delay: timedelta,
+    ) -> List[Change]:
+        """
+        Get new diagnoses of the user after the sequence number.
+
+        :param user_id: id of the user.
+        :param since: the largest sequence number the client has.
+        :param limit: limit of changes.
+        :param max_delay: maximum delay of writing events.
+        :return: changes ordered by sequence numbers.
+        """
+        query = self.diagnosis_query(user_id, since, limit, max_delay)
+        changes = await self.session.execute(query)
+        return [Change(*change) for change in changes]
+
+    @staticmethod
+    def diagnosis_query(
+        user_id: uuid.UUID,
+        since: int,
+        limit: int,
+        max_delay: timedelta,
+    ) -> "Select[Tuple[Optional[int], str, Any]]":
+        """
+        Build the query of :meth:`diagnosis_changes`.
+
+        The kind is rendered as a literal, so generic plans
+        of prepared statements can use the partial index.
+        Events are numbered when they are written, at most max_delay
+        after they are created. So newer diagnoses are created after
+        the client's last one minus max_delay, and older partitions
+        are pruned when the query runs.
+
+        :param user_id: id of the user.
+        :param since: the largest sequence number the client has.
+        :param limit: limit of changes.
+        :param max_delay: maximum delay of writing events.
+        :return: query of changes.
+        """
+        diagnosis: ColumnElement[str] = literal_column(f"'{DIAGNOSIS}'")
+        query = (
+            select(
+                UsageEvent.change_seq,
+                cast(UsageEvent.id, String),
+                func.jsonb_build_object(
+                    "id",
+                    UsageEvent.id,
+                    "created_at",
+                    UsageEvent.created_at,
+                    "payload",
+                    UsageEvent.payload,
+                    type_=JSONB,
+                ),
+            )
+            .where(
+                UsageEvent.user_id == user_id,
+                UsageEvent.kind == diagnosis,
+                UsageEvent.change_seq > since,
+            )
+            .order_by(UsageEvent.change_seq)
+            .limit(limit)
+        )
+        if since:
+            last = (
+                select(UsageEvent.created_at)
+                .where(
+                    UsageEvent.user_id == user_id,
+                    UsageEvent.kind == diagnosis,
+                    UsageEvent.change_seq == since,
+                )
+                .scalar_subquery()
+            )
+            # The last diagnosis may be expired already.
+            start = func.coalesce(last, text("'-infinity'::timestamptz"))
+            query = query.where(UsageEvent.created_at >= start - max_delay)
+        return query
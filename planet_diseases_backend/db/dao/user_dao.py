@@ -0,0 +1,112 @@
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from fastapi import Depends
+from sqlalchemy import Select, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from planet_diseases_backend.db.dependencies import get_db_session
+from planet_diseases_backend.db.models.users import User, email_key
+
+# Greatest code point, its UTF-8 encoding is bytewise greater
+# than encodings of all other characters.
+_MAX_CHAR = chr(0x10FFFF)
+
+
+class UserDAO:
+    """
+    Class for searching and importing users.
+
+    Emails are matched by :data:`email_key`,
+    so lookups use email key indexes.
+    """
+
+    def __init__(self, session: AsyncSession = Depends(get_db_session)) -> None:
+        self.session = session
+
+    async def search(
+        self,
+        email: Optional[str] = None,
+        is_active: Optional[bool] = None,
+        is_verified: Optional[bool] = None,
+        after: Optional[str] = None,
+        limit: int = 50,
+    ) -> List[User]:
+        """
+        Find users ordered by lowercased email.
+
+        :param email: case-insensitive prefix of emails.
+        :param is_active: required value of is_active.
+        :param is_verified: required value of is_verified.
+        :param after: lowercased email of the last user of the previous page.
+        :param limit: limit of users.
+        :return: users.
+        """
+        query = self.search_query(email, is_active, is_verified, after, limit)
+        rows = await self.session.execute(query)
+        return list(rows.scalars().fetchall())
+
+    @staticmethod
+    def search_query(
+        email: Optional[str] = None,
+        is_active: Optional[bool] = None,
+        is_verified: Optional[bool] = None,
+        after: Optional[str] = None,
+        limit: int = 50,
+    ) -> "Select[Tuple[User]]":
+        """
+        Build the query of :meth:`search`.
+
+        Flags are rendered as literal conditions, so the planner
+        can match them with the partial index of pending users.
+
+        :param email: case-insensitive prefix of emails.
+        :param is_active: required value of is_active.
+        :param is_verified: required value of is_verified.
+        :param after: lowercased email of the last user of the previous page.
+        :param limit: limit of users.
+        :return: query of users.
+        """
+        columns = User.__table__.c
+        query = select(User).order_by(email_key).limit(limit)
+        if email:
+            prefix = email.lower()
+            query = query.where(email_key >= prefix, email_key <= prefix + _MAX_CHAR)
+        if after is not None:
+            query = query.where(email_key > after.lower())
+        if is_active is not None:
+            query = query.where(columns.is_active if is_active else ~columns.is_active)
+        if is_verified is not None:
+            query = query.where(
+                columns.is_verified if is_verified else ~columns.is_verified,
+            )
+        return query
+
+    async def existing_emails(self, emails: List[str]) -> Set[str]:
+        """
+        Find which emails are taken.
+
+        :param emails: lowercased emails.
+        :return: lowercased emails of existing users.
+        """
+        rows = await self.session.execute(
+            select(email_key).where(email_key.in_(emails)),
+        )
+        return set(rows.scalars())
+
+    async def insert_many(self, users: List[Dict[str, Any]]) -> int:
+        """
+        Insert users in one statement, skipping taken emails.
+
+        :param users: values of user columns.
+        :return: number of inserted users.
+        """
+        if not users:
+            return 0
+        rows = await self.session.execute(
+            insert(User)
+            .on_conflict_do_nothing(index_elements=["email"])
+            .returning(User.__table__.c.id),
+            users,
+        )
+        return len(rows.all())
@@ -1,14 +1,75 @@
-from typing import AsyncGenerator
+"""
+Database sessions for request handlers.
 
-from sqlalchemy.ext.asyncio import AsyncSession
-from starlette.requests import Request
+There are two session profiles:
 
+* :func:`get_db_session` is read-write. Changes are flushed
+  automatically and committed when the request is handled.
+* :func:`get_readonly_session` runs read-only transactions
+  without autoflush and is never committed.
+  Large listings should select columns instead of entities there,
+  because rows are not tracked by the identity map.
+"""
 
-async def get_db_session(request: Request) -> AsyncGenerator[AsyncSession, None]:
+from typing import Any, AsyncGenerator
+
+from loguru import logger
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
+from sqlalchemy.orm import Session
+from starlette.requests import HTTPConnection
+
+from planet_diseases_backend.settings import settings
+
+
+def readonly_sessionmaker(engine: AsyncEngine) -> async_sessionmaker[AsyncSession]:
+    """
+    Create factory of read-only sessions.
+
+    :param engine: database engine.
+    :return: session factory.
+    """
+    return async_sessionmaker(
+        engine.execution_options(postgresql_readonly=True),
+        autoflush=False,
+        expire_on_commit=False,
+    )
+
+
+@event.listens_for(Session, "loaded_as_persistent")
+@event.listens_for(Session, "pending_to_persistent")
+def _count_tracked(session: Session, instance: Any) -> None:
+    # The identity map holds weak references, so it can't show
+    # how many objects were tracked once the handler returns.
+    session.info["tracked"] = session.info.get("tracked", 0) + 1
+
+
+def check_identity_map(request: HTTPConnection, session: AsyncSession) -> None:
+    """
+    Warn if the session tracked more objects than db_identity_map_limit.
+
+    :param request: current request or websocket.
+    :param session: session of the request.
+    """
+    limit = settings.db_identity_map_limit
+    tracked = session.info.get("tracked", 0)
+    if limit and tracked > limit:
+        logger.warning(
+            "{} {} tracked {} objects in its session, "
+            "select columns in a read-only session instead",
+            request.scope.get("method", "WEBSOCKET"),
+            request.url.path,
+            tracked,
+        )
+
+
+async def get_db_session(
+    request: HTTPConnection,
+) -> AsyncGenerator[AsyncSession, None]:
     """
     Create and get database session.
 
-    :param request: current request.
+    :param request: current request or websocket.
     :yield: database session.
     """
     session: AsyncSession = request.app.state.db_session_factory()
@@ -16,5 +77,25 @@ async def get_db_session(request: Request) -> AsyncGenerator[AsyncSession, None]
     try:
         yield session
     finally:
+        check_identity_map(request, session)
         await session.commit()
         await session.close()
+
+
+async def get_readonly_session(
+    request: HTTPConnection,
+) -> AsyncGenerator[AsyncSession, None]:
+    """
+    Create and get read-only database session.
+
+    :param request: current request or websocket.
+    :yield: database session, writes fail.
+    """
+    session: AsyncSession = request.app.state.db_readonly_session_factory()
+
+    try:
+        yield session
+    finally:
+        check_identity_map(request, session)
+        # There is nothing to commit, the transaction is just ended.
+        await session.close()
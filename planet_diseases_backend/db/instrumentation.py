@@ -0,0 +1,296 @@
+"""
+Query timing for SQLAlchemy engines.
+
+Hooks are attached to the sync core of an async engine.
+Every statement is timed, its duration is added to the ``db`` stage
+of the current request and observed in a histogram
+labeled by the statement fingerprint. The normalized statement
+of every fingerprint is logged once per process, labels
+with statements would make the number of series unbounded.
+
+Statements slower than ``db_slow_query_ms`` are logged
+with shapes of their parameters, never with the values.
+Outside of production, their plans can be logged as well.
+
+Hits of SQLAlchemy's compiled cache and of the asyncpg
+prepared statement cache are counted, so it's visible
+whether hot queries skip compilation and planning.
+"""
+
+import hashlib
+import re
+import time
+from typing import Any, List, Set
+
+from loguru import logger
+from prometheus_client import Counter, Histogram
+from sqlalchemy import event
+from sqlalchemy.engine import Connection, ExecutionContext
+from sqlalchemy.engine.interfaces import CacheStats
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from planet_diseases_backend.request_stats import (
+    RequestStats,
+    current_request_stats,
+    record_stage,
+)
+from planet_diseases_backend.settings import settings
+
+QUERY_DURATION = Histogram(
+    "db_query_duration_seconds",
+    "Time spent executing SQL statements.",
+    ["fingerprint"],
+)
+
+COMPILED_CACHE = Counter(
+    "db_compiled_cache_total",
+    "Lookups of compiled statements in SQLAlchemy cache.",
+    ["result"],
+)
+PREPARED_STATEMENT_CACHE = Counter(
+    "db_prepared_statement_cache_total",
+    "Lookups of prepared statements in connection cache.",
+    ["result"],
+)
+
+_COMPILED_CACHE_RESULTS = {
+    CacheStats.CACHE_HIT: "hit",
+    CacheStats.CACHE_MISS: "miss",
+    CacheStats.CACHING_DISABLED: "disabled",
+    CacheStats.NO_CACHE_KEY: "no_key",
+    CacheStats.NO_DIALECT_SUPPORT: "unsupported",
+}
+
+# Fingerprints whose statements are already logged by this process.
+_LOGGED_FINGERPRINTS: Set[str] = set()
+_MAX_LOGGED_FINGERPRINTS = 10_000
+_STARTED_KEY = "query_started"
+_PRODUCTION_ENVIRONMENTS = frozenset(("prod", "production"))
+
+_WHITESPACE = re.compile(r"\s+")
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"\$\d+|%\(\w+\)s|(?<![:\w]):\w+|\?")
+# asyncpg dialect casts expanded parameters, e.g. IN ($1::VARCHAR, $2::VARCHAR).
+_PLACEHOLDER_LIST = re.compile(
+    r"\(\s*\?(?:::\w+(?:\[\])?)?(?:\s*,\s*\?(?:::\w+(?:\[\])?)?)*\s*\)",
+)
+# Rows of multi-row VALUES, their number depends on the batch.
+_ROW_LIST = re.compile(r"\(\?\)(?:\s*,\s*\(\?\))+")
+
+
+def normalize_statement(statement: str) -> str:
+    """
+    Normalizes SQL statement.
+
+    Literals and bind parameters are replaced with ``?``
+    and lists of parameters and rows are collapsed,
+    so statements that differ only by values look the same.
+
+    :param statement: SQL statement.
+    :return: normalized statement.
+    """
+    statement = _STRING_LITERAL.sub("?", statement)
+    statement = _PLACEHOLDER.sub("?", statement)
+    statement = _NUMBER_LITERAL.sub("?", statement)
+    statement = _PLACEHOLDER_LIST.sub("(?)", statement)
+    statement = _ROW_LIST.sub("(?)", statement)
+    return _WHITESPACE.sub(" ", statement).strip()
+
+
+def fingerprint(statement: str) -> str:
+    """
+    Short stable identifier of a normalized statement.
+
+    :param statement: normalized statement.
+    :return: hexadecimal fingerprint.
+    """
+    return hashlib.blake2b(statement.encode("utf-8"), digest_size=6).hexdigest()
+
+
+def parameters_shape(parameters: Any) -> Any:
+    """
+    Describes bind parameters without their values.
+
+    :param parameters: parameters of a statement.
+    :return: types of parameters with the same structure.
+    """
+    if isinstance(parameters, dict):
+        return {key: parameters_shape(value) for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        if len(parameters) > 3 and all(
+            isinstance(item, (list, tuple, dict)) for item in parameters
+        ):
+            # executemany: describe only the first row.
+            return [parameters_shape(parameters[0]), f"... {len(parameters)} rows"]
+        return [parameters_shape(value) for value in parameters]
+    return type(parameters).__name__
+
+
+def _explain(conn: Connection, statement: str, parameters: Any) -> List[str]:
+    """
+    Gets actual execution plan of the statement.
+
+    EXPLAIN ANALYZE runs the statement again, so it's used only for SELECTs.
+    It's wrapped in a savepoint, so a failure doesn't abort
+    the transaction of the request.
+
+    :param conn: connection that executed the statement.
+    :param statement: SQL statement.
+    :param parameters: parameters of the statement.
+    :return: lines of the plan.
+    """
+    cursor = conn.connection.cursor()
+    try:
+        cursor.execute("SAVEPOINT explain_slow_query")
+        try:
+            cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS) {statement}", parameters)
+            plan = [row[0] for row in cursor.fetchall()]
+        except Exception:
+            cursor.execute("ROLLBACK TO SAVEPOINT explain_slow_query")
+            raise
+        cursor.execute("RELEASE SAVEPOINT explain_slow_query")
+    finally:
+        cursor.close()
+    return plan
+
+
+def _should_explain(statement: str) -> bool:
+    return (
+        settings.db_explain_slow_queries
+        and settings.environment not in _PRODUCTION_ENVIRONMENTS
+        and statement.lstrip().upper().startswith("SELECT")
+    )
+
+
+def _log_slow_query(
+    conn: Connection,
+    statement: str,
+    parameters: Any,
+    elapsed: float,
+) -> None:
+    normalized = normalize_statement(statement)
+    logger.warning(
+        "Slow query {} ({:.1f} ms): {} Parameters: {}",
+        fingerprint(normalized),
+        elapsed * 1000,
+        normalized,
+        parameters_shape(parameters),
+    )
+    if not _should_explain(statement):
+        return
+    try:
+        plan = _explain(conn, statement, parameters)
+    except Exception as exc:
+        logger.warning("Cannot explain slow query: {}", exc)
+        return
+    logger.warning("Plan of the slow query:\n{}", "\n".join(plan))
+
+
+def report_repeated_queries(stats: RequestStats, handler: str) -> None:
+    """
+    Logs statements repeated too many times during a request.
+
+    :param stats: statistics of the finished request.
+    :param handler: path of the request handler.
+    """
+    threshold = settings.db_repeated_query_threshold
+    if threshold <= 0:
+        return
+    for statement, count in stats.repeated_queries(threshold):
+        logger.warning(
+            "Possible N+1 in {}: statement executed {} times: {}",
+            handler,
+            count,
+            statement,
+        )
+
+
+def _count_cache_hits(
+    conn: Connection,
+    statement: str,
+    context: ExecutionContext,
+    executemany: bool,
+) -> None:
+    """
+    Counts hits of compiled and prepared statement caches.
+
+    asyncpg adapter of SQLAlchemy keeps prepared statements
+    in a per-connection LRU keyed by SQL. It's checked before
+    the statement is prepared, so a hit means Postgres doesn't parse
+    and plan the statement again. executemany doesn't use this cache.
+
+    :param conn: connection that executes the statement.
+    :param statement: SQL statement.
+    :param context: execution context.
+    :param executemany: whether many parameter sets are executed.
+    """
+    cache_hit = getattr(context, "cache_hit", CacheStats.NO_CACHE_KEY)
+    COMPILED_CACHE.labels(_COMPILED_CACHE_RESULTS[cache_hit]).inc()
+    if executemany:
+        return
+    dbapi_connection: Any = conn.connection.dbapi_connection
+    if not hasattr(dbapi_connection, "_prepared_statement_cache"):
+        return
+    cache = dbapi_connection._prepared_statement_cache  # noqa: SLF001
+    if cache is None:
+        PREPARED_STATEMENT_CACHE.labels("disabled").inc()
+    else:
+        PREPARED_STATEMENT_CACHE.labels("hit" if statement in cache else "miss").inc()
+
+
+def _before_cursor_execute(
+    conn: Connection,
+    cursor: Any,
+    statement: str,
+    parameters: Any,
+    context: ExecutionContext,
+    executemany: bool,
+) -> None:
+    _count_cache_hits(conn, statement, context, executemany)
+    conn.info.setdefault(_STARTED_KEY, []).append(time.perf_counter())
+
+
+def _after_cursor_execute(
+    conn: Connection,
+    cursor: Any,
+    statement: str,
+    parameters: Any,
+    context: ExecutionContext,
+    executemany: bool,
+) -> None:
+    elapsed = time.perf_counter() - conn.info[_STARTED_KEY].pop()
+    normalized = normalize_statement(statement)
+    statement_fingerprint = fingerprint(normalized)
+    QUERY_DURATION.labels(statement_fingerprint).observe(elapsed)
+    if (
+        statement_fingerprint not in _LOGGED_FINGERPRINTS
+        and len(_LOGGED_FINGERPRINTS) < _MAX_LOGGED_FINGERPRINTS
+    ):
+        _LOGGED_FINGERPRINTS.add(statement_fingerprint)
+        logger.info("Query fingerprint {}: {}", statement_fingerprint, normalized)
+    stats = current_request_stats()
+    if stats is not None:
+        stats.add("db", elapsed)
+        stats.add_query(statement_fingerprint, normalized)
+    if 0 < settings.db_slow_query_ms <= elapsed * 1000:
+        _log_slow_query(conn, statement, parameters, elapsed)
+
+
+def _handle_error(exception_context: Any) -> None:
+    connection = exception_context.connection
+    if connection is not None and connection.info.get(_STARTED_KEY):
+        elapsed = time.perf_counter() - connection.info[_STARTED_KEY].pop()
+        record_stage("db", elapsed)
+
+
+def instrument_engine(engine: AsyncEngine) -> None:
+    """
+    Attaches timing hooks to the engine.
+
+    :param engine: async engine.
+    """
+    sync_engine = engine.sync_engine
+    event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(sync_engine, "handle_error", _handle_error)
@@ -1,11 +1,15 @@
 import asyncio
 from logging.config import fileConfig
+from typing import Any, Optional
 
 from alembic import context
 from sqlalchemy.ext.asyncio.engine import create_async_engine
 from sqlalchemy.future import Connection
+from sqlalchemy.sql import visitors
+from sqlalchemy.sql.elements import CollationClause
 from planet_diseases_backend.db.meta import meta
 from planet_diseases_backend.db.models import load_all_models
+from planet_diseases_backend.db.partitions import is_partition
 from planet_diseases_backend.settings import settings
 
 # this is the Alembic Config object, which provides
@@ -31,6 +35,55 @@ target_metadata = meta
 # ... etc.
 
 
+def _is_collated(index: Any) -> bool:
+    """
+    Checks whether expressions of the index specify a collation.
+
+    Reflection loses collations of index expressions,
+    so such indexes would always look changed.
+
+    :param index: index from models.
+    :return: True if the index can't be compared.
+    """
+    return any(
+        isinstance(element, CollationClause)
+        for expression in index.expressions
+        for element in visitors.iterate(expression)
+    )
+
+
+def include_object(
+    obj: Any,
+    name: Optional[str],
+    type_: str,
+    reflected: bool,
+    compare_to: Any,
+) -> bool:
+    """
+    Excludes partitions and collated expression indexes from autogenerate.
+
+    Partitions are created by partition maintenance,
+    so they don't have models. Collated expression indexes
+    are still created when they are added to models.
+
+    :param obj: schema item.
+    :param name: name of the item.
+    :param type_: type of the item.
+    :param reflected: whether the item is reflected from the database.
+    :param compare_to: model item it's compared to.
+    :return: False for partitions, their indexes and existing
+        collated expression indexes.
+    """
+    if type_ == "table":
+        return not is_partition(str(name))
+    if type_ == "index":
+        model_index = compare_to if reflected else obj
+        if compare_to is not None and _is_collated(model_index):
+            return False
+        return not is_partition(obj.table.name)
+    return True
+
+
 async def run_migrations_offline() -> None:
     """Run migrations in 'offline' mode.
 
@@ -46,6 +99,7 @@ async def run_migrations_offline() -> None:
     context.configure(
         url=str(settings.db_url),
         target_metadata=target_metadata,
+        include_object=include_object,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
     )
@@ -60,7 +114,11 @@ def do_run_migrations(connection: Connection) -> None:
 
     :param connection: connection to the database.
     """
-    context.configure(connection=connection, target_metadata=target_metadata)
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        include_object=include_object,
+    )
 
     with context.begin_transaction():
         context.run_migrations()
@@ -0,0 +1,53 @@
+"""Added name indexes to dummy model.
+
+Revision ID: 4c1e7a9d2f3b
+Revises: 52fa111a7a49
+Create Date: 2026-10-19 09:12:41.518204
+
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "4c1e7a9d2f3b"
+down_revision = "52fa111a7a49"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    # Indexes are built concurrently, so the table stays writable.
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_dummy_model_name",
+            "dummy_model",
+            ["name"],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.create_index(
+            "ix_dummy_model_name_trgm",
+            "dummy_model",
+            ["name"],
+            postgresql_using="gin",
+            postgresql_ops={"name": "gin_trgm_ops"},
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_dummy_model_name_trgm",
+            table_name="dummy_model",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+        op.drop_index(
+            "ix_dummy_model_name",
+            table_name="dummy_model",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
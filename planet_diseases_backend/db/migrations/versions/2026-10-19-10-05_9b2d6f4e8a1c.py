@@ -0,0 +1,45 @@
+"""Created usage event table.
+
+Revision ID: 9b2d6f4e8a1c
+Revises: 4c1e7a9d2f3b
+Create Date: 2026-10-19 10:05:17.203947
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = "9b2d6f4e8a1c"
+down_revision = "4c1e7a9d2f3b"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "usage_event",
+        sa.Column("id", sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.Column("kind", sa.String(length=32), nullable=False),
+        sa.Column("user_id", sa.Uuid(), nullable=True),
+        sa.Column("payload", postgresql.JSONB(), nullable=True),
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        "ix_usage_event_created_at",
+        "usage_event",
+        ["created_at"],
+        postgresql_using="brin",
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_usage_event_created_at", table_name="usage_event")
+    op.drop_table("usage_event")
@@ -0,0 +1,113 @@
+"""Partitioned usage event table by month.
+
+Revision ID: d7a3c5e1b9f2
+Revises: 9b2d6f4e8a1c
+Create Date: 2026-10-19 11:40:52.664190
+
+"""
+
+from datetime import date, datetime, timezone
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "d7a3c5e1b9f2"
+down_revision = "9b2d6f4e8a1c"
+branch_labels = None
+depends_on = None
+
+# Partitions for this many months ahead are created right away,
+# later ones are created by partition maintenance.
+PREMAKE_MONTHS = 3
+
+
+def _add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _create_partitions() -> None:
+    """Creates partitions for existing events and the next months."""
+    now = datetime.now(timezone.utc)
+    first = (
+        op.get_bind()
+        .execute(
+            sa.text("SELECT min(created_at) FROM usage_event_old"),
+        )
+        .scalar()
+    )
+    month = date((first or now).year, (first or now).month, 1)
+    last = _add_months(date(now.year, now.month, 1), PREMAKE_MONTHS)
+    while month <= last:
+        op.execute(
+            f"CREATE TABLE usage_event_p{month:%Y%m} PARTITION OF usage_event "
+            f"FOR VALUES FROM ('{month} 00:00:00+00') "
+            f"TO ('{_add_months(month, 1)} 00:00:00+00')",
+        )
+        month = _add_months(month, 1)
+
+
+def upgrade() -> None:
+    op.rename_table("usage_event", "usage_event_old")
+    op.execute(
+        "ALTER TABLE usage_event_old "
+        "RENAME CONSTRAINT usage_event_pkey TO usage_event_old_pkey",
+    )
+    op.execute(
+        "ALTER INDEX ix_usage_event_created_at "
+        "RENAME TO ix_usage_event_old_created_at",
+    )
+    op.execute("ALTER SEQUENCE usage_event_id_seq OWNED BY NONE")
+    op.execute(
+        "CREATE TABLE usage_event ("
+        "id BIGINT DEFAULT nextval('usage_event_id_seq') NOT NULL, "
+        "kind VARCHAR(32) NOT NULL, "
+        "user_id UUID, "
+        "payload JSONB, "
+        "created_at TIMESTAMP WITH TIME ZONE DEFAULT now() NOT NULL, "
+        "PRIMARY KEY (id, created_at)"
+        ") PARTITION BY RANGE (created_at)",
+    )
+    op.execute("ALTER SEQUENCE usage_event_id_seq OWNED BY usage_event.id")
+    op.create_index(
+        "ix_usage_event_created_at",
+        "usage_event",
+        ["created_at"],
+        postgresql_using="brin",
+    )
+    _create_partitions()
+    op.execute(
+        "INSERT INTO usage_event (id, kind, user_id, payload, created_at) "
+        "SELECT id, kind, user_id, payload, created_at FROM usage_event_old",
+    )
+    op.drop_table("usage_event_old")
+
+
+def downgrade() -> None:
+    op.rename_table("usage_event", "usage_event_old")
+    op.execute("ALTER SEQUENCE usage_event_id_seq OWNED BY NONE")
+    op.execute(
+        "CREATE TABLE usage_event_plain ("
+        "id BIGINT DEFAULT nextval('usage_event_id_seq') NOT NULL, "
+        "kind VARCHAR(32) NOT NULL, "
+        "user_id UUID, "
+        "payload JSONB, "
+        "created_at TIMESTAMP WITH TIME ZONE DEFAULT now() NOT NULL"
+        ")",
+    )
+    op.execute(
+        "INSERT INTO usage_event_plain (id, kind, user_id, payload, created_at) "
+        "SELECT id, kind, user_id, payload, created_at FROM usage_event_old",
+    )
+    # Partitions and their indexes are dropped with the parent table.
+    op.drop_table("usage_event_old")
+    op.rename_table("usage_event_plain", "usage_event")
+    op.create_primary_key("usage_event_pkey", "usage_event", ["id"])
+    op.execute("ALTER SEQUENCE usage_event_id_seq OWNED BY usage_event.id")
+    op.create_index(
+        "ix_usage_event_created_at",
+        "usage_event",
+        ["created_at"],
+        postgresql_using="brin",
+    )
@@ -0,0 +1,54 @@
+"""Added email key indexes to user table.
+
+Revision ID: 5e8b2c4f7a61
+Revises: d7a3c5e1b9f2
+Create Date: 2026-10-19 12:30:17.904512
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "5e8b2c4f7a61"
+down_revision = "d7a3c5e1b9f2"
+branch_labels = None
+depends_on = None
+
+EMAIL_KEY = sa.text('(lower(email) COLLATE "C")')
+
+
+def upgrade() -> None:
+    # Indexes are built concurrently, so users can still sign up.
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_user_email_key",
+            "user",
+            [EMAIL_KEY],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.create_index(
+            "ix_user_pending_email_key",
+            "user",
+            [EMAIL_KEY],
+            postgresql_where=sa.text("NOT is_active OR NOT is_verified"),
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_user_pending_email_key",
+            table_name="user",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+        op.drop_index(
+            "ix_user_email_key",
+            table_name="user",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
@@ -0,0 +1,64 @@
+"""Added diagnosis_stats table.
+
+Revision ID: 027b027e89cf
+Revises: 5e8b2c4f7a61
+Create Date: 2026-10-19 13:20:35.587764
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "027b027e89cf"
+down_revision = "5e8b2c4f7a61"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "diagnosis_stats",
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("crop", sa.String(length=64), nullable=False),
+        sa.Column("disease", sa.String(length=64), nullable=False),
+        sa.Column("region", sa.String(length=64), nullable=False),
+        sa.Column("count", sa.BigInteger(), nullable=False),
+        sa.Column(
+            "updated_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.PrimaryKeyConstraint("day", "crop", "disease", "region"),
+    )
+    op.create_index(
+        "ix_diagnosis_stats_updated_at",
+        "diagnosis_stats",
+        ["updated_at"],
+        unique=False,
+    )
+    # Diagnoses recorded before are counted once here,
+    # the event recorder keeps counters up to date from now on.
+    op.execute(
+        """
+        INSERT INTO diagnosis_stats (day, crop, disease, region, count)
+        SELECT day, crop, disease, region, count(*)
+        FROM (
+            SELECT
+                (created_at AT TIME ZONE 'UTC')::date AS day,
+                left(lower(btrim(payload ->> 'crop')), 64) AS crop,
+                left(lower(btrim(payload ->> 'disease')), 64) AS disease,
+                left(lower(btrim(coalesce(payload ->> 'region', ''))), 64) AS region
+            FROM usage_event
+            WHERE kind = 'diagnosis' AND jsonb_typeof(payload) = 'object'
+        ) AS diagnoses
+        WHERE crop <> '' AND disease <> ''
+        GROUP BY day, crop, disease, region
+        """,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_diagnosis_stats_updated_at", table_name="diagnosis_stats")
+    op.drop_table("diagnosis_stats")
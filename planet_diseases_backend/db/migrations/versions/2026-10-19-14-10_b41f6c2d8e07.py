@@ -0,0 +1,162 @@
+"""Added change sequences for offline sync.
+
+Revision ID: b41f6c2d8e07
+Revises: 027b027e89cf
+Create Date: 2026-10-19 14:10:08.213377
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "b41f6c2d8e07"
+down_revision = "027b027e89cf"
+branch_labels = None
+depends_on = None
+
+FUNCTIONS = [
+    """
+    CREATE OR REPLACE FUNCTION sync_lock() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        PERFORM pg_advisory_xact_lock(hashtext(TG_ARGV[0]));
+        RETURN NULL;
+    END;
+    $$
+    """,
+    """
+    CREATE OR REPLACE FUNCTION sync_change_seq() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        NEW.change_seq := nextval(TG_ARGV[0]);
+        RETURN NEW;
+    END;
+    $$
+    """,
+    """
+    CREATE OR REPLACE FUNCTION sync_tombstone() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        INSERT INTO sync_tombstone (table_name, change_seq, row_id)
+        VALUES (TG_TABLE_NAME, nextval(TG_ARGV[0]), OLD.id::text);
+        RETURN NULL;
+    END;
+    $$
+    """,
+]
+
+
+def _add_change_seq(table: str, backfill: bool) -> None:
+    sequence = f"{table}_change_seq"
+    op.execute(f"CREATE SEQUENCE {sequence}")
+    op.add_column(table, sa.Column("change_seq", sa.BigInteger(), nullable=True))
+    if backfill:
+        # Existing rows are numbered once, in no particular order.
+        op.execute(f"UPDATE {table} SET change_seq = nextval('{sequence}')")
+        op.alter_column(table, "change_seq", nullable=False)
+
+
+def _create_triggers(table: str, deletes: bool) -> None:
+    sequence = f"{table}_change_seq"
+    operations = "INSERT OR UPDATE OR DELETE" if deletes else "INSERT"
+    row_operations = "INSERT OR UPDATE" if deletes else "INSERT"
+    op.execute(
+        f"CREATE TRIGGER {table}_sync_lock BEFORE {operations} ON {table} "
+        f"FOR EACH STATEMENT EXECUTE FUNCTION sync_lock('{sequence}')",
+    )
+    op.execute(
+        f"CREATE TRIGGER {table}_sync_seq BEFORE {row_operations} ON {table} "
+        f"FOR EACH ROW EXECUTE FUNCTION sync_change_seq('{sequence}')",
+    )
+    if deletes:
+        op.execute(
+            f"CREATE TRIGGER {table}_tombstone AFTER DELETE ON {table} "
+            f"FOR EACH ROW EXECUTE FUNCTION sync_tombstone('{sequence}')",
+        )
+
+
+def upgrade() -> None:
+    op.create_table(
+        "sync_tombstone",
+        sa.Column("table_name", sa.String(length=64), nullable=False),
+        sa.Column("change_seq", sa.BigInteger(), nullable=False),
+        sa.Column("row_id", sa.String(length=64), nullable=False),
+        sa.Column(
+            "deleted_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.PrimaryKeyConstraint("table_name", "change_seq"),
+    )
+    for function in FUNCTIONS:
+        op.execute(function)
+
+    # Writers are locked out while rows are numbered,
+    # so no change can be missed.
+    op.execute("LOCK TABLE dummy_model IN SHARE ROW EXCLUSIVE MODE")
+    _add_change_seq("dummy_model", backfill=True)
+    op.create_index(
+        "ix_dummy_model_change_seq",
+        "dummy_model",
+        ["change_seq"],
+        unique=True,
+    )
+    _create_triggers("dummy_model", deletes=True)
+
+    # Numbering every event would rewrite the whole table under a lock,
+    # so events recorded before this migration are never synced.
+    _add_change_seq("usage_event", backfill=False)
+    _create_triggers("usage_event", deletes=False)
+    # Indexes of partitioned tables can't be built concurrently. So the index
+    # is created for the table only, partitions created later get theirs
+    # automatically, and indexes of existing partitions are built concurrently
+    # and attached. The index becomes valid when all of them are attached.
+    op.execute(
+        "CREATE INDEX ix_usage_event_diagnosis_sync ON ONLY usage_event "
+        "(user_id, change_seq) WHERE kind = 'diagnosis'",
+    )
+    with op.get_context().autocommit_block():
+        partitions = op.get_bind().execute(
+            sa.text(
+                "SELECT child.relname FROM pg_inherits "
+                "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+                "WHERE pg_inherits.inhparent = 'usage_event'::regclass "
+                # Skip partitions created with the index meanwhile.
+                "AND NOT EXISTS (SELECT FROM pg_index "
+                "JOIN pg_inherits attached ON attached.inhrelid = indexrelid "
+                "WHERE indrelid = child.oid AND attached.inhparent "
+                "= 'ix_usage_event_diagnosis_sync'::regclass)",
+            ),
+        )
+        for (partition,) in partitions.all():
+            index = f"{partition}_diagnosis_sync_idx"
+            op.create_index(
+                index,
+                partition,
+                ["user_id", "change_seq"],
+                postgresql_where=sa.text("kind = 'diagnosis'"),
+                postgresql_concurrently=True,
+                if_not_exists=True,
+            )
+            op.execute(
+                f"ALTER INDEX ix_usage_event_diagnosis_sync ATTACH PARTITION {index}",
+            )
+
+
+def downgrade() -> None:
+    for table, triggers in (
+        ("usage_event", ("sync_lock", "sync_seq")),
+        ("dummy_model", ("sync_lock", "sync_seq", "tombstone")),
+    ):
+        for trigger in triggers:
+            op.execute(f"DROP TRIGGER {table}_{trigger} ON {table}")
+    op.drop_index("ix_usage_event_diagnosis_sync", table_name="usage_event")
+    op.drop_index("ix_dummy_model_change_seq", table_name="dummy_model")
+    for table in ("usage_event", "dummy_model"):
+        op.drop_column(table, "change_seq")
+        op.execute(f"DROP SEQUENCE {table}_change_seq")
+    for function in ("sync_lock", "sync_change_seq", "sync_tombstone"):
+        op.execute(f"DROP FUNCTION {function}()")
+    op.drop_table("sync_tombstone")
@@ -0,0 +1,33 @@
+from datetime import date, datetime
+
+from sqlalchemy import BigInteger, Date, DateTime, Index, String, func
+from sqlalchemy.orm import Mapped, mapped_column
+
+from planet_diseases_backend.db.base import Base
+
+
+class DiagnosisStats(Base):
+    """
+    Daily number of diagnoses by crop, disease and region.
+
+    Rows are incremented by the event recorder in the transaction
+    that writes diagnosis events, so they never disagree with events.
+    See :mod:`planet_diseases_backend.services.stats`.
+    """
+
+    __tablename__ = "diagnosis_stats"
+    __table_args__ = (
+        # Snapshots are refreshed with rows changed since the last refresh.
+        Index("ix_diagnosis_stats_updated_at", "updated_at"),
+    )
+
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    crop: Mapped[str] = mapped_column(String(length=64), primary_key=True)
+    disease: Mapped[str] = mapped_column(String(length=64), primary_key=True)
+    # Empty if the region is unknown, primary keys can't be null.
+    region: Mapped[str] = mapped_column(String(length=64), primary_key=True)
+    count: Mapped[int] = mapped_column(BigInteger)
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+    )
@@ -1,13 +1,41 @@
+from sqlalchemy import DDL, BigInteger, FetchedValue, Index, event
 from sqlalchemy.orm import Mapped, mapped_column
 from sqlalchemy.sql.sqltypes import String
 
 from planet_diseases_backend.db.base import Base
+from planet_diseases_backend.db.sync import track_changes
 
 
 class DummyModel(Base):
     """Model for demo purpose."""
 
     __tablename__ = "dummy_model"
+    __table_args__ = (
+        # Trigram index for substring and prefix search by name.
+        Index(
+            "ix_dummy_model_name_trgm",
+            "name",
+            postgresql_using="gin",
+            postgresql_ops={"name": "gin_trgm_ops"},
+        ),
+        Index("ix_dummy_model_change_seq", "change_seq", unique=True),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
-    name: Mapped[str] = mapped_column(String(length=200))
+    name: Mapped[str] = mapped_column(String(length=200), index=True)
+    # Set by triggers on every change, see db.sync.
+    change_seq: Mapped[int] = mapped_column(
+        BigInteger,
+        server_default=FetchedValue(),
+        server_onupdate=FetchedValue(),
+    )
+
+
+# Trigram operator classes come from pg_trgm extension.
+event.listen(
+    DummyModel.__table__,
+    "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm"),
+)
+
+track_changes(DummyModel)
@@ -0,0 +1,26 @@
+from datetime import datetime
+
+from sqlalchemy import BigInteger, DateTime, String, func
+from sqlalchemy.orm import Mapped, mapped_column
+
+from planet_diseases_backend.db.base import Base
+
+
+class SyncTombstone(Base):
+    """
+    Row deleted from a synced table.
+
+    Tombstones are written by triggers,
+    see :mod:`planet_diseases_backend.db.sync`.
+    """
+
+    __tablename__ = "sync_tombstone"
+
+    table_name: Mapped[str] = mapped_column(String(length=64), primary_key=True)
+    # Number from the change sequence of the table.
+    change_seq: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    row_id: Mapped[str] = mapped_column(String(length=64))
+    deleted_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+    )
@@ -0,0 +1,67 @@
+import uuid
+from datetime import datetime
+from typing import Any, Optional
+
+from sqlalchemy import (
+    BigInteger,
+    DateTime,
+    FetchedValue,
+    Index,
+    String,
+    Uuid,
+    func,
+    text,
+)
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import Mapped, mapped_column
+
+from planet_diseases_backend.db.base import Base
+from planet_diseases_backend.db.sync import track_changes
+
+
+class UsageEvent(Base):
+    """
+    Audit and usage event, such as login or diagnosis.
+
+    Events are written in batches by the event recorder,
+    never inside request transactions.
+
+    The table is partitioned by month of ``created_at``,
+    see :mod:`planet_diseases_backend.db.partitions`.
+    """
+
+    __tablename__ = "usage_event"
+    __table_args__ = (
+        # Events are appended in time order, so BRIN index is tiny and enough.
+        Index("ix_usage_event_created_at", "created_at", postgresql_using="brin"),
+        # Users sync their diagnosis history to field apps.
+        Index(
+            "ix_usage_event_diagnosis_sync",
+            "user_id",
+            "change_seq",
+            postgresql_where=text("kind = 'diagnosis'"),
+        ),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
+
+    # Primary key of a partitioned table must contain the partition key.
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+    kind: Mapped[str] = mapped_column(String(length=32))
+    user_id: Mapped[Optional[uuid.UUID]] = mapped_column(Uuid, nullable=True)
+    payload: Mapped[Optional[Any]] = mapped_column(JSONB, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        primary_key=True,
+        server_default=func.now(),
+    )
+    # Set by a trigger on insert, see db.sync.
+    # Events recorded before sync was added have none.
+    change_seq: Mapped[Optional[int]] = mapped_column(
+        BigInteger,
+        nullable=True,
+        server_default=FetchedValue(),
+    )
+
+
+# Events are never updated, expired ones are dropped with partitions.
+track_changes(UsageEvent, deletes=False)
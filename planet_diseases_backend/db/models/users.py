@@ -1,8 +1,9 @@
 # mypy: ignore-errors
 
 import uuid
+from typing import Optional
 
-from fastapi import Depends
+from fastapi import Depends, Request, Response
 from fastapi_users import BaseUserManager, FastAPIUsers, UUIDIDMixin, schemas
 from fastapi_users.authentication import (
     AuthenticationBackend,
@@ -10,10 +11,13 @@ from fastapi_users.authentication import (
     JWTStrategy,
 )
 from fastapi_users.db import SQLAlchemyBaseUserTableUUID, SQLAlchemyUserDatabase
+from sqlalchemy import Index, func, or_
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from planet_diseases_backend.db.base import Base
 from planet_diseases_backend.db.dependencies import get_db_session
+from planet_diseases_backend.request_stats import timed_dependency
+from planet_diseases_backend.services.events import record_event
 from planet_diseases_backend.settings import settings
 
 
@@ -21,6 +25,19 @@ class User(SQLAlchemyBaseUserTableUUID, Base):
     """Represents a user entity."""
 
 
+# Lowercased emails in "C" collation are ordered bytewise, so prefix
+# searches are plain range conditions that any query plan can use.
+email_key = func.lower(User.email).collate("C")
+
+Index("ix_user_email_key", email_key)
+# Admins mostly look for users that aren't active or verified yet.
+Index(
+    "ix_user_pending_email_key",
+    email_key,
+    postgresql_where=or_(~User.is_active, ~User.is_verified),
+)
+
+
 class UserRead(schemas.BaseUser[uuid.UUID]):
     """Represents a read command for a user."""
 
@@ -39,6 +56,21 @@ class UserManager(UUIDIDMixin, BaseUserManager[User, uuid.UUID]):
     reset_password_token_secret = settings.users_secret
     verification_token_secret = settings.users_secret
 
+    async def on_after_login(
+        self,
+        user: User,
+        request: Optional[Request] = None,
+        response: Optional[Response] = None,
+    ) -> None:
+        """
+        Records login event.
+
+        :param user: logged in user.
+        :param request: login request.
+        :param response: login response.
+        """
+        record_event(request, "login", user.id)
+
 
 async def get_user_db(
     session: AsyncSession = Depends(get_db_session),
@@ -86,4 +118,8 @@ backends = [
 
 api_users = FastAPIUsers[User, uuid.UUID](get_user_manager, backends)
 
-current_active_user = api_users.current_user(active=True)
+current_active_user = timed_dependency("auth", api_users.current_user(active=True))
+current_superuser = timed_dependency(
+    "auth",
+    api_users.current_user(active=True, superuser=True),
+)
@@ -0,0 +1,239 @@
+"""
+Maintenance of time-range partitioned tables.
+
+High-volume tables are partitioned by month on ``created_at``.
+Partitions are named ``<table>_pYYYYMM``. Maintenance creates
+partitions for the next months in advance, because a row
+without a matching partition can't be inserted, and removes
+partitions older than the retention period. Workers run it
+at startup and every ``partitions_maintenance_interval`` seconds,
+one worker at a time. Removing a partition
+is a cheap metadata change, unlike DELETE of millions of rows.
+
+Queries should filter by ``created_at``, so Postgres prunes
+partitions that can't contain matching rows.
+"""
+
+import asyncio
+import contextlib
+import re
+from datetime import date, datetime, timezone
+from typing import Dict, List, NamedTuple, Optional
+
+from loguru import logger
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+from planet_diseases_backend.settings import settings
+
+_PARTITION_NAME = re.compile(r"(\w+)_p(\d{4})(\d{2})")
+_LOCK = "partitions"
+
+
+class PartitionedTable(NamedTuple):
+    """Table partitioned by month."""
+
+    name: str
+    # Months to keep, 0 keeps partitions forever.
+    retention_months: int
+
+
+def partitioned_tables() -> List[PartitionedTable]:
+    """
+    Tables maintained by the partition maintenance.
+
+    :return: partitioned tables.
+    """
+    return [PartitionedTable("usage_event", settings.events_retention_months)]
+
+
+def month_start(moment: datetime) -> date:
+    """
+    First day of the month.
+
+    :param moment: any moment in the month.
+    :return: date of the first day.
+    """
+    return date(moment.year, moment.month, 1)
+
+
+def add_months(month: date, months: int) -> date:
+    """
+    Shifts the first day of the month.
+
+    :param month: first day of a month.
+    :param months: number of months, may be negative.
+    :return: first day of the shifted month.
+    """
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table: str, month: date) -> str:
+    """
+    Name of the partition for the month.
+
+    :param table: partitioned table.
+    :param month: first day of the month.
+    :return: partition name.
+    """
+    return f"{table}_p{month:%Y%m}"
+
+
+def is_partition(name: str) -> bool:
+    """
+    Checks if the table is a partition of a maintained table.
+
+    Partitions are not described by the models,
+    so migrations must not compare them.
+
+    :param name: table name.
+    :return: True for a monthly partition.
+    """
+    match = _PARTITION_NAME.fullmatch(name)
+    return match is not None and match[1] in {
+        table.name for table in partitioned_tables()
+    }
+
+
+async def create_partition(conn: AsyncConnection, table: str, month: date) -> None:
+    """
+    Creates the partition for the month if it doesn't exist.
+
+    :param conn: database connection.
+    :param table: partitioned table.
+    :param month: first day of the month.
+    """
+    await conn.execute(
+        text(
+            f'CREATE TABLE IF NOT EXISTS "{partition_name(table, month)}" '
+            f'PARTITION OF "{table}" '
+            f"FOR VALUES FROM ('{month} 00:00:00+00') "
+            f"TO ('{add_months(month, 1)} 00:00:00+00')",
+        ),
+    )
+
+
+class Partition(NamedTuple):
+    """Monthly partition of a table."""
+
+    name: str
+    # Concurrent detaching was interrupted, it must be finalized.
+    detach_pending: bool
+
+
+async def list_partitions(conn: AsyncConnection, table: str) -> Dict[date, Partition]:
+    """
+    Finds monthly partitions of the table.
+
+    :param conn: database connection.
+    :param table: partitioned table.
+    :return: partitions by their months.
+    """
+    rows = await conn.execute(
+        text(
+            "SELECT child.relname, pg_inherits.inhdetachpending FROM pg_inherits "
+            "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE parent.relname = :table",
+        ),
+        {"table": table},
+    )
+    partitions = {}
+    for name, detach_pending in rows:
+        match = _PARTITION_NAME.fullmatch(name)
+        if match and match[1] == table:
+            month = date(int(match[2]), int(match[3]), 1)
+            partitions[month] = Partition(name, detach_pending)
+    return partitions
+
+
+async def maintain_partitions(
+    engine: AsyncEngine,
+    now: Optional[datetime] = None,
+) -> bool:
+    """
+    Creates future partitions and removes expired ones.
+
+    Expired partitions are detached concurrently, so inserts
+    and queries are not blocked, and then dropped
+    unless ``partitions_detach_only`` is set.
+    Maintenance is skipped while another process runs it.
+
+    :param engine: database engine.
+    :param now: current time.
+    :return: False if another process holds the maintenance lock.
+    """
+    current = month_start(now or datetime.now(timezone.utc))
+    autocommit = engine.execution_options(isolation_level="AUTOCOMMIT")
+    async with autocommit.connect() as conn:
+        locked = await conn.execute(
+            text("SELECT pg_try_advisory_lock(hashtext(:name))"),
+            {"name": _LOCK},
+        )
+        if not locked.scalar():
+            return False
+        try:
+            for table in partitioned_tables():
+                await _maintain_table(conn, table, current)
+        finally:
+            await conn.execute(
+                text("SELECT pg_advisory_unlock(hashtext(:name))"),
+                {"name": _LOCK},
+            )
+    return True
+
+
+async def _maintain_table(
+    conn: AsyncConnection,
+    table: PartitionedTable,
+    current: date,
+) -> None:
+    for offset in range(settings.partitions_premake_months + 1):
+        await create_partition(conn, table.name, add_months(current, offset))
+    if table.retention_months <= 0:
+        return
+    oldest = add_months(current, -table.retention_months)
+    partitions = await list_partitions(conn, table.name)
+    for month, (name, detach_pending) in sorted(partitions.items()):
+        if month >= oldest:
+            continue
+        # An interrupted concurrent detach can only be finalized.
+        mode = "FINALIZE" if detach_pending else "CONCURRENTLY"
+        await conn.execute(
+            text(f'ALTER TABLE "{table.name}" DETACH PARTITION "{name}" {mode}'),
+        )
+        if settings.partitions_detach_only:
+            logger.info("Detached expired partition {}", name)
+            continue
+        await conn.execute(text(f'DROP TABLE "{name}"'))
+        logger.info("Dropped expired partition {}", name)
+
+
+class PartitionMaintainer:
+    """Background partition maintenance of a worker."""
+
+    def __init__(self, engine: AsyncEngine, interval: float) -> None:
+        self.engine = engine
+        self.interval = interval
+        self._task: "Optional[asyncio.Task[None]]" = None
+
+    def start(self) -> None:
+        """Starts maintenance in background, the first one runs immediately."""
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stops the background task."""
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await maintain_partitions(self.engine)
+            except Exception as exc:
+                logger.error("Cannot maintain partitions: {}", exc)
+            await asyncio.sleep(self.interval)
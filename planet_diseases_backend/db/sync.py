@@ -0,0 +1,110 @@
+"""
+Change sequences for offline sync.
+
+Every synced table has its own sequence and ``change_seq`` column.
+Triggers give every inserted or updated row the next number
+of the sequence, and deleted rows leave tombstones in ``sync_tombstone``
+numbered by the same sequence. So a client that remembers the largest
+number it has seen can get exactly the changes it has missed.
+
+Numbers are taken under a transaction-level advisory lock of the table,
+so writers of a table commit in the order of their numbers. Otherwise,
+a transaction that took a smaller number could commit after a client
+has read a larger one, and the client would never get its change.
+The lock is taken by a statement trigger before any row is locked,
+so it can't cause deadlocks. It serializes writes of synced tables,
+which is fine for catalogues and events written in batches.
+
+Triggers are created with tables, see :func:`track_changes`,
+and by migrations for existing databases.
+"""
+
+from typing import Type
+
+from sqlalchemy import DDL, event
+
+from planet_diseases_backend.db.base import Base
+
+# Functions are shared by all synced tables. The sequence
+# is passed as the trigger argument.
+FUNCTIONS = [
+    """
+    CREATE OR REPLACE FUNCTION sync_lock() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        PERFORM pg_advisory_xact_lock(hashtext(TG_ARGV[0]));
+        RETURN NULL;
+    END;
+    $$
+    """,
+    """
+    CREATE OR REPLACE FUNCTION sync_change_seq() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        NEW.change_seq := nextval(TG_ARGV[0]);
+        RETURN NEW;
+    END;
+    $$
+    """,
+    """
+    CREATE OR REPLACE FUNCTION sync_tombstone() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        INSERT INTO sync_tombstone (table_name, change_seq, row_id)
+        VALUES (TG_TABLE_NAME, nextval(TG_ARGV[0]), OLD.id::text);
+        RETURN NULL;
+    END;
+    $$
+    """,
+]
+
+
+def change_sequence(table: str) -> str:
+    """
+    Name of the change sequence of the table.
+
+    :param table: name of a synced table.
+    :return: name of the sequence.
+    """
+    return f"{table}_change_seq"
+
+
+def track_changes(model: Type[Base], deletes: bool = True) -> None:
+    """
+    Creates the sequence and triggers with the table of the model.
+
+    The table must have ``id`` and ``change_seq`` columns.
+
+    :param model: model of a synced table.
+    :param deletes: whether deleted rows leave tombstones,
+        append-only tables don't need them.
+    """
+    table = model.__table__
+    name = model.__tablename__
+    sequence = change_sequence(name)
+    operations = "INSERT OR UPDATE OR DELETE" if deletes else "INSERT"
+    row_operations = "INSERT OR UPDATE" if deletes else "INSERT"
+    event.listen(
+        table,
+        "before_create",
+        DDL(f"CREATE SEQUENCE IF NOT EXISTS {sequence}"),
+    )
+    statements = [
+        *FUNCTIONS,
+        f"CREATE TRIGGER {name}_sync_lock BEFORE {operations} ON {name} "
+        f"FOR EACH STATEMENT EXECUTE FUNCTION sync_lock('{sequence}')",
+        f"CREATE TRIGGER {name}_sync_seq BEFORE {row_operations} ON {name} "
+        f"FOR EACH ROW EXECUTE FUNCTION sync_change_seq('{sequence}')",
+    ]
+    if deletes:
+        statements.append(
+            f"CREATE TRIGGER {name}_tombstone AFTER DELETE ON {name} "
+            f"FOR EACH ROW EXECUTE FUNCTION sync_tombstone('{sequence}')",
+        )
+    for statement in statements:
+        event.listen(table, "after_create", DDL(statement))
+    event.listen(
+        table,
+        "after_drop",
+        DDL(f"DROP SEQUENCE IF EXISTS {sequence}"),
+    )
@@ -1,44 +1,150 @@
+import re
+from contextlib import asynccontextmanager
+from typing import Any, AsyncGenerator, Dict, Optional
+
 from sqlalchemy import text
 from sqlalchemy.engine import make_url
-from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, create_async_engine
 
 from planet_diseases_backend.settings import settings
 
+# Names of databases can't be bound as parameters,
+# so only plain identifiers are formatted into statements.
+_DATABASE_NAME = re.compile(r"[A-Za-z_][A-Za-z0-9_]{0,62}")
 
-async def create_database() -> None:
-    """Create a database."""
-    db_url = make_url(str(settings.db_url.with_path("/postgres")))
-    engine = create_async_engine(db_url, isolation_level="AUTOCOMMIT")
 
-    async with engine.connect() as conn:
-        database_existance = await conn.execute(
-            text(
-                f"SELECT 1 FROM pg_database WHERE datname='{settings.db_base}'",  # noqa: S608
-            ),
-        )
-        database_exists = database_existance.scalar() == 1
+def engine_options() -> Dict[str, Any]:
+    """
+    Options of engines that serve queries.
+
+    :return: keyword arguments for create_async_engine.
+    """
+    return {
+        "echo": settings.db_echo,
+        "query_cache_size": settings.db_query_cache_size,
+        "connect_args": {
+            "prepared_statement_cache_size": settings.db_prepared_statement_cache_size,
+        },
+    }
+
+
+def quote_database(name: str) -> str:
+    """
+    Quotes the name of a database for DDL statements.
+
+    :param name: name of the database.
+    :return: quoted name.
+    :raises ValueError: if the name is not a plain identifier.
+    """
+    if not _DATABASE_NAME.fullmatch(name):
+        raise ValueError(f"Invalid database name: {name!r}")
+    return f'"{name}"'
 
-    if database_exists:
-        await drop_database()
 
-    async with engine.connect() as conn:
-        await conn.execute(
-            text(
-                f'CREATE DATABASE "{settings.db_base}" ENCODING "utf8" TEMPLATE template1',  # noqa: E501
-            ),
-        )
+def _maintenance_engine() -> AsyncEngine:
+    """
+    Engine of the maintenance database.
 
+    Databases can't be created or dropped
+    while connected to them.
 
-async def drop_database() -> None:
-    """Drop current database."""
+    :return: autocommit engine.
+    """
     db_url = make_url(str(settings.db_url.with_path("/postgres")))
-    engine = create_async_engine(db_url, isolation_level="AUTOCOMMIT")
-    async with engine.connect() as conn:
-        disc_users = (
-            "SELECT pg_terminate_backend(pg_stat_activity.pid) "  # noqa: S608
-            "FROM pg_stat_activity "
-            f"WHERE pg_stat_activity.datname = '{settings.db_base}' "
-            "AND pid <> pg_backend_pid();"
-        )
-        await conn.execute(text(disc_users))
-        await conn.execute(text(f'DROP DATABASE "{settings.db_base}"'))
+    return create_async_engine(db_url, isolation_level="AUTOCOMMIT")
+
+
+async def database_exists(name: Optional[str] = None) -> bool:
+    """
+    Checks that the database exists.
+
+    :param name: database, the current one by default.
+    :return: True if it exists.
+    """
+    engine = _maintenance_engine()
+    try:
+        async with engine.connect() as conn:
+            exists = await conn.execute(
+                text("SELECT 1 FROM pg_database WHERE datname = :name"),
+                {"name": name or settings.db_base},
+            )
+            return exists.scalar() == 1
+    finally:
+        await engine.dispose()
+
+
+async def create_database(
+    name: Optional[str] = None,
+    template: str = "template1",
+) -> None:
+    """
+    Create a database.
+
+    An existing database with the same name is dropped.
+    Copying a template with the schema is much faster
+    than creating the schema in an empty database.
+
+    :param name: database, the current one by default.
+    :param template: database to copy, nobody may be connected to it.
+    :raises ValueError: if a name is not a plain identifier.
+    """
+    name = name or settings.db_base
+    statement = (
+        f"CREATE DATABASE {quote_database(name)} "
+        f'ENCODING "utf8" TEMPLATE {quote_database(template)}'
+    )
+    if await database_exists(name):
+        await drop_database(name)
+
+    engine = _maintenance_engine()
+    try:
+        async with engine.connect() as conn:
+            await conn.execute(text(statement))
+    finally:
+        await engine.dispose()
+
+
+async def drop_database(name: Optional[str] = None) -> None:
+    """
+    Drop a database.
+
+    :param name: database, the current one by default.
+    :raises ValueError: if the name is not a plain identifier.
+    """
+    name = name or settings.db_base
+    quoted = quote_database(name)
+    engine = _maintenance_engine()
+    try:
+        async with engine.connect() as conn:
+            disc_users = (
+                "SELECT pg_terminate_backend(pg_stat_activity.pid) "
+                "FROM pg_stat_activity "
+                "WHERE pg_stat_activity.datname = :name "
+                "AND pid <> pg_backend_pid();"
+            )
+            await conn.execute(text(disc_users), {"name": name})
+            await conn.execute(text(f"DROP DATABASE IF EXISTS {quoted}"))
+    finally:
+        await engine.dispose()
+
+
+@asynccontextmanager
+async def databases_lock() -> AsyncGenerator[AsyncConnection, None]:
+    """
+    Serializes creation of databases by several processes.
+
+    It's a session-level advisory lock, it's released
+    when the connection is closed, even if the process dies.
+
+    :yield: connection to the maintenance database that holds the lock.
+    """
+    engine = _maintenance_engine()
+    try:
+        async with engine.connect() as conn:
+            await conn.execute(
+                text("SELECT pg_advisory_lock(hashtext(:name))"),
+                {"name": f"{settings.db_user}:databases"},
+            )
+            yield conn
+    finally:
+        await engine.dispose()
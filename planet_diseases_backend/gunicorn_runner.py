@@ -1,15 +1,60 @@
-from typing import Any
+import asyncio
+import os
+import socket
+import sys
+from typing import Any, List, Optional
 
 from gunicorn.app.base import BaseApplication
+from gunicorn.arbiter import Arbiter
 from gunicorn.util import import_app
+from gunicorn.workers.base import Worker
+from loguru import logger
+from uvicorn.server import Server
 from uvicorn.workers import UvicornWorker as BaseUvicornWorker
 
+from planet_diseases_backend.process import (
+    get_memory_usage,
+    mark_boot_started,
+    worker_rss_limit,
+)
+from planet_diseases_backend.services.preload import preload_state
+from planet_diseases_backend.settings import settings
+
 try:
     import uvloop  # (Found nested import)
 except ImportError:
     uvloop = None  # type: ignore  # (variables overlap)
 
 
+class DrainingServer(Server):
+    """Uvicorn server that drains the application before it stops listening."""
+
+    async def shutdown(self, sockets: Optional[List[socket.socket]] = None) -> None:
+        """
+        Drains the application and shuts the server down.
+
+        Readiness fails first, and the worker keeps serving
+        for ``shutdown_delay`` seconds, so load balancers
+        stop routing to it before listeners are closed.
+
+        :param sockets: listening sockets.
+        """
+        # The application is imported by the worker at this point,
+        # importing it at the module level would import prometheus-client
+        # before its multiprocess directory is set.
+        from planet_diseases_backend.web.lifetime import drain_all
+
+        await drain_all()
+        if settings.shutdown_delay > 0 and not self.force_exit:
+            logger.info(
+                "Worker {} stops accepting requests in {}s",
+                os.getpid(),
+                settings.shutdown_delay,
+            )
+            await asyncio.sleep(settings.shutdown_delay)
+        await super().shutdown(sockets)
+
+
 class UvicornWorker(BaseUvicornWorker):
     """
     Configuration for uvicorn workers.
@@ -27,6 +72,87 @@ class UvicornWorker(BaseUvicornWorker):
         "proxy_headers": False,
     }
 
+    def init_process(self) -> None:
+        """Remembers boot start time and starts the worker."""
+        mark_boot_started()
+        self.max_rss = worker_rss_limit(
+            settings.worker_max_rss_mb,
+            settings.worker_max_rss_jitter_mb,
+        )
+        # The rest of the graceful timeout is left for the delay
+        # before closing listeners and for stopping subsystems.
+        self.config.timeout_graceful_shutdown = max(
+            int(
+                self.cfg.graceful_timeout
+                - settings.shutdown_delay
+                - settings.shutdown_timeout,
+            ),
+            1,
+        )
+        super().init_process()
+
+    async def _serve(self) -> None:
+        """Serves the application with the draining server."""
+        self.config.app = self.wsgi
+        server = DrainingServer(config=self.config)
+        self._install_sigquit_handler()
+        await server.serve(sockets=self.sockets)
+        if not server.started:
+            sys.exit(Arbiter.WORKER_BOOT_ERROR)
+
+    async def callback_notify(self) -> None:
+        """
+        Notifies gunicorn master that the worker is alive.
+
+        It also checks memory usage of the worker.
+        When RSS exceeds the limit, uvicorn's request limit
+        is set to zero. So the server stops accepting connections,
+        finishes in-flight requests and exits, exactly as
+        with gunicorn's max_requests. Then master starts a new worker.
+        """
+        await super().callback_notify()
+        if settings.worker_max_rss_mb <= 0:
+            return
+        resident, _ = get_memory_usage()
+        if resident > self.max_rss:
+            logger.warning(
+                "Worker {} uses {:.1f} MiB of memory, restarting it",
+                os.getpid(),
+                resident / 2**20,
+            )
+            self.config.limit_max_requests = 0
+
+
+def on_starting(server: Arbiter) -> None:
+    """
+    Imports metrics compaction in gunicorn master.
+
+    prometheus-client must be imported after its multiprocess
+    directory is set, so it isn't imported at the module level.
+    It can't be imported in child_exit either, because the hook
+    runs in a signal handler, which may interrupt the import.
+
+    :param server: gunicorn arbiter.
+    """
+    import planet_diseases_backend.metrics  # noqa: F401
+
+
+def child_exit(server: Arbiter, worker: Worker) -> None:
+    """
+    Compacts metrics of the exited worker.
+
+    :param server: gunicorn arbiter.
+    :param worker: exited worker.
+    """
+    from planet_diseases_backend.metrics import compact_dead_process
+
+    try:
+        compacted = compact_dead_process(worker.pid)
+    except Exception as exc:
+        logger.warning("Cannot compact metrics of worker {}: {}", worker.pid, exc)
+        return
+    logger.debug("Compacted {} metric file(s) of worker {}", compacted, worker.pid)
+
 
 class GunicornApplication(BaseApplication):
     """
@@ -48,6 +174,8 @@ class GunicornApplication(BaseApplication):
             "bind": f"{host}:{port}",
             "workers": workers,
             "worker_class": "planet_diseases_backend.gunicorn_runner.UvicornWorker",
+            "on_starting": on_starting,
+            "child_exit": child_exit,
             **kwargs,
         }
         self.app = app
@@ -74,6 +202,15 @@ class GunicornApplication(BaseApplication):
         function's returns. We return python's path to
         the app's factory.
 
+        With preload_app enabled, this function is called
+        once in the master process. It imports the whole application
+        and loads read-only state before workers are forked.
+        The app itself is still built by the factory in every worker,
+        so engines and event loops are never shared.
+
         :returns: python path to app factory.
         """
-        return import_app(self.app)
+        app = import_app(self.app)
+        if self.cfg.preload_app:
+            preload_state()
+        return app
@@ -0,0 +1,126 @@
+"""
+Compaction of prometheus multiprocess files.
+
+Every worker writes its metrics to its own ``<type>_<pid>.db`` files
+in ``prometheus_dir``. The files stay after the worker exits,
+because counters and histograms must not go back when it happens.
+So with recycled workers the number of files grows with uptime,
+and every scrape has to merge all of them.
+
+When a worker exits, its files are merged into one ``<type>_archive.db``
+file per metric type and removed. The collector treats the archive
+as one more process, so totals don't change.
+
+This module is imported by gunicorn master only when a worker exits,
+after ``PROMETHEUS_MULTIPROC_DIR`` is set.
+"""
+
+import os
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple
+
+from prometheus_client.mmap_dict import MmapedDict
+from prometheus_client.multiprocess import mark_process_dead
+
+ARCHIVE_ID = "archive"
+
+Sample = Tuple[float, float]
+Merge = Callable[[Sample, Sample], Sample]
+
+
+def _add(archived: Sample, sample: Sample) -> Sample:
+    return archived[0] + sample[0], max(archived[1], sample[1])
+
+
+def _max(archived: Sample, sample: Sample) -> Sample:
+    return max(archived, sample, key=lambda item: item[0])
+
+
+def _min(archived: Sample, sample: Sample) -> Sample:
+    return min(archived, sample, key=lambda item: item[0])
+
+
+def _most_recent(archived: Sample, sample: Sample) -> Sample:
+    return max(archived, sample, key=lambda item: item[1])
+
+
+# File prefixes that can be merged and how values of dead processes are merged.
+# Gauges in "all" mode are labeled by pid and "live*" gauges
+# are removed by mark_process_dead, so they aren't compacted.
+MERGERS: Dict[str, Merge] = {
+    "counter": _add,
+    "histogram": _add,
+    "summary": _add,
+    "gauge_sum": _add,
+    "gauge_max": _max,
+    "gauge_min": _min,
+    "gauge_mostrecent": _most_recent,
+}
+
+
+def _read_samples(path: Path) -> Dict[str, Sample]:
+    return {
+        key: (value, timestamp)
+        for key, value, timestamp, _ in MmapedDict.read_all_values_from_file(
+            str(path),
+        )
+    }
+
+
+def _compact_file(directory: Path, prefix: str, pid: int) -> bool:
+    """
+    Merges file of the dead process into the archive.
+
+    The new archive is written to a temporary file, which isn't
+    picked by the collector. Then the dead file is renamed out of
+    the collector's sight and the archive is atomically replaced,
+    so no scrape sees samples of the dead process twice, which would
+    look like a counter reset on the next scrape. Scrapes that have
+    already opened the old archive keep reading it.
+
+    :param directory: prometheus multiprocess directory.
+    :param prefix: type of metrics in the file.
+    :param pid: pid of the dead process.
+    :return: whether the file existed.
+    """
+    dead = directory / f"{prefix}_{pid}.db"
+    if not dead.exists():
+        return False
+    archive = directory / f"{prefix}_{ARCHIVE_ID}.db"
+    samples = _read_samples(archive) if archive.exists() else {}
+    merge = MERGERS[prefix]
+    for key, sample in _read_samples(dead).items():
+        archived = samples.get(key)
+        samples[key] = sample if archived is None else merge(archived, sample)
+
+    temporary = directory / f"{prefix}_{ARCHIVE_ID}.tmp"
+    temporary.unlink(missing_ok=True)
+    mmaped = MmapedDict(str(temporary))
+    try:
+        for key, (value, timestamp) in samples.items():
+            mmaped.write_value(key, value, timestamp)
+    finally:
+        mmaped.close()
+    merged = dead.with_suffix(".merged")
+    dead.replace(merged)
+    temporary.replace(archive)
+    merged.unlink()
+    return True
+
+
+def compact_dead_process(pid: int, directory: Optional[Path] = None) -> int:
+    """
+    Merges metric files of the dead process into archives.
+
+    :param pid: pid of the dead process.
+    :param directory: prometheus multiprocess directory,
+        taken from the environment by default.
+    :return: number of compacted files.
+    """
+    if directory is None:
+        env_dir = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+        if env_dir is None:
+            return 0
+        directory = Path(env_dir)
+    mark_process_dead(pid, str(directory))
+    return sum(_compact_file(directory, prefix, pid) for prefix in MERGERS)
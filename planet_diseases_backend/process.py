@@ -0,0 +1,162 @@
+import math
+import os
+import random
+import resource
+import sys
+import time
+from typing import Optional
+
+_boot_started: Optional[float] = None
+
+
+def mark_boot_started() -> None:
+    """
+    Remembers when the current worker started booting.
+
+    Gunicorn workers call it right after fork,
+    before the application is built.
+    """
+    global _boot_started  # noqa: PLW0603
+    _boot_started = time.perf_counter()
+
+
+def boot_elapsed() -> Optional[float]:
+    """
+    Time passed since the worker started booting.
+
+    :return: seconds or None if the boot wasn't marked.
+    """
+    if _boot_started is None:
+        return None
+    return time.perf_counter() - _boot_started
+
+
+def get_memory_usage() -> tuple[int, int]:
+    """
+    Resident and shared memory of the current process.
+
+    Shared memory includes pages inherited from gunicorn master
+    and not yet copied on write.
+    On systems without procfs only the peak RSS is available.
+
+    :return: resident and shared bytes.
+    """
+    usage: dict[str, int] = {}
+    try:
+        with open("/proc/self/smaps_rollup") as smaps:  # noqa: PTH123
+            for line in smaps:
+                key, _, value = line.partition(":")
+                if value.endswith("kB\n"):
+                    usage[key] = int(value.split()[0]) * 1024
+    except OSError:
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in bytes on macOS and in kilobytes elsewhere.
+        return (max_rss if sys.platform == "darwin" else max_rss * 1024), 0
+    shared = usage.get("Shared_Clean", 0) + usage.get("Shared_Dirty", 0)
+    return usage.get("Rss", 0), shared
+
+
+def _read_cgroup_file(path: str) -> Optional[str]:
+    try:
+        with open(path) as cgroup_file:  # noqa: PTH123
+            return cgroup_file.read().strip()
+    except OSError:
+        return None
+
+
+def _cgroup_cpu_quota() -> Optional[float]:
+    """
+    CPU quota set by cgroup v2 or v1.
+
+    :return: number of CPUs or None if there is no quota.
+    """
+    cpu_max = _read_cgroup_file("/sys/fs/cgroup/cpu.max")
+    if cpu_max is not None:
+        quota, period = cpu_max.split()
+        if quota == "max":
+            return None
+        return int(quota) / int(period)
+    quota_us = _read_cgroup_file("/sys/fs/cgroup/cpu/cpu.cfs_quota_us")
+    period_us = _read_cgroup_file("/sys/fs/cgroup/cpu/cpu.cfs_period_us")
+    if not quota_us or not period_us or int(quota_us) <= 0:
+        return None
+    return int(quota_us) / int(period_us)
+
+
+def available_cpus() -> int:
+    """
+    Number of CPUs the process can actually use.
+
+    It takes into account CPU affinity and
+    cgroup CPU quota set by container runtimes.
+
+    :return: number of CPUs, at least one.
+    """
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    quota = _cgroup_cpu_quota()
+    if quota is not None:
+        cpus = min(cpus, math.ceil(quota))
+    return max(cpus, 1)
+
+
+def memory_limit() -> int:
+    """
+    Memory available to the process.
+
+    It's a cgroup (v2 or v1) memory limit if one is set,
+    otherwise it's the amount of physical memory.
+
+    :return: bytes.
+    """
+    physical = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    limit = _read_cgroup_file("/sys/fs/cgroup/memory.max")
+    if limit is None:
+        limit = _read_cgroup_file("/sys/fs/cgroup/memory/memory.limit_in_bytes")
+    if limit is None or not limit.isdigit():
+        return physical
+    # Cgroup v1 reports a huge number when there is no limit.
+    return min(int(limit), physical)
+
+
+def auto_workers_count(worker_memory: int) -> int:
+    """
+    Number of workers that fits available CPUs and memory.
+
+    Uvicorn workers are asynchronous, so one worker per CPU
+    is enough to use all of them. Number of workers is also limited,
+    so that every worker gets worker_memory bytes.
+
+    :param worker_memory: memory budget of a single worker in bytes.
+    :return: number of workers, at least one.
+    """
+    by_memory = memory_limit() // max(worker_memory, 1)
+    return max(min(available_cpus(), by_memory), 1)
+
+
+def auto_threads_count() -> int:
+    """
+    Size of the thread pool for blocking calls in every worker.
+
+    It follows default size of ThreadPoolExecutor.
+
+    :return: number of threads.
+    """
+    return min(32, available_cpus() + 4)
+
+
+def worker_rss_limit(max_rss_mb: int, jitter_mb: int) -> int:
+    """
+    RSS limit of a worker with random jitter.
+
+    Jitter never takes more than half of the limit,
+    so a large jitter can't restart workers right after boot.
+
+    :param max_rss_mb: configured limit in MiB.
+    :param jitter_mb: maximum jitter in MiB.
+    :return: limit in bytes.
+    """
+    jitter = random.randint(0, max(jitter_mb, 0))  # noqa: S311
+    return max(max_rss_mb - jitter, max_rss_mb // 2) * 2**20
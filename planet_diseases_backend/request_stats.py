@@ -0,0 +1,160 @@
+"""
+Performance statistics of the current request.
+
+Statistics are stored in a context variable,
+so any code running on behalf of a request,
+including SQLAlchemy event hooks and sync handlers in the thread pool,
+can add time spent in a particular stage.
+"""
+
+import functools
+import time
+from collections import Counter
+from contextvars import ContextVar, Token
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+class RequestStats:
+    """Time spent by a request in different stages and executed queries."""
+
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        self.handler_started: Optional[float] = None
+        self.handler_finished: Optional[float] = None
+        self.response_started: Optional[float] = None
+        self.queries: Counter[str] = Counter()
+        self.statements: Dict[str, str] = {}
+
+    def add_query(self, fingerprint: str, statement: str) -> None:
+        """
+        Counts executed statement.
+
+        :param fingerprint: fingerprint of the statement.
+        :param statement: normalized statement.
+        """
+        self.queries[fingerprint] += 1
+        self.statements[fingerprint] = statement
+
+    def repeated_queries(self, threshold: int) -> List[Tuple[str, int]]:
+        """
+        Statements executed more than threshold times.
+
+        Many executions of the same statement within one request
+        usually mean that related rows are loaded one by one (N+1).
+
+        :param threshold: maximum allowed number of executions.
+        :return: normalized statements with their execution counts.
+        """
+        return [
+            (self.statements[fingerprint], count)
+            for fingerprint, count in self.queries.most_common()
+            if count > threshold
+        ]
+
+    def add(self, stage: str, seconds: float) -> None:
+        """
+        Adds time to the stage.
+
+        :param stage: name of the stage.
+        :param seconds: time spent.
+        """
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def breakdown(self, now: Optional[float] = None) -> Dict[str, float]:
+        """
+        Time spent in all stages.
+
+        Besides recorded stages it contains:
+
+        * dependencies - from the request start until the handler is called;
+        * serialize - from the handler return until the response is started;
+        * total - from the request start until now.
+
+        :param now: end of the request, current time by default.
+        :return: seconds spent in every stage.
+        """
+        now = time.perf_counter() if now is None else now
+        stages = dict(self.stages)
+        if self.handler_started is not None:
+            stages["dependencies"] = self.handler_started - self.started
+        if self.handler_finished is not None and self.response_started is not None:
+            stages["serialize"] = self.response_started - self.handler_finished
+        stages["total"] = now - self.started
+        return stages
+
+
+_current: ContextVar[Optional[RequestStats]] = ContextVar(
+    "request_stats",
+    default=None,
+)
+
+
+def bind_request_stats(stats: RequestStats) -> Token[Optional[RequestStats]]:
+    """
+    Makes statistics current for this context.
+
+    :param stats: statistics of the request.
+    :return: token to reset the context variable.
+    """
+    return _current.set(stats)
+
+
+def reset_request_stats(token: Token[Optional[RequestStats]]) -> None:
+    """
+    Restores statistics that were current before the request.
+
+    :param token: token returned by bind_request_stats.
+    """
+    _current.reset(token)
+
+
+def current_request_stats() -> Optional[RequestStats]:
+    """
+    Statistics of the current request.
+
+    :return: statistics or None outside of a request.
+    """
+    return _current.get()
+
+
+def record_stage(stage: str, seconds: float) -> None:
+    """
+    Adds time to the stage of the current request.
+
+    It does nothing outside of a request.
+
+    :param stage: name of the stage.
+    :param seconds: time spent.
+    """
+    stats = _current.get()
+    if stats is not None:
+        stats.add(stage, seconds)
+
+
+def timed_dependency(
+    stage: str,
+    dependency: Callable[..., Awaitable[T]],
+) -> Callable[..., Awaitable[T]]:
+    """
+    Wraps async dependency to record time of its resolution.
+
+    The wrapper keeps the signature of the dependency,
+    so FastAPI resolves its sub-dependencies as usual.
+
+    :param stage: name of the stage.
+    :param dependency: dependency to wrap.
+    :return: wrapped dependency.
+    """
+
+    @functools.wraps(dependency)
+    async def _wrapper(*args: Any, **kwargs: Any) -> T:
+        started = time.perf_counter()
+        try:
+            return await dependency(*args, **kwargs)
+        finally:
+            record_stage(stage, time.perf_counter() - started)
+
+    return _wrapper
@@ -0,0 +1,200 @@
+"""
+Write-behind recorder of usage events.
+
+Writing an event row inside every request transaction would double
+the number of writes to the primary. Instead, events are put
+in a bounded in-memory queue and a background task copies them
+to ``usage_event`` table in batches with ``COPY``.
+Diagnoses of every batch are added to daily statistics,
+see :mod:`planet_diseases_backend.services.stats`.
+
+A batch is written when it has ``events_batch_size`` events
+or ``events_flush_interval`` seconds after its first event.
+When the queue is full, new events are dropped and counted,
+so recording never slows down requests. Batches that can't be
+written are counted as failed, e.g. when their partition is missing,
+alert on ``usage_events_total{result="failed"}``.
+Everything queued is written on graceful shutdown.
+"""
+
+import asyncio
+import contextlib
+import uuid
+from datetime import datetime, timezone
+from typing import Any, List, Optional, Tuple
+
+import ujson
+from asyncpg.exceptions import CheckViolationError
+from loguru import logger
+from prometheus_client import Counter
+from sqlalchemy.ext.asyncio import AsyncEngine
+from starlette.requests import Request
+
+from planet_diseases_backend.db.models.usage_event import UsageEvent
+from planet_diseases_backend.services.stats import add_diagnoses, summarize
+
+USAGE_EVENTS = Counter(
+    "usage_events_total",
+    "Usage events by the result of recording.",
+    ["result"],
+)
+
+EventRecord = Tuple[str, Optional[uuid.UUID], Optional[str], datetime]
+_COLUMNS = ["kind", "user_id", "payload", "created_at"]
+
+
+class EventRecorder:
+    """Queue of usage events flushed to the database in batches."""
+
+    def __init__(
+        self,
+        engine: AsyncEngine,
+        queue_size: int,
+        batch_size: int,
+        flush_interval: float,
+    ) -> None:
+        self.engine = engine
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: "asyncio.Queue[EventRecord]" = asyncio.Queue(queue_size)
+        self._task: "Optional[asyncio.Task[None]]" = None
+        # Events taken from the queue, but not written yet.
+        self._batch: List[EventRecord] = []
+        self._flushing: "Optional[asyncio.Future[None]]" = None
+
+    def record(
+        self,
+        kind: str,
+        user_id: Optional[uuid.UUID] = None,
+        payload: Any = None,
+    ) -> bool:
+        """
+        Queues an event.
+
+        :param kind: type of the event.
+        :param user_id: user who caused the event.
+        :param payload: JSON-serializable details.
+        :return: False if the queue is full and the event is dropped.
+        """
+        event = (
+            kind,
+            user_id,
+            None if payload is None else ujson.dumps(payload),
+            datetime.now(timezone.utc),
+        )
+        try:
+            self._queue.put_nowait(event)
+        except asyncio.QueueFull:
+            USAGE_EVENTS.labels("dropped").inc()
+            return False
+        USAGE_EVENTS.labels("queued").inc()
+        return True
+
+    @property
+    def backlog(self) -> float:
+        """
+        Fill ratio of the queue.
+
+        :return: fraction of the queue taken by events, from 0 to 1.
+        """
+        return self._queue.qsize() / max(self._queue.maxsize, 1)
+
+    def start(self) -> None:
+        """Starts the background flushing task."""
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stops the background task and writes all queued events."""
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+        if self._flushing is not None:
+            await self._flushing
+        while not self._queue.empty():
+            self._batch.append(self._queue.get_nowait())
+        batch, self._batch = self._batch, []
+        for start in range(0, len(batch), self.batch_size):
+            await self._flush(batch[start : start + self.batch_size])
+
+    async def _run(self) -> None:
+        while True:
+            await self._collect_batch()
+            batch, self._batch = self._batch, []
+            # The flush isn't interrupted by stop, so the batch isn't lost.
+            self._flushing = asyncio.ensure_future(self._flush(batch))
+            await asyncio.shield(self._flushing)
+            self._flushing = None
+
+    async def _collect_batch(self) -> None:
+        """Waits for a full batch or until the flush interval passes."""
+        loop = asyncio.get_running_loop()
+        self._batch.append(await self._queue.get())
+        deadline = loop.time() + self.flush_interval
+        while len(self._batch) < self.batch_size:
+            if not self._queue.empty():
+                self._batch.append(self._queue.get_nowait())
+                continue
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                event = await asyncio.wait_for(self._queue.get(), remaining)
+            except asyncio.TimeoutError:
+                break
+            self._batch.append(event)
+
+    async def _flush(self, batch: List[EventRecord]) -> None:
+        """
+        Copies events to the table and counts diagnoses.
+
+        asyncpg connection is used directly for COPY. Counters
+        of diagnoses are incremented in the same transaction,
+        so they are written together with events or not at all.
+
+        :param batch: events to write.
+        """
+        try:
+            async with self.engine.begin() as conn:
+                await add_diagnoses(conn, summarize(batch))
+                raw = await conn.get_raw_connection()
+                await raw.driver_connection.copy_records_to_table(  # type: ignore
+                    UsageEvent.__tablename__,
+                    records=batch,
+                    columns=_COLUMNS,
+                )
+        except Exception as exc:
+            USAGE_EVENTS.labels("failed").inc(len(batch))
+            logger.error("Cannot write {} usage events: {}", len(batch), exc)
+            if isinstance(exc, CheckViolationError):
+                logger.error("Usage events have no partition, maintain partitions")
+            return
+        USAGE_EVENTS.labels("written").inc(len(batch))
+
+
+def record_event(
+    request: Optional[Request],
+    kind: str,
+    user_id: Optional[uuid.UUID] = None,
+    payload: Any = None,
+) -> None:
+    """
+    Queues an event with the recorder of the application.
+
+    It does nothing if there is no request or the recorder isn't started.
+
+    :param request: current request.
+    :param kind: type of the event.
+    :param user_id: user who caused the event.
+    :param payload: JSON-serializable details.
+    """
+    if request is None:
+        return
+    recorder: Optional[EventRecorder] = getattr(
+        request.app.state,
+        "event_recorder",
+        None,
+    )
+    if recorder is not None:
+        recorder.record(kind, user_id, payload)
@@ -0,0 +1,158 @@
+"""
+Cached readiness probes.
+
+Orchestrators and load balancers probe every worker every few seconds,
+and a burst of probes must not turn into a burst of database queries.
+So probes run in background every ``health_interval`` seconds
+and readiness checks return the last results.
+If results are older than ``health_ttl``, for example because
+the background task is stuck, they are refreshed by the check,
+and concurrent checks share that refresh.
+"""
+
+import asyncio
+import contextlib
+import time
+from typing import Awaitable, Callable, Dict, NamedTuple, Optional
+
+from loguru import logger
+from prometheus_client import Histogram
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from planet_diseases_backend.services.events import EventRecorder
+from planet_diseases_backend.services.preload import is_loaded
+from planet_diseases_backend.services.single_flight import SingleFlight
+
+PROBE_DURATION = Histogram(
+    "health_probe_duration_seconds",
+    "Time spent by readiness probes.",
+    ["probe"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+
+# Returns a description of the problem or None if it's fine.
+Probe = Callable[[], Awaitable[Optional[str]]]
+
+
+class ProbeResult(NamedTuple):
+    """Result of a probe."""
+
+    ok: bool
+    latency: float
+    detail: Optional[str] = None
+
+
+def db_probe(engine: AsyncEngine) -> Probe:
+    """
+    Checks that a pooled connection can run a query.
+
+    :param engine: database engine.
+    :return: probe.
+    """
+
+    async def _probe() -> Optional[str]:
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+        return None
+
+    return _probe
+
+
+def state_probe() -> Probe:
+    """
+    Checks that read-only state, such as models, is loaded.
+
+    :return: probe.
+    """
+
+    async def _probe() -> Optional[str]:
+        return None if is_loaded() else "State is not loaded"
+
+    return _probe
+
+
+def backlog_probe(recorder: EventRecorder, max_backlog: float) -> Probe:
+    """
+    Checks that the event queue isn't almost full.
+
+    :param recorder: event recorder.
+    :param max_backlog: highest acceptable fill ratio of the queue.
+    :return: probe.
+    """
+
+    async def _probe() -> Optional[str]:
+        if recorder.backlog > max_backlog:
+            return f"Event queue is {recorder.backlog:.0%} full"
+        return None
+
+    return _probe
+
+
+class HealthMonitor:
+    """Runs probes in background and keeps their last results."""
+
+    def __init__(
+        self,
+        probes: Dict[str, Probe],
+        interval: float,
+        ttl: float,
+        timeout: float,
+    ) -> None:
+        self.probes = probes
+        self.interval = interval
+        self.ttl = ttl
+        self.timeout = timeout
+        self.results: Dict[str, ProbeResult] = {}
+        self._checked: Optional[float] = None
+        self._refreshes = SingleFlight("health", max_keys=1)
+        self._task: "Optional[asyncio.Task[None]]" = None
+
+    def start(self) -> None:
+        """Starts running probes in background."""
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stops the background task."""
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+    async def check(self) -> Dict[str, ProbeResult]:
+        """
+        Returns fresh results of probes.
+
+        :return: results by probe names.
+        """
+        now = time.monotonic()
+        if self._checked is None or now - self._checked > self.ttl:
+            await self._refreshes.do("refresh", self.refresh)
+        return self.results
+
+    async def refresh(self) -> None:
+        """Runs all probes concurrently."""
+        names = list(self.probes)
+        results = await asyncio.gather(*(self._run_probe(name) for name in names))
+        self.results = dict(zip(names, results))
+        self._checked = time.monotonic()
+
+    async def _run_probe(self, name: str) -> ProbeResult:
+        started = time.perf_counter()
+        try:
+            detail = await asyncio.wait_for(self.probes[name](), self.timeout)
+        except asyncio.TimeoutError:
+            detail = f"Timed out after {self.timeout}s"
+        except Exception as exc:
+            detail = str(exc) or type(exc).__name__
+        latency = time.perf_counter() - started
+        PROBE_DURATION.labels(name).observe(latency)
+        if detail is not None:
+            logger.warning("Readiness probe {} failed: {}", name, detail)
+        return ProbeResult(ok=detail is None, latency=latency, detail=detail)
+
+    async def _run(self) -> None:
+        while True:
+            await self._refreshes.do("refresh", self.refresh)
+            await asyncio.sleep(self.interval)
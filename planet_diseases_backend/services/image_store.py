@@ -0,0 +1,275 @@
+"""
+Content-addressed store of uploaded images and their derivatives.
+
+Images are kept in the object storage, see
+:mod:`planet_diseases_backend.services.storage`. Originals are named
+by SHA-256 of their bytes, so identical uploads are stored once.
+Keys are spread over two levels of prefixes by the first bytes
+of the digest, because directories with millions of entries
+are slow on most filesystems::
+
+    images/originals/ab/cd/abcd...
+    images/thumbnail/ab/cd/abcd....jpg
+    images/model/ab/cd/abcd....jpg
+
+An upload is hashed while it's written to a local temporary file,
+Pillow needs a seekable file to decode it. Derivatives are generated
+once, before the original is stored. Decoding and resizing hold
+the GIL only partially and take tens of milliseconds, so they run
+in a dedicated thread pool instead of the event loop.
+"""
+
+import asyncio
+import hashlib
+import os
+import re
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import AsyncIterable, AsyncIterator, Dict, NamedTuple, Optional, Tuple
+
+import aiofiles
+import aiofiles.os
+from PIL import Image, ImageOps, UnidentifiedImageError
+from starlette.requests import Request
+
+from planet_diseases_backend.services.storage import (
+    CHUNK_SIZE,
+    ObjectNotFoundError,
+    Storage,
+)
+from planet_diseases_backend.settings import settings
+
+ORIGINAL = "originals"
+_DIGEST = re.compile(r"[0-9a-f]{64}")
+
+
+class InvalidImageError(ValueError):
+    """Uploaded file is not a supported image."""
+
+
+class ImageTooLargeError(ValueError):
+    """Uploaded file exceeds the size limit."""
+
+
+class StoredImage(NamedTuple):
+    """Image saved in the store."""
+
+    digest: str
+    size: int
+    # False if the same image was already stored.
+    created: bool
+
+
+def derivative_sizes() -> Dict[str, Tuple[int, int]]:
+    """
+    Sizes of derivatives by their names.
+
+    :return: maximum width and height of every derivative.
+    """
+    return {
+        "thumbnail": (settings.image_thumbnail_size, settings.image_thumbnail_size),
+        "model": (settings.image_model_input_size, settings.image_model_input_size),
+    }
+
+
+def _decode(source: Path) -> Image.Image:
+    """
+    Decodes the whole image.
+
+    Only decoding all pixels detects truncated and corrupted files.
+
+    :param source: image file.
+    :return: upright RGB image.
+    :raises InvalidImageError: if it isn't an image Pillow can decode.
+    """
+    try:
+        with Image.open(source) as original:
+            return ImageOps.exif_transpose(original).convert("RGB")
+    except (
+        Image.DecompressionBombError,
+        UnidentifiedImageError,
+        OSError,
+        SyntaxError,
+    ) as exc:
+        raise InvalidImageError(str(exc)) from exc
+
+
+def _make_derivatives(source: Path, targets: Dict[str, Path]) -> None:
+    """
+    Generates derivatives of the image.
+
+    Thumbnails keep the aspect ratio, model inputs
+    are cropped to the exact size.
+
+    :param source: original image.
+    :param targets: paths of derivatives by their names.
+    :raises InvalidImageError: if the source isn't an image.
+    """
+    sizes = derivative_sizes()
+    image = _decode(source)
+    for name, target in targets.items():
+        if name == "thumbnail":
+            derivative = image.copy()
+            derivative.thumbnail(sizes[name])
+        else:
+            derivative = ImageOps.fit(image, sizes[name])
+        derivative.save(target, "JPEG", quality=85)
+
+
+async def _read_file(path: Path) -> AsyncIterator[bytes]:
+    async with aiofiles.open(path, "rb") as file:
+        while chunk := await file.read(CHUNK_SIZE):
+            yield chunk
+
+
+class ImageStore:
+    """Sharded store of images in the object storage."""
+
+    def __init__(
+        self,
+        storage: Storage,
+        incoming: Path,
+        executor: ThreadPoolExecutor,
+    ) -> None:
+        self.storage = storage
+        self.incoming = incoming
+        self.executor = executor
+
+    def key(self, digest: str, variant: str = ORIGINAL) -> str:
+        """
+        Key of the stored object.
+
+        :param digest: SHA-256 of the original.
+        :param variant: "originals" or a derivative name.
+        :return: key of the object, it may not exist.
+        :raises KeyError: if the digest or the variant is unknown.
+        """
+        if not _DIGEST.fullmatch(digest):
+            raise KeyError(digest)
+        shard = f"images/{variant}/{digest[:2]}/{digest[2:4]}"
+        if variant == ORIGINAL:
+            return f"{shard}/{digest}"
+        if variant not in derivative_sizes():
+            raise KeyError(variant)
+        return f"{shard}/{digest}.jpg"
+
+    async def size(self, digest: str, variant: str = ORIGINAL) -> int:
+        """
+        Size of a stored image.
+
+        :param digest: SHA-256 of the original.
+        :param variant: "originals" or a derivative name.
+        :return: size in bytes.
+        :raises KeyError: if the image isn't stored.
+        """
+        try:
+            return await self.storage.size(self.key(digest, variant))
+        except ObjectNotFoundError:
+            raise KeyError(digest) from None
+
+    def read(
+        self,
+        digest: str,
+        variant: str = ORIGINAL,
+        start: int = 0,
+        end: Optional[int] = None,
+    ) -> AsyncIterator[bytes]:
+        """
+        Reads a stored image or its byte range.
+
+        :param digest: SHA-256 of the original.
+        :param variant: "originals" or a derivative name.
+        :param start: first byte.
+        :param end: last byte, inclusive, the end of the image by default.
+        :return: chunks of the image.
+        """
+        return self.storage.get(self.key(digest, variant), start, end)
+
+    async def _exists(self, key: str) -> bool:
+        try:
+            await self.storage.size(key)
+        except ObjectNotFoundError:
+            return False
+        return True
+
+    async def save(self, chunks: AsyncIterable[bytes]) -> StoredImage:
+        """
+        Stores an uploaded image and generates its derivatives.
+
+        The upload is hashed while it's written to a temporary file,
+        so it's read only once. Derivatives are stored before
+        the original, so an image that can't be decoded is never
+        stored, and a stored original always has its derivatives.
+        Derivatives missing for an already stored image are generated
+        again.
+
+        :param chunks: content of the upload.
+        :return: stored image.
+        :raises ImageTooLargeError: if the upload exceeds image_max_bytes.
+        :raises InvalidImageError: if the upload is not an image.
+        """
+        loop = asyncio.get_running_loop()
+        await aiofiles.os.makedirs(self.incoming, exist_ok=True)
+        temporary = self.incoming / uuid.uuid4().hex
+        sha256 = hashlib.sha256()
+        size = 0
+        derivatives: Dict[str, Path] = {}
+        try:
+            async with aiofiles.open(temporary, "wb") as file:
+                async for chunk in chunks:
+                    size += len(chunk)
+                    if size > settings.image_max_bytes:
+                        raise ImageTooLargeError(
+                            f"Image exceeds {settings.image_max_bytes} bytes",
+                        )
+                    sha256.update(chunk)
+                    await file.write(chunk)
+            digest = sha256.hexdigest()
+            created = not await self._exists(self.key(digest))
+            for name in derivative_sizes():
+                if created or not await self._exists(self.key(digest, name)):
+                    derivatives[name] = temporary.with_name(f"{temporary.name}.{name}")
+            if derivatives:
+                await loop.run_in_executor(
+                    self.executor,
+                    _make_derivatives,
+                    temporary,
+                    derivatives,
+                )
+            for name, path in derivatives.items():
+                await self.storage.put(self.key(digest, name), _read_file(path))
+            if created:
+                await self.storage.put(self.key(digest), _read_file(temporary))
+        finally:
+            for path in (temporary, *derivatives.values()):
+                if await aiofiles.os.path.exists(path):
+                    await aiofiles.os.remove(path)
+        return StoredImage(digest, size, created=created)
+
+
+def create_image_store(storage: Storage) -> ImageStore:
+    """
+    Creates the store configured by settings.
+
+    :param storage: object storage of the application.
+    :return: image store.
+    """
+    return ImageStore(
+        storage,
+        settings.image_incoming_dir,
+        ThreadPoolExecutor(
+            max_workers=settings.image_workers or os.cpu_count(),
+            thread_name_prefix="images",
+        ),
+    )
+
+
+def get_image_store(request: Request) -> ImageStore:
+    """
+    Returns the image store of the application.
+
+    :param request: current request.
+    :return: image store.
+    """
+    return request.app.state.image_store
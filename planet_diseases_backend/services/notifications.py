@@ -0,0 +1,248 @@
+"""
+Per-worker hub of notifications for streaming clients.
+
+Producers publish events with :func:`notify` inside the transaction
+that changes the state, so Postgres delivers them only after commit
+and clients never see states that were rolled back.
+
+Every worker keeps one pooled connection listening to the channel
+and fans notifications out to subscriptions of the addressed user.
+So the number of streaming clients doesn't change the load
+on the database, unlike polling.
+
+Every subscription has a bounded queue. When a client is too slow,
+its oldest events are dropped, so it can't make the worker
+accumulate memory.
+"""
+
+import asyncio
+import contextlib
+import uuid
+from typing import Any, Dict, Optional, Set, Union
+
+import ujson
+from loguru import logger
+from prometheus_client import Counter, Gauge
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, AsyncSession
+from starlette.requests import HTTPConnection
+
+CHANNEL = "user_events"
+# Postgres rejects payloads longer than 8000 bytes.
+MAX_PAYLOAD = 8000
+_RECONNECT_DELAY = 1.0
+
+STREAM_CONNECTIONS = Gauge(
+    "stream_connections",
+    "Open streaming connections.",
+    multiprocess_mode="livesum",
+)
+STREAM_EVENTS = Counter(
+    "stream_events_total",
+    "Events sent to streaming clients by the result.",
+    ["result"],
+)
+
+
+class TooManyStreamsError(Exception):
+    """The worker has no capacity for another streaming client or is stopped."""
+
+
+class Subscription:
+    """Events addressed to one streaming client."""
+
+    def __init__(self, hub: "NotificationHub", user_id: str, queue_size: int) -> None:
+        self.hub = hub
+        self.user_id = user_id
+        self._queue: "asyncio.Queue[Optional[Dict[str, Any]]]" = asyncio.Queue(
+            queue_size,
+        )
+
+    def put(self, event: Optional[Dict[str, Any]]) -> None:
+        """
+        Queues an event, dropping the oldest one if the queue is full.
+
+        :param event: event to send, None ends the stream.
+        """
+        if self._queue.full():
+            self._queue.get_nowait()
+            STREAM_EVENTS.labels("dropped").inc()
+        self._queue.put_nowait(event)
+
+    async def get(self) -> Optional[Dict[str, Any]]:
+        """
+        Waits for the next event.
+
+        :return: event or None if the hub is stopped.
+        """
+        return await self._queue.get()
+
+    def close(self) -> None:
+        """Removes the subscription from the hub."""
+        self.hub.unsubscribe(self)
+
+
+class NotificationHub:
+    """Listens to the notification channel and fans events out."""
+
+    def __init__(
+        self,
+        engine: AsyncEngine,
+        max_connections: int,
+        queue_size: int,
+    ) -> None:
+        self.engine = engine
+        self.max_connections = max_connections
+        self.queue_size = queue_size
+        # Set while notifications are received.
+        self.listening = asyncio.Event()
+        # Set by stop, streams opened after it would never end.
+        self.closed = False
+        self._subscriptions: Dict[str, Set[Subscription]] = {}
+        self._count = 0
+        self._task: "Optional[asyncio.Task[None]]" = None
+
+    def start(self) -> None:
+        """Starts listening in background."""
+        self._task = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        """Stops listening, ends all streams and rejects new ones."""
+        self.closed = True
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+        for subscriptions in self._subscriptions.values():
+            for subscription in subscriptions:
+                subscription.put(None)
+
+    def subscribe(self, user_id: Union[str, uuid.UUID]) -> Subscription:
+        """
+        Creates a subscription to events of the user.
+
+        :param user_id: id of the user.
+        :return: subscription, it must be closed.
+        :raises TooManyStreamsError: if max_connections is reached
+            or the hub is stopped.
+        """
+        if self.closed or self._count >= self.max_connections:
+            raise TooManyStreamsError
+        subscription = Subscription(self, str(user_id), self.queue_size)
+        self._subscriptions.setdefault(subscription.user_id, set()).add(subscription)
+        self._count += 1
+        STREAM_CONNECTIONS.inc()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        """
+        Removes the subscription.
+
+        :param subscription: subscription to remove.
+        """
+        subscriptions = self._subscriptions.get(subscription.user_id, set())
+        if subscription not in subscriptions:
+            return
+        subscriptions.discard(subscription)
+        if not subscriptions:
+            del self._subscriptions[subscription.user_id]
+        self._count -= 1
+        STREAM_CONNECTIONS.dec()
+
+    def dispatch(self, user_id: str, event: Dict[str, Any]) -> None:
+        """
+        Sends the event to all subscriptions of the user.
+
+        :param user_id: id of the user.
+        :param event: event to send.
+        """
+        for subscription in self._subscriptions.get(user_id, ()):
+            subscription.put(event)
+            STREAM_EVENTS.labels("queued").inc()
+
+    def _on_notification(
+        self,
+        connection: Any,
+        pid: int,
+        channel: str,
+        payload: str,
+    ) -> None:
+        try:
+            message = ujson.loads(payload)
+            self.dispatch(message["user_id"], message["event"])
+        except (ValueError, KeyError, TypeError):
+            logger.warning("Malformed notification: {}", payload)
+
+    async def _listen(self) -> None:
+        """Holds a listening connection and reconnects when it's lost."""
+        while True:
+            try:
+                await self._listen_once()
+                logger.warning("Notification connection is lost, reconnecting")
+            except Exception as exc:
+                logger.error("Cannot listen to notifications: {}", exc)
+            await asyncio.sleep(_RECONNECT_DELAY)
+
+    async def _listen_once(self) -> None:
+        """Listens on a pooled connection until it's closed."""
+        lost: "asyncio.Future[None]" = asyncio.get_running_loop().create_future()
+
+        def _on_termination(_: Any) -> None:
+            if not lost.done():
+                lost.set_result(None)
+
+        async with self.engine.connect() as conn:
+            raw = await conn.get_raw_connection()
+            driver = raw.driver_connection
+            driver.add_termination_listener(_on_termination)  # type: ignore
+            await driver.add_listener(CHANNEL, self._on_notification)  # type: ignore
+            self.listening.set()
+            try:
+                await lost
+            finally:
+                self.listening.clear()
+                # The connection goes back to the pool,
+                # so it must not listen anymore.
+                with contextlib.suppress(Exception):
+                    driver.remove_termination_listener(  # type: ignore
+                        _on_termination,
+                    )
+                    await driver.remove_listener(  # type: ignore
+                        CHANNEL,
+                        self._on_notification,
+                    )
+
+
+async def notify(
+    conn: Union[AsyncConnection, AsyncSession],
+    user_id: Union[str, uuid.UUID],
+    event: Dict[str, Any],
+) -> None:
+    """
+    Publishes an event to streams of the user.
+
+    It's delivered when the current transaction is committed.
+
+    :param conn: database connection or session.
+    :param user_id: id of the user.
+    :param event: JSON-serializable event with "type" key.
+    :raises ValueError: if the event is too large for a notification.
+    """
+    payload = ujson.dumps({"user_id": str(user_id), "event": event})
+    if len(payload.encode()) > MAX_PAYLOAD:
+        raise ValueError("Event is too large, send a reference instead")
+    await conn.execute(
+        text("SELECT pg_notify(:channel, :payload)"),
+        {"channel": CHANNEL, "payload": payload},
+    )
+
+
+def get_notification_hub(connection: HTTPConnection) -> NotificationHub:
+    """
+    Returns the notification hub of the application.
+
+    :param connection: current request or websocket.
+    :return: notification hub.
+    """
+    return connection.app.state.notification_hub
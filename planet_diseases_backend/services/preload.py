@@ -0,0 +1,77 @@
+"""
+Heavy read-only state that can be loaded before fork.
+
+When gunicorn runs with ``preload`` enabled, the master process
+imports the application and calls :func:`preload_state` once.
+Every function registered with :func:`preloader` runs there,
+so ML models, lookup indexes and other read-only data
+are loaded once and shared with workers through copy-on-write pages.
+
+Anything bound to a running event loop or a socket,
+such as database engines, must not be created here.
+Such things are created in startup events of every worker.
+"""
+
+import gc
+from typing import Callable, List
+
+from loguru import logger
+
+from planet_diseases_backend.db.models import load_all_models
+
+Preloader = Callable[[], None]
+
+_preloaders: List[Preloader] = []
+_loaded = False
+
+
+def preloader(func: Preloader) -> Preloader:
+    """
+    Registers function that loads read-only state.
+
+    :param func: function to register.
+    :return: the same function.
+    """
+    _preloaders.append(func)
+    return func
+
+
+def load_state() -> None:
+    """
+    Loads all registered read-only state.
+
+    It does nothing if the state was already loaded,
+    for example in gunicorn master before fork.
+    """
+    global _loaded  # noqa: PLW0603
+    if _loaded:
+        return
+    load_all_models()
+    for func in _preloaders:
+        logger.info("Loading {}", func.__qualname__)
+        func()
+    _loaded = True
+
+
+def is_loaded() -> bool:
+    """
+    Checks if read-only state is loaded.
+
+    :return: True after all preloaders have run.
+    """
+    return _loaded
+
+
+def preload_state() -> None:
+    """
+    Loads read-only state before fork.
+
+    It also freezes garbage collector, so objects
+    created before fork are moved to the permanent generation.
+    Otherwise, the first collection in every worker touches them
+    and copies shared pages.
+    """
+    load_state()
+    gc.collect()
+    gc.freeze()
+    logger.info("Froze {} objects before fork", gc.get_freeze_count())
@@ -0,0 +1,168 @@
+"""
+Preprocessing of images for the diagnosis model.
+
+The model takes float32 tensors of shape ``(batch, 3, size, size)``:
+RGB images scaled to ``[0, 1]`` and normalized by per-channel
+mean and standard deviation.
+
+Doing that image by image allocates several temporary arrays
+per image and runs the same small NumPy operations many times,
+holding the GIL between them. Here images are resized by Pillow,
+copied into one uint8 array of the whole batch, and the batch
+is normalized and reordered to channels first by two in-place
+ufuncs, which release the GIL for the whole batch::
+
+    (x / 255 - mean) / std == x * scale - shift
+
+Arrays are preallocated for the largest batch and reused,
+see :class:`BufferPool`, so steady-state preprocessing allocates
+only the per-image copies Pillow makes.
+"""
+
+import threading
+from contextlib import contextmanager
+from typing import Callable, Generator, Generic, List, Sequence, TypeVar
+
+import numpy as np
+from numpy.typing import NDArray
+from PIL import Image, ImageOps
+
+from planet_diseases_backend.settings import settings
+
+T = TypeVar("T")
+
+
+class BufferPool(Generic[T]):
+    """
+    Thread-safe pool of reusable buffers.
+
+    A buffer is created when the pool is empty, so callers never wait.
+    At most ``size`` released buffers are kept, others are dropped.
+    """
+
+    def __init__(self, factory: Callable[[], T], size: int) -> None:
+        self.factory = factory
+        self.size = size
+        # Number of buffers created by the pool.
+        self.created = 0
+        self._free: List[T] = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def acquire(self) -> Generator[T, None, None]:
+        """
+        Takes a buffer from the pool.
+
+        The buffer is returned to the pool on exit,
+        it must not be used after that.
+
+        :yield: buffer.
+        """
+        with self._lock:
+            buffer = self._free.pop() if self._free else None
+        if buffer is None:
+            buffer = self.factory()
+            with self._lock:
+                self.created += 1
+        try:
+            yield buffer
+        finally:
+            with self._lock:
+                if len(self._free) < self.size:
+                    self._free.append(buffer)
+
+
+class _Buffers:
+    """Arrays of one batch."""
+
+    def __init__(self, batch_size: int, size: int) -> None:
+        # Resized images, channels last as Pillow stores them.
+        self.pixels = np.empty((batch_size, size, size, 3), dtype=np.uint8)
+        # Model input, channels first.
+        self.tensor = np.empty((batch_size, 3, size, size), dtype=np.float32)
+
+
+class Preprocessor:
+    """Converts batches of decoded images to model inputs."""
+
+    def __init__(
+        self,
+        size: int,
+        mean: Sequence[float],
+        std: Sequence[float],
+        batch_size: int,
+        pool_size: int,
+    ) -> None:
+        self.size = size
+        self.batch_size = batch_size
+        std_array = np.asarray(std, dtype=np.float32)
+        # Broadcast over (batch, channel, height, width).
+        self.scale = (1 / (255 * std_array)).reshape(3, 1, 1)
+        self.shift = (np.asarray(mean, dtype=np.float32) / std_array).reshape(3, 1, 1)
+        self.pool: BufferPool[_Buffers] = BufferPool(
+            lambda: _Buffers(batch_size, size),
+            pool_size,
+        )
+
+    def _resize(self, image: Image.Image) -> Image.Image:
+        """
+        Crops the image to the model input size.
+
+        Model derivatives of the image store already have it.
+
+        :param image: decoded image.
+        :return: RGB image of the model input size.
+        """
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        if image.size != (self.size, self.size):
+            image = ImageOps.fit(image, (self.size, self.size))
+        return image
+
+    @contextmanager
+    def batch(
+        self,
+        images: Sequence[Image.Image],
+    ) -> Generator[NDArray[np.float32], None, None]:
+        """
+        Converts images to one model input.
+
+        The tensor is a view of a pooled buffer. It's valid only
+        inside the context, copy it to keep it longer.
+
+        :param images: decoded images.
+        :yield: float32 tensor of shape (len(images), 3, size, size).
+        :raises ValueError: if there are more images than the batch size.
+        """
+        if len(images) > self.batch_size:
+            raise ValueError(
+                f"Batch of {len(images)} images exceeds {self.batch_size}",
+            )
+        count = len(images)
+        with self.pool.acquire() as buffers:
+            pixels = buffers.pixels[:count]
+            for index, image in enumerate(images):
+                pixels[index] = np.asarray(self._resize(image))
+            tensor = buffers.tensor[:count]
+            np.multiply(
+                pixels.transpose(0, 3, 1, 2),
+                self.scale,
+                out=tensor,
+            )
+            np.subtract(tensor, self.shift, out=tensor)
+            yield tensor
+
+
+def create_preprocessor() -> Preprocessor:
+    """
+    Creates the preprocessor configured by settings.
+
+    :return: preprocessor.
+    """
+    return Preprocessor(
+        size=settings.image_model_input_size,
+        mean=settings.image_model_mean,
+        std=settings.image_model_std,
+        batch_size=settings.image_batch_size,
+        pool_size=settings.image_buffer_pool_size,
+    )
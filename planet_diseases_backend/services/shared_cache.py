@@ -0,0 +1,342 @@
+"""
+Cross-worker cache backed by a memory-mapped file.
+
+Gunicorn starts several independent workers, so an ordinary
+in-process cache is duplicated and warmed up once per worker.
+This cache lives in a single file that every worker maps into
+memory, so a value computed by one worker is visible to all of them.
+
+The file is split into fixed-size slots. A key is hashed to a slot
+index and up to ``probes`` neighbouring slots are searched.
+Every slot is guarded by a sequence counter (a seqlock):
+writers make it odd while they change the slot and even again
+when they are done. Readers never take a lock, they just retry
+if the counter changed while they were copying the slot.
+Writers are serialized with ``flock`` on the cache file.
+"""
+
+import fcntl
+import hashlib
+import mmap
+import os
+import struct
+import threading
+import time
+from pathlib import Path
+from types import TracebackType
+from typing import Any, Awaitable, Callable, Iterator, Optional, Tuple, Type
+
+import ujson
+from starlette.requests import Request
+
+MAGIC = b"PDBCACHE"
+VERSION = 1
+
+# magic, version, slots count, slot size.
+_FILE_HEADER = struct.Struct("<8sIII")
+FILE_HEADER_SIZE = 32
+
+# seq, key hash (two halves), expiration timestamp, payload length.
+_SLOT_HEADER = struct.Struct("<QQQdI")
+SLOT_HEADER_SIZE = 40
+_SEQ = struct.Struct("<Q")
+
+_READ_RETRIES = 16
+
+
+def _key_hash(key: str) -> Tuple[int, int]:
+    """
+    Compute a process-independent hash of the key.
+
+    Builtin ``hash`` is randomized per process,
+    so it can't be used to address shared slots.
+
+    :param key: cache key.
+    :return: two 64-bit halves of the digest.
+    """
+    digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+    high, low = struct.unpack("<QQ", digest)
+    # Zero key marks an empty slot.
+    return high or 1, low
+
+
+class SharedCache:
+    """Hash-indexed fixed-slot cache shared between processes."""
+
+    def __init__(
+        self,
+        path: Path,
+        slots: int,
+        slot_size: int,
+        probes: int = 4,
+    ) -> None:
+        if slot_size <= SLOT_HEADER_SIZE:
+            raise ValueError("Slot size must be bigger than the slot header.")
+        self.path = path
+        self.slots = slots
+        self.slot_size = slot_size
+        self.probes = min(probes, slots)
+        self.capacity = slot_size - SLOT_HEADER_SIZE
+        self._lock = threading.Lock()
+        self._fd = self._open_file()
+        self._mm = mmap.mmap(self._fd, self._file_size())
+
+    def _file_size(self) -> int:
+        return FILE_HEADER_SIZE + self.slots * self.slot_size
+
+    def _open_file(self) -> int:
+        """
+        Open the cache file and initialize it if needed.
+
+        If the file was created with another layout,
+        it's truncated and initialized again.
+
+        :return: file descriptor.
+        """
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        header = _FILE_HEADER.pack(MAGIC, VERSION, self.slots, self.slot_size)
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            current = os.pread(fd, _FILE_HEADER.size, 0)
+            if current != header or os.fstat(fd).st_size != self._file_size():
+                os.ftruncate(fd, 0)
+                os.ftruncate(fd, self._file_size())
+                os.pwrite(fd, header, 0)
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        return fd
+
+    def _offsets(self, high: int) -> Iterator[int]:
+        start = high % self.slots
+        for probe in range(self.probes):
+            index = (start + probe) % self.slots
+            yield FILE_HEADER_SIZE + index * self.slot_size
+
+    def _read_slot(self, offset: int) -> Tuple[int, int, float, bytes]:
+        """
+        Read consistent copy of the slot without locking.
+
+        :param offset: offset of the slot in the file.
+        :return: key halves, expiration time and payload.
+        """
+        for _ in range(_READ_RETRIES):
+            (seq,) = _SEQ.unpack_from(self._mm, offset)
+            if seq & 1:
+                continue
+            _, high, low, expires, length = _SLOT_HEADER.unpack_from(self._mm, offset)
+            length = min(length, self.capacity)
+            start = offset + SLOT_HEADER_SIZE
+            payload = self._mm[start : start + length]
+            if _SEQ.unpack_from(self._mm, offset)[0] == seq:
+                return high, low, expires, payload
+        # Slot is being rewritten too often, treat it as a miss.
+        return 0, 0, 0.0, b""
+
+    def get(self, key: str) -> Optional[bytes]:
+        """
+        Get raw value from the cache.
+
+        :param key: cache key.
+        :return: cached bytes or None if there is no fresh value.
+        """
+        high, low = _key_hash(key)
+        now = time.time()
+        for offset in self._offsets(high):
+            slot_high, slot_low, expires, payload = self._read_slot(offset)
+            if (slot_high, slot_low) == (high, low) and expires > now:
+                return payload
+        return None
+
+    def set(self, key: str, value: bytes, ttl: float) -> bool:
+        """
+        Put raw value in the cache.
+
+        The value replaces the same key, an empty or an expired slot.
+        If all probed slots are busy, the one that expires first is evicted.
+
+        :param key: cache key.
+        :param value: bytes to store.
+        :param ttl: time to live in seconds.
+        :return: False if the value doesn't fit in a slot.
+        """
+        if len(value) > self.capacity:
+            return False
+        high, low = _key_hash(key)
+        with self._write_lock():
+            offset = self._choose_slot(high, low, time.time())
+            self._write_slot(offset, high, low, time.time() + ttl, value)
+        return True
+
+    def update(
+        self,
+        key: str,
+        function: Callable[[Optional[bytes]], bytes],
+        ttl: float,
+    ) -> bool:
+        """
+        Atomically replace raw value with a function of the current one.
+
+        The function is called with the writer lock held,
+        so it must be fast and must not touch the cache.
+
+        :param key: cache key.
+        :param function: computes new value from the current one,
+            which is None if there is no fresh value.
+        :param ttl: time to live in seconds.
+        :return: False if the new value doesn't fit in a slot.
+        """
+        high, low = _key_hash(key)
+        with self._write_lock():
+            now = time.time()
+            current = None
+            for offset in self._offsets(high):
+                slot_high, slot_low, expires, payload = self._read_slot(offset)
+                if (slot_high, slot_low) == (high, low) and expires > now:
+                    current = payload
+                    break
+            value = function(current)
+            if len(value) > self.capacity:
+                return False
+            offset = self._choose_slot(high, low, now)
+            self._write_slot(offset, high, low, now + ttl, value)
+        return True
+
+    def delete(self, key: str) -> None:
+        """
+        Remove key from the cache.
+
+        :param key: cache key.
+        """
+        high, low = _key_hash(key)
+        with self._write_lock():
+            for offset in self._offsets(high):
+                _, slot_high, slot_low, _, _ = _SLOT_HEADER.unpack_from(
+                    self._mm,
+                    offset,
+                )
+                if (slot_high, slot_low) == (high, low):
+                    self._write_slot(offset, 0, 0, 0.0, b"")
+
+    def get_json(self, key: str) -> Any:
+        """
+        Get JSON-encoded value from the cache.
+
+        :param key: cache key.
+        :return: decoded value or None.
+        """
+        raw = self.get(key)
+        if raw is None:
+            return None
+        return ujson.loads(raw)
+
+    def set_json(self, key: str, value: Any, ttl: float) -> bool:
+        """
+        Put JSON-serializable value in the cache.
+
+        :param key: cache key.
+        :param value: value to store.
+        :param ttl: time to live in seconds.
+        :return: False if the value doesn't fit in a slot.
+        """
+        return self.set(key, ujson.dumps(value).encode("utf-8"), ttl)
+
+    async def get_or_compute(
+        self,
+        key: str,
+        ttl: float,
+        compute: Callable[[], Awaitable[Any]],
+    ) -> Any:
+        """
+        Get value from the cache or compute and store it.
+
+        :param key: cache key.
+        :param ttl: time to live in seconds.
+        :param compute: coroutine function that computes the value.
+        :return: cached or freshly computed value.
+        """
+        raw = self.get(key)
+        if raw is not None:
+            return ujson.loads(raw)
+        value = await compute()
+        self.set_json(key, value, ttl)
+        return value
+
+    def close(self) -> None:
+        """Unmap the segment and close the file."""
+        self._mm.close()
+        os.close(self._fd)
+
+    def _choose_slot(self, high: int, low: int, now: float) -> int:
+        victim = -1
+        victim_expires = float("inf")
+        for offset in self._offsets(high):
+            _, slot_high, slot_low, expires, _ = _SLOT_HEADER.unpack_from(
+                self._mm,
+                offset,
+            )
+            if (slot_high, slot_low) == (high, low) or expires <= now:
+                return offset
+            if expires < victim_expires:
+                victim, victim_expires = offset, expires
+        return victim
+
+    def _write_slot(
+        self,
+        offset: int,
+        high: int,
+        low: int,
+        expires: float,
+        value: bytes,
+    ) -> None:
+        (seq,) = _SEQ.unpack_from(self._mm, offset)
+        # Odd while writing. If a writer died in the middle, the sequence
+        # is still odd, so it's rounded instead of incremented.
+        writing = seq | 1
+        _SEQ.pack_into(self._mm, offset, writing)
+        _SLOT_HEADER.pack_into(
+            self._mm,
+            offset,
+            writing,
+            high,
+            low,
+            expires,
+            len(value),
+        )
+        start = offset + SLOT_HEADER_SIZE
+        self._mm[start : start + len(value)] = value
+        _SEQ.pack_into(self._mm, offset, writing + 1)
+
+    def _write_lock(self) -> "_WriteLock":
+        return _WriteLock(self._lock, self._fd)
+
+
+class _WriteLock:
+    """Lock that serializes writers in this process and between processes."""
+
+    def __init__(self, lock: threading.Lock, fd: int) -> None:
+        self.lock = lock
+        self.fd = fd
+
+    def __enter__(self) -> None:
+        self.lock.acquire()
+        fcntl.flock(self.fd, fcntl.LOCK_EX)
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        fcntl.flock(self.fd, fcntl.LOCK_UN)
+        self.lock.release()
+
+
+def get_shared_cache(request: Request) -> SharedCache:
+    """
+    Get cache shared between workers.
+
+    :param request: current request.
+    :return: shared cache.
+    """
+    return request.app.state.shared_cache
@@ -0,0 +1,109 @@
+"""
+Coalescing of identical concurrent reads.
+
+When many clients request the same data at once, for example after
+a deploy or when a cached value expires, every request would run
+the same query. With single-flight, the first caller runs it
+and callers with the same key that arrive before it finishes
+wait for it and get the same result.
+
+The result is shared between requests, so it must not be mutated.
+Only idempotent reads should be coalesced: a caller may get data
+read by another request's transaction that started slightly earlier.
+"""
+
+import asyncio
+import functools
+from typing import Any, Awaitable, Callable, Dict, Hashable, TypeVar
+
+from prometheus_client import Counter
+
+from planet_diseases_backend.settings import settings
+
+T = TypeVar("T")
+
+SINGLE_FLIGHT_CALLS = Counter(
+    "single_flight_calls_total",
+    "Calls of coalesced functions.",
+    ["name", "result"],
+)
+
+
+class SingleFlight:
+    """Runs at most one call per key at a time and shares its result."""
+
+    def __init__(self, name: str, max_keys: int) -> None:
+        self.name = name
+        self.max_keys = max_keys
+        self._calls: Dict[Hashable, "asyncio.Future[Any]"] = {}
+
+    async def do(self, key: Hashable, function: Callable[[], Awaitable[T]]) -> T:
+        """
+        Runs the function or joins the call in flight with the same key.
+
+        Only max_keys calls are tracked. When there are more of them,
+        the function is run without coalescing.
+        If the caller that runs the function is cancelled,
+        the callers waiting for it run the function again.
+
+        :param key: identifies calls that return the same result.
+        :param function: coroutine function that computes the result.
+        :return: result of the function.
+        """
+        future = self._calls.get(key)
+        if future is not None:
+            SINGLE_FLIGHT_CALLS.labels(self.name, "coalesced").inc()
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+            return await self.do(key, function)
+
+        if len(self._calls) >= self.max_keys:
+            SINGLE_FLIGHT_CALLS.labels(self.name, "untracked").inc()
+            return await function()
+
+        SINGLE_FLIGHT_CALLS.labels(self.name, "executed").inc()
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        try:
+            result = await function()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as exc:
+            future.set_exception(exc)
+            # Nobody may wait for the future, don't warn about it.
+            future.exception()
+            raise
+        finally:
+            del self._calls[key]
+        future.set_result(result)
+        return result
+
+
+def coalesce(
+    name: str,
+) -> Callable[[Callable[..., Awaitable[T]]], Callable[..., Awaitable[T]]]:
+    """
+    Coalesces concurrent calls of a DAO method with equal arguments.
+
+    ``self`` isn't a part of the key, because every request
+    has its own DAO instance with its own session.
+    Arguments must be hashable.
+
+    :param name: name of the method in metrics.
+    :return: decorator.
+    """
+    flight = SingleFlight(name, settings.single_flight_max_keys)
+
+    def _decorator(method: Callable[..., Awaitable[T]]) -> Callable[..., Awaitable[T]]:
+        @functools.wraps(method)
+        async def _wrapper(self: Any, *args: Any, **kwargs: Any) -> T:
+            key = (args, tuple(sorted(kwargs.items())))
+            return await flight.do(key, lambda: method(self, *args, **kwargs))
+
+        return _wrapper
+
+    return _decorator
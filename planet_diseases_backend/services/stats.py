@@ -0,0 +1,237 @@
+"""
+Statistics of diagnoses for dashboards.
+
+Diagnoses are recorded as usage events of kind ``diagnosis``
+with crop, disease and optional region in the payload::
+
+    record_event(request, DIAGNOSIS, user.id, {"crop": ..., "disease": ...})
+
+When the event recorder writes a batch of events, it adds
+its diagnoses to daily counters in ``diagnosis_stats``
+in the same transaction. So aggregates are never computed
+over raw events, and counters can't disagree with them.
+
+Every worker keeps counters of the last ``stats_max_days`` days
+in memory. They are refreshed in background with rows changed
+since the previous refresh, and the snapshot is replaced as a whole,
+so readers never see a partially applied refresh.
+"""
+
+import asyncio
+import contextlib
+import uuid
+from collections import Counter
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import ujson
+from loguru import logger
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+from starlette.requests import Request
+
+from planet_diseases_backend.db.models.diagnosis_stats import DiagnosisStats
+
+DIAGNOSIS = "diagnosis"
+_FIELD_LENGTH = 64
+# Rows are updated with the start time of their transaction,
+# so rows committed shortly after a refresh are read again.
+_REFRESH_OVERLAP = timedelta(minutes=1)
+
+# Crop, disease and region.
+StatsKey = Tuple[str, str, str]
+
+
+def _field(value: Any) -> str:
+    return str(value).strip().lower()[:_FIELD_LENGTH]
+
+
+def summarize(
+    batch: Iterable[Tuple[str, Optional[uuid.UUID], Optional[str], datetime]],
+) -> List[Dict[str, Any]]:
+    """
+    Counts diagnoses of the batch by day, crop, disease and region.
+
+    Events with malformed payloads are not counted.
+
+    :param batch: usage events as they are written.
+    :return: increments of diagnosis_stats rows ordered by their keys,
+        so concurrent writers lock rows in the same order.
+    """
+    counts: "Counter[Tuple[date, str, str, str]]" = Counter()
+    for kind, _, payload, created_at in batch:
+        if kind != DIAGNOSIS or payload is None:
+            continue
+        try:
+            details = ujson.loads(payload)
+            crop, disease = _field(details["crop"]), _field(details["disease"])
+            region = _field(details.get("region") or "")
+        except (ValueError, KeyError, TypeError, AttributeError):
+            continue
+        if crop and disease:
+            day = created_at.astimezone(timezone.utc).date()
+            counts[day, crop, disease, region] += 1
+    return [
+        {"day": day, "crop": crop, "disease": disease, "region": region, "count": n}
+        for (day, crop, disease, region), n in sorted(counts.items())
+    ]
+
+
+async def add_diagnoses(conn: AsyncConnection, rows: List[Dict[str, Any]]) -> None:
+    """
+    Increments daily counters.
+
+    :param conn: connection in the transaction that writes events.
+    :param rows: increments from :func:`summarize`.
+    """
+    if not rows:
+        return
+    statement = insert(DiagnosisStats)
+    await conn.execute(
+        statement.on_conflict_do_update(
+            index_elements=[
+                DiagnosisStats.day,
+                DiagnosisStats.crop,
+                DiagnosisStats.disease,
+                DiagnosisStats.region,
+            ],
+            set_={
+                "count": DiagnosisStats.count + statement.excluded.count,
+                "updated_at": func.now(),
+            },
+        ),
+        rows,
+    )
+
+
+class StatsSnapshot:
+    """Immutable daily counters as of the refresh."""
+
+    def __init__(
+        self,
+        days: Dict[date, Dict[StatsKey, int]],
+        refreshed_at: datetime,
+    ) -> None:
+        self.days = days
+        self.refreshed_at = refreshed_at
+
+    @property
+    def today(self) -> date:
+        """
+        Last day of the snapshot.
+
+        :return: UTC date of the refresh.
+        """
+        return self.refreshed_at.astimezone(timezone.utc).date()
+
+    def counts(
+        self,
+        days: int,
+        crop: Optional[str] = None,
+        disease: Optional[str] = None,
+        region: Optional[str] = None,
+    ) -> List[Tuple[StatsKey, int]]:
+        """
+        Sums counters of the last days.
+
+        :param days: number of days, including today.
+        :param crop: count only diagnoses of this crop.
+        :param disease: count only diagnoses of this disease.
+        :param region: count only diagnoses in this region.
+        :return: numbers of diagnoses by crop, disease and region,
+            most frequent first.
+        """
+        first_day = self.today - timedelta(days=days - 1)
+        wanted = [
+            (index, _field(value))
+            for index, value in enumerate((crop, disease, region))
+            if value is not None
+        ]
+        totals: "Counter[StatsKey]" = Counter()
+        for day, counters in self.days.items():
+            if day < first_day:
+                continue
+            for key, count in counters.items():
+                if all(key[index] == value for index, value in wanted):
+                    totals[key] += count
+        return totals.most_common()
+
+
+class StatsCache:
+    """Snapshot of recent statistics refreshed in background."""
+
+    def __init__(self, engine: AsyncEngine, max_days: int, interval: float) -> None:
+        self.engine = engine
+        self.max_days = max_days
+        self.interval = interval
+        # None until the first refresh.
+        self.snapshot: Optional[StatsSnapshot] = None
+        self._task: "Optional[asyncio.Task[None]]" = None
+
+    def start(self) -> None:
+        """Starts refreshing in background."""
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stops the background task."""
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+    async def refresh(self) -> None:
+        """Reads counters changed since the last refresh."""
+        previous = self.snapshot
+        async with self.engine.connect() as conn:
+            now: datetime = (await conn.execute(select(func.now()))).scalar_one()
+            first_day = now.astimezone(timezone.utc).date() - timedelta(
+                days=self.max_days - 1,
+            )
+            query = select(
+                DiagnosisStats.day,
+                DiagnosisStats.crop,
+                DiagnosisStats.disease,
+                DiagnosisStats.region,
+                DiagnosisStats.count,
+            ).where(DiagnosisStats.day >= first_day)
+            if previous is not None:
+                query = query.where(
+                    DiagnosisStats.updated_at
+                    > previous.refreshed_at - _REFRESH_OVERLAP,
+                )
+            rows = await conn.execute(query)
+
+        days: Dict[date, Dict[StatsKey, int]] = {}
+        if previous is not None:
+            days = {
+                day: counters
+                for day, counters in previous.days.items()
+                if day >= first_day
+            }
+        changed: Dict[date, Dict[StatsKey, int]] = {}
+        for day, crop, disease, region, count in rows:
+            if day not in changed:
+                # Counters of the previous snapshot may be in use.
+                changed[day] = days[day] = dict(days.get(day, {}))
+            changed[day][crop, disease, region] = count
+        self.snapshot = StatsSnapshot(days, now)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.refresh()
+            except Exception as exc:
+                logger.error("Cannot refresh statistics: {}", exc)
+            await asyncio.sleep(self.interval)
+
+
+def get_stats_cache(request: Request) -> StatsCache:
+    """
+    Returns the statistics cache of the application.
+
+    :param request: current request.
+    :return: statistics cache.
+    """
+    return request.app.state.stats_cache
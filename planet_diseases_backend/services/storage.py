@@ -0,0 +1,505 @@
+"""
+Object storage for uploaded files and model artifacts.
+
+Objects are addressed by keys like ``models/v3/weights.bin``
+and stored by one of the backends chosen by ``storage_backend``:
+
+* ``local`` keeps objects as files under ``storage_dir``. It's meant
+  for tests and deployments with a single node.
+* ``s3`` keeps them in a bucket of Amazon S3 or a compatible service,
+  such as MinIO. Requests are sent with httpx and signed
+  with AWS Signature Version 4.
+
+Objects are read and written as streams of chunks, so memory doesn't
+depend on the size of objects. Reads may be limited to a byte range,
+ranges are clamped to the object, so a range past its end is empty.
+Writes to S3 are split into parts of ``storage_part_size`` bytes,
+up to ``storage_upload_concurrency`` parts are uploaded at once,
+so a write holds at most ``concurrency + 1`` parts in memory.
+Objects smaller than a part are uploaded with one request.
+"""
+
+import abc
+import asyncio
+import contextlib
+import hashlib
+import hmac
+import re
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path, PurePosixPath
+from typing import AsyncIterable, AsyncIterator, Dict, List, Optional, Tuple
+from urllib.parse import quote
+
+import aiofiles
+import aiofiles.os
+import httpx
+from starlette.requests import Request
+
+from planet_diseases_backend.settings import settings
+
+CHUNK_SIZE = 64 * 1024
+_EMPTY_SHA256 = hashlib.sha256(b"").hexdigest()
+_UPLOAD_ID = re.compile(r"<UploadId>([^<]+)</UploadId>")
+
+
+class ObjectNotFoundError(LookupError):
+    """Object with the key doesn't exist."""
+
+
+def check_key(key: str) -> str:
+    """
+    Checks that the key is a relative path without dot segments.
+
+    :param key: key of an object.
+    :return: the key.
+    :raises ValueError: if the key may escape the storage.
+    """
+    parts = key.split("/")
+    if not key or key.startswith("/") or any(part in {"", ".", ".."} for part in parts):
+        raise ValueError(f"Invalid object key: {key!r}")
+    return key
+
+
+class Storage(abc.ABC):
+    """Object storage, see backends below."""
+
+    @abc.abstractmethod
+    async def put(self, key: str, chunks: AsyncIterable[bytes]) -> int:
+        """
+        Writes an object, replacing an existing one.
+
+        Readers never see a partially written object.
+
+        :param key: key of the object.
+        :param chunks: content of the object.
+        :return: size of the object.
+        """
+
+    @abc.abstractmethod
+    def get(
+        self,
+        key: str,
+        start: int = 0,
+        end: Optional[int] = None,
+    ) -> AsyncIterator[bytes]:
+        """
+        Reads an object or its byte range.
+
+        Bytes of the range past the end of the object are not read,
+        a range that starts past the end is empty.
+
+        :param key: key of the object.
+        :param start: first byte.
+        :param end: last byte, inclusive, the end of the object by default.
+        :return: chunks of the content.
+        """
+
+    @abc.abstractmethod
+    async def size(self, key: str) -> int:
+        """
+        Size of an object.
+
+        :param key: key of the object.
+        :return: size in bytes.
+        """
+
+    @abc.abstractmethod
+    async def delete(self, key: str) -> None:
+        """
+        Deletes an object, missing objects are ignored.
+
+        :param key: key of the object.
+        """
+
+    async def close(self) -> None:  # noqa: B027
+        """Releases connections of the storage."""
+
+
+class LocalStorage(Storage):
+    """Objects stored as files in a directory."""
+
+    def __init__(self, root: Path) -> None:
+        self.root = root
+
+    def path(self, key: str) -> Path:
+        """
+        Path of the object file.
+
+        :param key: key of the object.
+        :return: path of the file, it may not exist.
+        """
+        return self.root.joinpath(*PurePosixPath(check_key(key)).parts)
+
+    async def put(self, key: str, chunks: AsyncIterable[bytes]) -> int:
+        """Writes the object to a temporary file and renames it."""
+        target = self.path(key)
+        await aiofiles.os.makedirs(target.parent, exist_ok=True)
+        temporary = target.with_name(f".{target.name}.{uuid.uuid4().hex}")
+        size = 0
+        try:
+            async with aiofiles.open(temporary, "wb") as file:
+                async for chunk in chunks:
+                    size += len(chunk)
+                    await file.write(chunk)
+            await aiofiles.os.replace(temporary, target)
+        finally:
+            if await aiofiles.os.path.exists(temporary):
+                await aiofiles.os.remove(temporary)
+        return size
+
+    async def get(
+        self,
+        key: str,
+        start: int = 0,
+        end: Optional[int] = None,
+    ) -> AsyncIterator[bytes]:
+        """Reads the file in chunks."""
+        try:
+            file = await aiofiles.open(self.path(key), "rb")
+        except FileNotFoundError:
+            raise ObjectNotFoundError(key) from None
+        try:
+            await file.seek(start)
+            remaining = None if end is None else end - start + 1
+            while remaining is None or remaining > 0:
+                size = CHUNK_SIZE if remaining is None else min(CHUNK_SIZE, remaining)
+                chunk = await file.read(size)
+                if not chunk:
+                    break
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+        finally:
+            await file.close()
+
+    async def size(self, key: str) -> int:
+        """Size of the file."""
+        try:
+            stat = await aiofiles.os.stat(self.path(key))
+        except FileNotFoundError:
+            raise ObjectNotFoundError(key) from None
+        return stat.st_size
+
+    async def delete(self, key: str) -> None:
+        """Deletes the file."""
+        try:
+            await aiofiles.os.remove(self.path(key))
+        except FileNotFoundError:
+            return
+
+
+def _hmac(key: bytes, message: str) -> bytes:
+    return hmac.new(key, message.encode(), hashlib.sha256).digest()
+
+
+def sign_v4(
+    request: httpx.Request,
+    region: str,
+    access_key: str,
+    secret_key: str,
+    payload_hash: str,
+    now: datetime,
+) -> None:
+    """
+    Signs the request with AWS Signature Version 4.
+
+    Host, Range, Content-Type and x-amz-* headers are signed,
+    the signature is added to the request.
+
+    :param request: request to S3.
+    :param region: region of the bucket.
+    :param access_key: access key id.
+    :param secret_key: secret access key.
+    :param payload_hash: hex SHA-256 of the body.
+    :param now: time of the request.
+    """
+    timestamp = now.strftime("%Y%m%dT%H%M%SZ")
+    scope = f"{now:%Y%m%d}/{region}/s3/aws4_request"
+    request.headers["x-amz-date"] = timestamp
+    request.headers["x-amz-content-sha256"] = payload_hash
+    signed = {
+        name.lower(): " ".join(value.split())
+        for name, value in request.headers.items()
+        if name.lower() in {"host", "range", "content-type"}
+        or name.lower().startswith("x-amz-")
+    }
+    signed_names = ";".join(sorted(signed))
+    query = "&".join(
+        f"{quote(name, safe='-_.~')}={quote(value, safe='-_.~')}"
+        for name, value in sorted(request.url.params.multi_items())
+    )
+    canonical = "\n".join(
+        [
+            request.method,
+            quote(request.url.path, safe="/-_.~"),
+            query,
+            "".join(f"{name}:{signed[name]}\n" for name in sorted(signed)),
+            signed_names,
+            payload_hash,
+        ],
+    )
+    string_to_sign = "\n".join(
+        [
+            "AWS4-HMAC-SHA256",
+            timestamp,
+            scope,
+            hashlib.sha256(canonical.encode()).hexdigest(),
+        ],
+    )
+    key = f"AWS4{secret_key}".encode()
+    for part in (f"{now:%Y%m%d}", region, "s3", "aws4_request"):
+        key = _hmac(key, part)
+    signature = hmac.new(key, string_to_sign.encode(), hashlib.sha256).hexdigest()
+    request.headers["Authorization"] = (
+        f"AWS4-HMAC-SHA256 Credential={access_key}/{scope}, "
+        f"SignedHeaders={signed_names}, Signature={signature}"
+    )
+
+
+class S3Storage(Storage):
+    """Objects stored in a bucket of an S3-compatible service."""
+
+    def __init__(
+        self,
+        client: httpx.AsyncClient,
+        bucket: str,
+        region: str,
+        access_key: str,
+        secret_key: str,
+        part_size: int,
+        concurrency: int,
+    ) -> None:
+        self.client = client
+        self.bucket = bucket
+        self.region = region
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.part_size = part_size
+        self.concurrency = concurrency
+
+    async def _send(
+        self,
+        method: str,
+        key: str,
+        params: Optional[Dict[str, str]] = None,
+        body: bytes = b"",
+        headers: Optional[Dict[str, str]] = None,
+        stream: bool = False,
+    ) -> httpx.Response:
+        """
+        Sends a signed request for an object.
+
+        Buckets are addressed by path, which every compatible
+        service supports.
+
+        :param method: HTTP method.
+        :param key: key of the object.
+        :param params: query parameters.
+        :param body: body of the request.
+        :param headers: extra headers.
+        :param stream: whether the body of the response is streamed.
+        :return: successful response.
+        :raises ObjectNotFoundError: if the object doesn't exist.
+        """
+        request = self.client.build_request(
+            method,
+            f"/{self.bucket}/{quote(check_key(key), safe='/')}",
+            params=params,
+            content=body,
+            headers=headers,
+        )
+        sign_v4(
+            request,
+            self.region,
+            self.access_key,
+            self.secret_key,
+            hashlib.sha256(body).hexdigest() if body else _EMPTY_SHA256,
+            datetime.now(timezone.utc),
+        )
+        response = await self.client.send(request, stream=stream)
+        if response.status_code == 404:
+            await response.aclose()
+            raise ObjectNotFoundError(key)
+        if response.is_error:
+            await response.aread()
+            response.raise_for_status()
+        return response
+
+    async def put(self, key: str, chunks: AsyncIterable[bytes]) -> int:
+        """Uploads the object with one request or in parts if it's large."""
+        buffer = bytearray()
+        iterator = chunks.__aiter__()
+        async for chunk in iterator:
+            buffer += chunk
+            if len(buffer) > self.part_size:
+                return await self._put_multipart(key, buffer, iterator)
+        await self._send("PUT", key, body=bytes(buffer))
+        return len(buffer)
+
+    async def _parts(
+        self,
+        buffer: bytearray,
+        chunks: AsyncIterator[bytes],
+    ) -> AsyncIterator[bytes]:
+        """
+        Splits the content into parts.
+
+        :param buffer: beginning of the content.
+        :param chunks: rest of the content.
+        :yield: parts of part_size bytes, the last one may be smaller.
+        """
+        while True:
+            while len(buffer) >= self.part_size:
+                part = bytes(buffer[: self.part_size])
+                del buffer[: self.part_size]
+                yield part
+            try:
+                buffer += await chunks.__anext__()
+            except StopAsyncIteration:
+                break
+        if buffer:
+            yield bytes(buffer)
+
+    async def _put_multipart(
+        self,
+        key: str,
+        buffer: bytearray,
+        chunks: AsyncIterator[bytes],
+    ) -> int:
+        """
+        Uploads an object in parts, several parts at once.
+
+        The next part is read only when there is a free upload slot,
+        so slow uploads slow reading down instead of buffering.
+
+        :param key: key of the object.
+        :param buffer: beginning of the content.
+        :param chunks: rest of the content.
+        :return: size of the object.
+        :raises DecodingError: if the service doesn't start the upload.
+        """
+        response = await self._send("POST", key, params={"uploads": ""})
+        match = _UPLOAD_ID.search(response.text)
+        if match is None:
+            raise httpx.DecodingError("No UploadId in the response")
+        upload_id = match[1]
+        slots = asyncio.Semaphore(self.concurrency)
+        uploads: List["asyncio.Task[Tuple[int, str]]"] = []
+
+        async def _upload(number: int, part: bytes) -> Tuple[int, str]:
+            try:
+                response = await self._send(
+                    "PUT",
+                    key,
+                    params={"partNumber": str(number), "uploadId": upload_id},
+                    body=part,
+                )
+                return number, response.headers["ETag"]
+            finally:
+                slots.release()
+
+        size = 0
+        try:
+            async for part in self._parts(buffer, chunks):
+                await slots.acquire()
+                # A failed part fails the upload before reading more.
+                for upload in uploads:
+                    if upload.done():
+                        upload.result()
+                size += len(part)
+                uploads.append(asyncio.create_task(_upload(len(uploads) + 1, part)))
+            parts = await asyncio.gather(*uploads)
+        except BaseException:
+            for upload in uploads:
+                upload.cancel()
+            await asyncio.gather(*uploads, return_exceptions=True)
+            # Uploaded parts are kept and billed until the upload is aborted.
+            with contextlib.suppress(httpx.HTTPError, ObjectNotFoundError):
+                await self._send("DELETE", key, params={"uploadId": upload_id})
+            raise
+        await self._send(
+            "POST",
+            key,
+            params={"uploadId": upload_id},
+            body=(
+                "<CompleteMultipartUpload>"
+                + "".join(
+                    f"<Part><PartNumber>{number}</PartNumber><ETag>{etag}</ETag></Part>"
+                    for number, etag in parts
+                )
+                + "</CompleteMultipartUpload>"
+            ).encode(),
+        )
+        return size
+
+    async def get(
+        self,
+        key: str,
+        start: int = 0,
+        end: Optional[int] = None,
+    ) -> AsyncIterator[bytes]:
+        """Streams the object, ranges are sent in the Range header."""
+        headers = {}
+        if start or end is not None:
+            headers["Range"] = f"bytes={start}-{'' if end is None else end}"
+        try:
+            response = await self._send("GET", key, headers=headers, stream=True)
+        except httpx.HTTPStatusError as exc:
+            # S3 rejects ranges that start past the end of the object.
+            if exc.response.status_code == 416:
+                return
+            raise
+        try:
+            async for chunk in response.aiter_bytes(CHUNK_SIZE):
+                yield chunk
+        finally:
+            await response.aclose()
+
+    async def size(self, key: str) -> int:
+        """Size of the object from a HEAD request."""
+        response = await self._send("HEAD", key)
+        return int(response.headers["Content-Length"])
+
+    async def delete(self, key: str) -> None:
+        """Deletes the object."""
+        try:
+            await self._send("DELETE", key)
+        except ObjectNotFoundError:
+            return
+
+    async def close(self) -> None:
+        """Closes the HTTP client."""
+        await self.client.aclose()
+
+
+def create_storage() -> Storage:
+    """
+    Creates the storage configured by settings.
+
+    :return: storage.
+    """
+    if settings.storage_backend == "local":
+        return LocalStorage(settings.storage_dir)
+    return S3Storage(
+        httpx.AsyncClient(
+            base_url=settings.storage_s3_endpoint,
+            timeout=settings.storage_s3_timeout,
+        ),
+        bucket=settings.storage_s3_bucket,
+        region=settings.storage_s3_region,
+        access_key=settings.storage_s3_access_key,
+        secret_key=settings.storage_s3_secret_key,
+        part_size=settings.storage_part_size,
+        concurrency=settings.storage_upload_concurrency,
+    )
+
+
+def get_storage(request: Request) -> Storage:
+    """
+    Returns the object storage of the application.
+
+    :param request: current request.
+    :return: storage.
+    """
+    return request.app.state.storage
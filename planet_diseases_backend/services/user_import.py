@@ -0,0 +1,276 @@
+"""
+Bulk import of users.
+
+Uploads are read as a stream of lines, so their size doesn't affect
+memory usage. Quoted CSV fields may span lines. Lines and records
+are never buffered beyond a length limit, longer ones are reported
+as invalid and skipped.
+Users are validated, hashed and inserted in batches:
+
+* emails that are already taken are found with one query per batch
+  and skipped before their passwords are hashed;
+* passwords are hashed in threads, argon2 releases the GIL,
+  and the number of concurrent hashes is bounded,
+  because every hash takes tens of megabytes of memory;
+* every batch is inserted with one statement and committed,
+  so a failed import keeps users of previous batches.
+"""
+
+import asyncio
+import codecs
+import csv
+import os
+from typing import Any, AsyncIterable, AsyncIterator, Dict, List, Optional, Tuple
+
+import ujson
+from anyio import CapacityLimiter, to_thread
+from fastapi_users.password import PasswordHelper
+from pydantic import BaseModel, ValidationError
+
+from planet_diseases_backend.db.dao.user_dao import UserDAO
+from planet_diseases_backend.db.models.users import UserCreate
+from planet_diseases_backend.settings import settings
+
+FORMATS = {
+    "text/csv": "csv",
+    "application/x-ndjson": "ndjson",
+    "application/jsonl": "ndjson",
+}
+# Only so many errors are reported, the rest are only counted.
+MAX_ERRORS = 100
+
+_password_helper = PasswordHelper()
+_hash_limiter: Optional[CapacityLimiter] = None
+
+
+class InvalidLine(BaseModel):
+    """Invalid line of the upload."""
+
+    line: int
+    error: str
+
+
+class ImportReport(BaseModel):
+    """Results of an import."""
+
+    created: int = 0
+    # Users with emails that are already taken.
+    skipped: int = 0
+    invalid: int = 0
+    errors: List[InvalidLine] = []
+
+
+def _get_hash_limiter() -> CapacityLimiter:
+    global _hash_limiter  # noqa: PLW0603
+    if _hash_limiter is None:
+        _hash_limiter = CapacityLimiter(
+            settings.users_import_hash_workers or os.cpu_count() or 1,
+        )
+    return _hash_limiter
+
+
+async def iter_lines(
+    chunks: AsyncIterable[bytes],
+    max_length: int,
+) -> AsyncIterator[Optional[str]]:
+    """
+    Splits a stream of bytes into lines.
+
+    A line longer than the limit is dropped while it's read,
+    so it never takes more memory than the limit.
+
+    :param chunks: UTF-8 encoded content.
+    :param max_length: maximum number of characters in a line.
+    :yield: lines without line breaks, None in place of a dropped line.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    tail = ""
+    # The beginning of the current line was dropped.
+    dropped = False
+    async for chunk in chunks:
+        *lines, tail = (tail + decoder.decode(chunk)).split("\n")
+        for line in lines:
+            if dropped or len(line.rstrip("\r")) > max_length:
+                dropped = False
+                yield None
+            else:
+                yield line.rstrip("\r")
+        if len(tail) > max_length:
+            dropped = True
+            tail = ""
+    tail = (tail + decoder.decode(b"", final=True)).rstrip("\r")
+    if dropped or len(tail) > max_length:
+        yield None
+    elif tail:
+        yield tail
+
+
+class UserImporter:
+    """Imports users from CSV or NDJSON lines."""
+
+    def __init__(
+        self,
+        dao: UserDAO,
+        file_format: str,
+        batch_size: int,
+        max_length: int,
+    ) -> None:
+        self.dao = dao
+        self.file_format = file_format
+        self.batch_size = batch_size
+        self.max_length = max_length
+        self.report = ImportReport()
+        self._header: Optional[List[str]] = None
+        self._batch: List[UserCreate] = []
+
+    async def run(self, lines: AsyncIterable[Optional[str]]) -> ImportReport:
+        """
+        Imports all users.
+
+        :param lines: lines of the upload.
+        :return: report of the import.
+        """
+        async for number, line in self._records(lines):
+            if not line.strip():
+                continue
+            try:
+                record = self._parse(line)
+                if record is None:
+                    continue
+                user = UserCreate.model_validate(record)
+            except (ValueError, ValidationError) as exc:
+                self._invalid(number, exc)
+                continue
+            self._batch.append(user)
+            if len(self._batch) >= self.batch_size:
+                await self._flush()
+        await self._flush()
+        return self.report
+
+    async def _records(
+        self,
+        lines: AsyncIterable[Optional[str]],
+    ) -> AsyncIterator[Tuple[int, str]]:
+        """
+        Groups lines to records.
+
+        A CSV record continues on the next line while it has an open
+        quoted field. Escaped quotes are doubled, so a record is
+        complete when it has an even number of quotes.
+        A record longer than max_length is reported as invalid,
+        its remaining lines are only counted. Quotes of a dropped line
+        are unknown, so it ends its record.
+
+        :param lines: lines of the upload, None for dropped lines.
+        :yield: number of the first line of the record and the record.
+        """
+        number = 0
+        start = 0
+        record: List[str] = []
+        length = 0
+        quotes = 0
+        skipping = False
+        async for line in lines:
+            number += 1
+            if not record and not skipping:
+                start = number
+            if line is None:
+                self._invalid(start, self._too_long())
+                record, length, quotes, skipping = [], 0, 0, False
+                continue
+            if self.file_format == "ndjson":
+                yield number, line
+                continue
+            quotes += line.count('"')
+            if not skipping:
+                length += len(line) + 1
+                if length > self.max_length:
+                    self._invalid(start, self._too_long())
+                    record, skipping = [], True
+                else:
+                    record.append(line)
+            if quotes % 2 == 0:
+                if not skipping:
+                    yield start, "\n".join(record)
+                record, length, quotes, skipping = [], 0, 0, False
+        if record:
+            yield start, "\n".join(record)
+
+    def _too_long(self) -> ValueError:
+        return ValueError(f"Record exceeds {self.max_length} characters")
+
+    def _parse(self, line: str) -> Optional[Dict[str, Any]]:
+        """
+        Parses a record to user fields.
+
+        :param line: record of the upload.
+        :return: fields or None for the CSV header.
+        :raises ValueError: if the line can't be parsed.
+        """
+        if self.file_format == "ndjson":
+            record = ujson.loads(line)
+            if not isinstance(record, dict):
+                raise ValueError("Line is not a JSON object")
+        else:
+            values = next(csv.reader([line]))
+            if self._header is None:
+                self._header = [name.strip() for name in values]
+                return None
+            if len(values) != len(self._header):
+                raise ValueError(f"Expected {len(self._header)} values")
+            record = dict(zip(self._header, values))
+        # Superusers are never created by imports.
+        record.pop("is_superuser", None)
+        return record
+
+    def _invalid(self, line: int, exc: Exception) -> None:
+        self.report.invalid += 1
+        if len(self.report.errors) < MAX_ERRORS:
+            if isinstance(exc, ValidationError):
+                message = "; ".join(
+                    f"{'.'.join(map(str, error['loc']))}: {error['msg']}"
+                    for error in exc.errors()
+                )
+            else:
+                message = str(exc)
+            self.report.errors.append(InvalidLine(line=line, error=message))
+
+    async def _flush(self) -> None:
+        """Hashes passwords of new users and inserts them."""
+        batch, self._batch = self._batch, []
+        if not batch:
+            return
+        taken = await self.dao.existing_emails(
+            [user.email.lower() for user in batch],
+        )
+        new_users: Dict[str, UserCreate] = {}
+        for user in batch:
+            # Duplicates within the batch are skipped too.
+            key = user.email.lower()
+            if key not in taken:
+                new_users.setdefault(key, user)
+        limiter = _get_hash_limiter()
+        hashes = await asyncio.gather(
+            *(
+                to_thread.run_sync(
+                    _password_helper.hash,
+                    user.password,
+                    limiter=limiter,
+                )
+                for user in new_users.values()
+            ),
+        )
+        values = [
+            {
+                "email": user.email,
+                "hashed_password": hashed_password,
+                "is_active": user.is_active,
+                "is_verified": user.is_verified,
+                "is_superuser": False,
+            }
+            for user, hashed_password in zip(new_users.values(), hashes)
+        ]
+        created = await self.dao.insert_many(values)
+        await self.dao.session.commit()
+        self.report.created += created
+        self.report.skipped += len(batch) - created
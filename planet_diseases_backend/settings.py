@@ -2,7 +2,7 @@ import enum
 import os
 from pathlib import Path
 from tempfile import gettempdir
-from typing import Optional
+from typing import Dict, List, Literal, Optional, Tuple, Union
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from yarl import URL
@@ -31,10 +31,61 @@ class Settings(BaseSettings):
 
     host: str = "127.0.0.1"
     port: int = 8000
-    # quantity of workers for uvicorn
-    workers_count: int = 1
+    # quantity of workers for uvicorn,
+    # "auto" sizes it from available CPUs and memory limit.
+    workers_count: Union[int, Literal["auto"]] = 1
+    # Memory budget of a single worker for "auto" workers count.
+    worker_memory_mb: int = 512
+    # Size of the thread pool for blocking calls in every worker.
+    threads_count: Union[int, Literal["auto"]] = 40
+    # Restart a worker after this many requests, 0 disables it.
+    # Random jitter spreads restarts of different workers.
+    worker_max_requests: int = 0
+    worker_max_requests_jitter: int = 0
+    # Restart a worker when its RSS exceeds this value, 0 disables it.
+    worker_max_rss_mb: int = 0
+    worker_max_rss_jitter_mb: int = 0
+    # Workers silent for more than this many seconds are killed.
+    worker_timeout: int = 30
+    # Time to finish in-flight requests on restart.
+    worker_graceful_timeout: int = 30
+    # Seconds a stopping worker keeps serving with failing readiness,
+    # so load balancers stop sending requests to it first.
+    shutdown_delay: float = 5
+    # Seconds to flush queues and close connections after requests end.
+    # Both are included in worker_graceful_timeout.
+    shutdown_timeout: float = 10
     # Enable uvicorn reloading
     reload: bool = False
+    # Load the application and read-only state
+    # in gunicorn master before forking workers.
+    preload: bool = False
+
+    # Requests a client may send per second, 0 disables rate limiting.
+    # Clients are identified by user id from JWT or by IP address.
+    rate_limit_per_second: float = 0
+    # Requests a client may send at once after being idle.
+    rate_limit_burst: int = 20
+    # Keep rate limits in the shared cache, so they apply to all workers.
+    rate_limit_shared: bool = False
+    # Maximum number of clients tracked by a worker.
+    rate_limit_max_keys: int = 100_000
+    # Maximum in-flight requests per worker by route prefix,
+    # for example {"/api/dummy": 32}.
+    route_concurrency_limits: Dict[str, int] = {}
+    # Paths that are never limited.
+    admission_exempt_paths: List[str] = ["/metrics", "/api/health"]
+    # Maximum number of distinct reads coalesced at once by one function.
+    single_flight_max_keys: int = 1024
+
+    # Users are imported in batches of this size.
+    users_import_batch_size: int = 500
+    # Passwords hashed at the same time, 0 uses the number of CPUs.
+    # Every argon2 hash takes about 64 MiB of memory.
+    users_import_hash_workers: int = 0
+    # Longer lines and CSV records are reported as invalid
+    # and skipped without being buffered.
+    users_import_max_record_length: int = 64 * 2**10
 
     # Current environment
     environment: str = "dev"
@@ -48,10 +99,108 @@ class Settings(BaseSettings):
     db_pass: str = "planet_diseases_backend"
     db_base: str = "admin"
     db_echo: bool = False
-
+    # Compiled statements cached by every engine.
+    db_query_cache_size: int = 500
+    # Prepared statements cached by every connection.
+    # Set it to 0 behind pgbouncer in transaction mode.
+    db_prepared_statement_cache_size: int = 100
+    # Log statements slower than this many milliseconds, 0 disables it.
+    db_slow_query_ms: float = 500
+    # Log EXPLAIN (ANALYZE, BUFFERS) of slow SELECTs.
+    # It's never done in production environment.
+    db_explain_slow_queries: bool = False
+    # Warn when a request executes the same statement
+    # more than this many times, 0 disables it.
+    db_repeated_query_threshold: int = 10
+    # Warn when a request session tracks more than this many
+    # objects, 0 disables it. Large reads belong to read-only sessions.
+    db_identity_map_limit: int = 1000
+
+    # Expose prometheus metrics.
+    prometheus_enabled: bool = True
+    # Report request latency breakdown in Server-Timing header.
+    server_timing_enabled: bool = False
     # This variable is used to define
     # multiproc_dir. It's required for [uvi|guni]corn projects.
     prometheus_dir: Path = TEMP_DIR / "prom"
+    # Seconds to reuse rendered metrics between scrapes, 0 disables caching.
+    prometheus_cache_seconds: float = 5
+
+    # Readiness probes run in background every health_interval seconds,
+    # checks refresh results older than health_ttl seconds themselves.
+    health_interval: float = 2
+    health_ttl: float = 5
+    health_probe_timeout: float = 1
+    # Worker isn't ready when the event queue is fuller than this ratio.
+    health_max_event_backlog: float = 0.9
+
+    # Usage events are queued in memory and written in batches.
+    # Events over the queue size are dropped.
+    events_queue_size: int = 10_000
+    events_batch_size: int = 500
+    events_flush_interval: float = 1.0
+    # Events are written at most this many seconds after they happen.
+    # Diagnoses sync reads only partitions from that long before
+    # the client's last diagnosis.
+    events_max_delay: float = 24 * 3600
+    # Months of usage events to keep, 0 keeps them forever.
+    events_retention_months: int = 12
+    # Partitions are created this many months in advance.
+    # Workers check them at startup and every
+    # partitions_maintenance_interval seconds.
+    partitions_premake_months: int = 3
+    partitions_maintenance_interval: float = 3600
+    # Detach expired partitions instead of dropping them,
+    # for example to archive them.
+    partitions_detach_only: bool = False
+    # Workers keep diagnosis statistics of this many days in memory
+    # and refresh them every stats_refresh_interval seconds.
+    stats_max_days: int = 90
+    stats_refresh_interval: float = 30
+
+    # Memory-mapped cache shared between workers.
+    # Its size is shared_cache_slots * shared_cache_slot_size bytes.
+    shared_cache_dir: Path = TEMP_DIR / "shared_cache"
+    shared_cache_slots: int = 4096
+    shared_cache_slot_size: int = 4096
+
+    # Streams of user events, the limit is per worker.
+    stream_max_connections: int = 1000
+    # Events buffered for a slow client, older ones are dropped.
+    stream_queue_size: int = 100
+    stream_heartbeat_seconds: float = 15
+
+    # Uploaded images are kept here while they are processed,
+    # then they are moved to the object storage by their SHA-256.
+    image_incoming_dir: Path = TEMP_DIR / "incoming_images"
+    image_max_bytes: int = 20 * 2**20
+    # Longest side of thumbnails and side of model input images.
+    image_thumbnail_size: int = 256
+    image_model_input_size: int = 224
+    # Threads decoding and resizing images, 0 uses the number of CPUs.
+    image_workers: int = 0
+    # Normalization of model inputs, by RGB channels of images scaled to [0, 1].
+    image_model_mean: Tuple[float, float, float] = (0.485, 0.456, 0.406)
+    image_model_std: Tuple[float, float, float] = (0.229, 0.224, 0.225)
+    # Largest batch of model inputs and batch buffers kept for reuse.
+    image_batch_size: int = 32
+    image_buffer_pool_size: int = 4
+
+    # Object storage: "local" keeps objects in storage_dir,
+    # "s3" in a bucket of S3 or a compatible service.
+    storage_backend: Literal["local", "s3"] = "local"
+    storage_dir: Path = TEMP_DIR / "storage"
+    storage_s3_endpoint: str = "https://s3.amazonaws.com"
+    storage_s3_region: str = "us-east-1"
+    storage_s3_bucket: str = "planet-diseases"
+    storage_s3_access_key: str = ""
+    storage_s3_secret_key: str = ""
+    storage_s3_timeout: float = 30
+    # Larger objects are uploaded to S3 in parts of this size,
+    # S3 requires at least 5 MiB. Every upload holds
+    # up to storage_upload_concurrency + 1 parts in memory.
+    storage_part_size: int = 8 * 2**20
+    storage_upload_concurrency: int = 4
 
     # Sentry's configuration.
     sentry_dsn: Optional[str] = None
@@ -0,0 +1,114 @@
+"""
+Startup time profiler.
+
+It's used by ``python -m planet_diseases_backend --profile-startup``.
+Import times are measured in a fresh interpreter with ``-X importtime``,
+because modules already imported by the current process cost nothing.
+Application construction is measured in-process. Startup events
+connect to the configured database and maintain its partitions,
+so they are measured only when it's asked for explicitly.
+"""
+
+import asyncio
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from typing import List, NamedTuple, TextIO, Tuple
+
+from fastapi import FastAPI
+
+APP_MODULE = "planet_diseases_backend.web.application"
+
+
+class ImportTime(NamedTuple):
+    """Import time of a single module in microseconds."""
+
+    module: str
+    self_us: int
+    cumulative_us: int
+
+
+def parse_import_times(output: str) -> List[ImportTime]:
+    """
+    Parses output of ``python -X importtime``.
+
+    :param output: stderr of the interpreter.
+    :return: import times of all modules.
+    """
+    times = []
+    for line in output.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        self_us, cumulative_us, module = line[len("import time:") :].split("|")
+        if not self_us.strip().isdigit():
+            # Header line.
+            continue
+        times.append(ImportTime(module.strip(), int(self_us), int(cumulative_us)))
+    return times
+
+
+def measure_import_times(module: str = APP_MODULE) -> List[ImportTime]:
+    """
+    Imports module in a fresh interpreter and measures import times.
+
+    :param module: module to import.
+    :return: import times of all imported modules.
+    """
+    result = subprocess.run(  # noqa: S603
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return parse_import_times(result.stderr)
+
+
+async def _run_lifespan(app: FastAPI) -> Tuple[float, float]:
+    started = time.perf_counter()
+    await app.router.startup()
+    startup = time.perf_counter() - started
+    started = time.perf_counter()
+    await app.router.shutdown()
+    return startup, time.perf_counter() - started
+
+
+def profile_startup(
+    out: TextIO = sys.stdout,
+    top: int = 20,
+    lifespan: bool = False,
+) -> None:
+    """
+    Reports import and application construction costs.
+
+    :param out: stream to write the report to.
+    :param top: number of the most expensive modules to report.
+    :param lifespan: also run startup and shutdown events,
+        they use the configured database.
+    """
+    times = measure_import_times()
+    by_package: defaultdict[str, int] = defaultdict(int)
+    for item in times:
+        by_package[item.module.split(".")[0]] += item.self_us
+    total = sum(by_package.values())
+
+    out.write(f"Import of {APP_MODULE}: {total / 1000:.1f} ms\n\n")
+    out.write(f"Top {top} packages by import time:\n")
+    for package, self_us in sorted(by_package.items(), key=lambda x: -x[1])[:top]:
+        out.write(f"  {self_us / 1000:9.1f} ms  {package}\n")
+    out.write(f"\nTop {top} modules by cumulative import time:\n")
+    for item in sorted(times, key=lambda x: -x.cumulative_us)[:top]:
+        out.write(f"  {item.cumulative_us / 1000:9.1f} ms  {item.module}\n")
+
+    from planet_diseases_backend.web.application import get_app
+
+    started = time.perf_counter()
+    app = get_app()
+    construction = time.perf_counter() - started
+    out.write("\nApplication:\n")
+    out.write(f"  {construction * 1000:9.1f} ms  get_app()\n")
+    if not lifespan:
+        return
+    startup, shutdown = asyncio.run(_run_lifespan(app))
+    out.write(f"  {startup * 1000:9.1f} ms  startup events\n")
+    out.write(f"  {shutdown * 1000:9.1f} ms  shutdown events\n")
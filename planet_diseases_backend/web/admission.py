@@ -0,0 +1,289 @@
+"""
+Admission control.
+
+:class:`AdmissionMiddleware` rejects requests before they reach
+handlers when a client sends them too fast or a route is saturated:
+
+* every client has a token bucket refilled at ``rate_limit_per_second``
+  with ``rate_limit_burst`` capacity. Clients are identified by the user id
+  from their JWT or by IP address. Requests without tokens get 429;
+* routes matching prefixes in ``route_concurrency_limits`` may run only
+  that many requests at once in a worker. Extra requests get 503.
+
+Both responses have ``Retry-After`` header.
+Buckets live in the worker by default. With ``rate_limit_shared``
+they live in the cache shared between workers, so the limit
+is applied to the whole server instead of every worker.
+"""
+
+import math
+import struct
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple, Union
+
+import jwt
+from fastapi.responses import UJSONResponse
+from fastapi_users.jwt import decode_jwt
+from prometheus_client import Counter
+from starlette import status
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from planet_diseases_backend.db.models.users import get_jwt_strategy
+from planet_diseases_backend.services.shared_cache import SharedCache
+from planet_diseases_backend.settings import settings
+
+REJECTED_REQUESTS = Counter(
+    "http_requests_rejected_total",
+    "Requests rejected by admission control.",
+    ["reason"],
+)
+
+# Tokens left and time of the last refill.
+_BUCKET = struct.Struct("<dd")
+
+
+def _refill(
+    state: Optional[Tuple[float, float]],
+    rate: float,
+    burst: int,
+    now: float,
+) -> Tuple[float, float]:
+    """
+    Takes one token from the bucket.
+
+    :param state: tokens and time of the last refill, None for a new bucket.
+    :param rate: tokens added per second.
+    :param burst: capacity of the bucket.
+    :param now: current time.
+    :return: new state and seconds to wait if there are no tokens.
+    """
+    tokens, updated = (float(burst), now) if state is None else state
+    tokens = min(float(burst), tokens + (now - updated) * rate)
+    if tokens >= 1:
+        return tokens - 1, 0.0
+    return tokens, (1 - tokens) / rate
+
+
+class TokenBuckets:
+    """Token buckets of clients, stored in the worker."""
+
+    def __init__(self, max_keys: int) -> None:
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    def acquire(self, key: str, rate: float, burst: int) -> float:
+        """
+        Takes a token from the client's bucket.
+
+        Least recently used buckets are dropped when there are
+        more than max_keys of them, which is the same as refilling them.
+
+        :param key: client identifier.
+        :param rate: tokens added per second.
+        :param burst: capacity of the bucket.
+        :return: 0 if the request is admitted, otherwise seconds to wait.
+        """
+        now = time.monotonic()
+        tokens, wait = _refill(self._buckets.get(key), rate, burst, now)
+        self._buckets[key] = (tokens, now)
+        self._buckets.move_to_end(key)
+        if len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return wait
+
+
+class SharedTokenBuckets:
+    """Token buckets of clients, stored in the cache shared between workers."""
+
+    def __init__(self, cache: SharedCache) -> None:
+        self.cache = cache
+
+    def acquire(self, key: str, rate: float, burst: int) -> float:
+        """
+        Takes a token from the client's bucket.
+
+        :param key: client identifier.
+        :param rate: tokens added per second.
+        :param burst: capacity of the bucket.
+        :return: 0 if the request is admitted, otherwise seconds to wait.
+        """
+        now = time.time()
+        wait = 0.0
+
+        def _take(current: Optional[bytes]) -> bytes:
+            nonlocal wait
+            state = None if current is None else _BUCKET.unpack(current)
+            tokens, wait = _refill(state, rate, burst, now)
+            return _BUCKET.pack(tokens, now)
+
+        # Bucket is full again after burst / rate seconds, so it can expire.
+        self.cache.update(f"admission:{key}", _take, ttl=burst / rate + 1)
+        return wait
+
+
+class ConcurrencyLimits:
+    """Numbers of in-flight requests by route prefixes."""
+
+    def __init__(self) -> None:
+        self.in_flight: Dict[str, int] = {}
+
+    @staticmethod
+    def match(path: str, limits: Dict[str, int]) -> Optional[str]:
+        """
+        Finds the longest prefix of the path with a limit.
+
+        :param path: request path.
+        :param limits: maximum in-flight requests by prefixes.
+        :return: prefix or None if the path isn't limited.
+        """
+        matched = None
+        for prefix in limits:
+            if path.startswith(prefix) and len(prefix) > len(matched or ""):
+                matched = prefix
+        return matched
+
+    def acquire(self, prefix: str, limit: int) -> bool:
+        """
+        Takes a place for the request.
+
+        :param prefix: route prefix.
+        :param limit: maximum in-flight requests.
+        :return: whether the request is admitted.
+        """
+        in_flight = self.in_flight.get(prefix, 0)
+        if in_flight >= limit:
+            return False
+        self.in_flight[prefix] = in_flight + 1
+        return True
+
+    def release(self, prefix: str) -> None:
+        """
+        Frees the place of a finished request.
+
+        :param prefix: route prefix.
+        """
+        self.in_flight[prefix] -= 1
+
+
+def client_key(scope: Scope) -> str:
+    """
+    Identifies the client.
+
+    The token isn't checked against the database here,
+    only its signature is verified, so rate limiting is cheap.
+    Requests with invalid tokens are limited by IP
+    and rejected by authentication later.
+
+    :param scope: connection scope.
+    :return: user id or IP address with a prefix.
+    """
+    authorization = Headers(scope=scope).get("Authorization", "")
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() == "bearer" and token:
+        strategy = get_jwt_strategy()
+        try:
+            data = decode_jwt(
+                token,
+                strategy.decode_key,
+                strategy.token_audience,
+                algorithms=[strategy.algorithm],
+            )
+        except jwt.PyJWTError:
+            data = {}
+        if data.get("sub"):
+            return f"user:{data['sub']}"
+    client = scope.get("client")
+    return f"ip:{client[0] if client else 'unknown'}"
+
+
+async def _reject(
+    scope: Scope,
+    receive: Receive,
+    send: Send,
+    status_code: int,
+    retry_after: float,
+    reason: str,
+    detail: str,
+) -> None:
+    REJECTED_REQUESTS.labels(reason).inc()
+    response = UJSONResponse(
+        {"detail": detail},
+        status_code=status_code,
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+    )
+    await response(scope, receive, send)
+
+
+class AdmissionMiddleware:
+    """Middleware that sheds load with rate and concurrency limits."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+        self.buckets = TokenBuckets(settings.rate_limit_max_keys)
+        self.shared_buckets: Optional[SharedTokenBuckets] = None
+        self.concurrency = ConcurrencyLimits()
+
+    def _acquire_token(self, scope: Scope) -> float:
+        buckets: Union[TokenBuckets, SharedTokenBuckets] = self.buckets
+        if settings.rate_limit_shared:
+            if self.shared_buckets is None:
+                cache = scope["app"].state.shared_cache
+                self.shared_buckets = SharedTokenBuckets(cache)
+            buckets = self.shared_buckets
+        return buckets.acquire(
+            client_key(scope),
+            settings.rate_limit_per_second,
+            settings.rate_limit_burst,
+        )
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        """
+        Handles ASGI request.
+
+        :param scope: connection scope.
+        :param receive: function to receive messages.
+        :param send: function to send messages.
+        """
+        path = scope.get("path", "")
+        if scope["type"] != "http" or path.startswith(
+            tuple(settings.admission_exempt_paths),
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        if settings.rate_limit_per_second > 0:
+            wait = self._acquire_token(scope)
+            if wait > 0:
+                await _reject(
+                    scope,
+                    receive,
+                    send,
+                    status.HTTP_429_TOO_MANY_REQUESTS,
+                    wait,
+                    "rate_limit",
+                    "Too many requests",
+                )
+                return
+
+        limits = settings.route_concurrency_limits
+        prefix = self.concurrency.match(path, limits)
+        if prefix is None:
+            await self.app(scope, receive, send)
+            return
+        if not self.concurrency.acquire(prefix, limits[prefix]):
+            await _reject(
+                scope,
+                receive,
+                send,
+                status.HTTP_503_SERVICE_UNAVAILABLE,
+                1,
+                "concurrency",
+                "Server is busy",
+            )
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.concurrency.release(prefix)
@@ -1,6 +1,6 @@
 from typing import List
 
-from fastapi import APIRouter
+from fastapi import APIRouter, Query
 from fastapi.param_functions import Depends
 
 from planet_diseases_backend.db.dao.dummy_dao import DummyDAO
@@ -18,16 +18,41 @@ async def get_dummy_models(
     limit: int = 10,
     offset: int = 0,
     dummy_dao: DummyDAO = Depends(),
-) -> List[DummyModel]:
+) -> List[DummyModelDTO]:
     """
     Retrieve all dummy objects from the database.
 
+    Concurrent requests for the same page share one query.
+
     :param limit: limit of dummy objects, defaults to 10.
     :param offset: offset of dummy objects, defaults to 0.
     :param dummy_dao: DAO for dummy models.
     :return: list of dummy objects from database.
     """
-    return await dummy_dao.get_all_dummies(limit=limit, offset=offset)
+    rows = await dummy_dao.get_dummy_rows(limit=limit, offset=offset)
+    return [DummyModelDTO.model_validate(row) for row in rows]
+
+
+@router.get("/search", response_model=List[DummyModelDTO])
+async def search_dummy_models(
+    q: str = Query(min_length=3, max_length=200),
+    prefix: bool = False,
+    limit: int = Query(default=10, ge=1, le=100),
+    dummy_dao: DummyDAO = Depends(),
+) -> List[DummyModel]:
+    """
+    Search dummy objects by a part of the name.
+
+    Queries shorter than three characters can't use trigram index,
+    so they are rejected.
+
+    :param q: part of the name.
+    :param prefix: match only names that start with the query.
+    :param limit: limit of dummy objects, defaults to 10.
+    :param dummy_dao: DAO for dummy models.
+    :return: dummy objects ranked by similarity to the query.
+    """
+    return await dummy_dao.search(q, limit=limit, prefix=prefix)
 
 
 @router.put("/")
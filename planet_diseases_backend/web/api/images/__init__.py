@@ -0,0 +1,5 @@
+"""Image upload API."""
+
+from planet_diseases_backend.web.api.images.views import router
+
+__all__ = ["router"]
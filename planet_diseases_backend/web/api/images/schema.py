@@ -0,0 +1,18 @@
+from typing import Dict
+
+from pydantic import BaseModel
+
+
+class ImageDTO(BaseModel):
+    """
+    DTO for stored images.
+
+    It's returned after an upload.
+    """
+
+    digest: str
+    size: int
+    # False if the same image was uploaded before.
+    created: bool
+    # URLs of the original and derivatives by their names.
+    urls: Dict[str, str]
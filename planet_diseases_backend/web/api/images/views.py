@@ -0,0 +1,73 @@
+from fastapi import APIRouter, Depends, HTTPException, Request
+
+from planet_diseases_backend.db.models.users import User, current_active_user
+from planet_diseases_backend.services.events import record_event
+from planet_diseases_backend.services.image_store import (
+    ORIGINAL,
+    ImageStore,
+    ImageTooLargeError,
+    InvalidImageError,
+    derivative_sizes,
+    get_image_store,
+)
+from planet_diseases_backend.settings import settings
+from planet_diseases_backend.web.api.images.schema import ImageDTO
+
+router = APIRouter()
+
+_BODY = {
+    "required": True,
+    "content": {"image/*": {"schema": {"type": "string", "format": "binary"}}},
+}
+
+
+@router.post(
+    "/",
+    response_model=ImageDTO,
+    status_code=201,
+    openapi_extra={"requestBody": _BODY},
+)
+async def upload_image(
+    request: Request,
+    user: User = Depends(current_active_user),
+    store: ImageStore = Depends(get_image_store),
+) -> ImageDTO:
+    """
+    Stores an image sent as the request body.
+
+    The body is streamed to the store, which stops reading
+    once it exceeds image_max_bytes; a larger Content-Length
+    is rejected before reading anything.
+    Identical images are stored once,
+    the existing one is returned for repeated uploads.
+
+    :param request: current request.
+    :param user: current user.
+    :param store: image store.
+    :return: stored image with URLs of its derivatives.
+    :raises HTTPException: if the file is too large or not an image.
+    """
+    length = request.headers.get("content-length", "")
+    if length.isdigit() and int(length) > settings.image_max_bytes:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Image exceeds {settings.image_max_bytes} bytes",
+        )
+    try:
+        image = await store.save(request.stream())
+    except ImageTooLargeError as exc:
+        raise HTTPException(status_code=413, detail=str(exc)) from exc
+    except InvalidImageError as exc:
+        raise HTTPException(status_code=422, detail="File is not an image") from exc
+    record_event(request, "image_upload", user.id, {"digest": image.digest})
+    return ImageDTO(
+        digest=image.digest,
+        size=image.size,
+        created=image.created,
+        urls={
+            variant: str(
+                request.url_for("get_media", variant=variant, digest=image.digest),
+            )
+            for variant in [ORIGINAL, *derivative_sizes()]
+        },
+    )
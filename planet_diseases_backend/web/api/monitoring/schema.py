@@ -0,0 +1,25 @@
+from typing import Dict, Optional
+
+from pydantic import BaseModel
+
+
+class ProbeDTO(BaseModel):
+    """Result of a readiness probe."""
+
+    ok: bool
+    # Seconds the probe took.
+    latency: float
+    detail: Optional[str] = None
+
+
+class ReadinessDTO(BaseModel):
+    """
+    DTO for readiness checks.
+
+    It's returned with status 503 if the worker is not ready.
+    """
+
+    ready: bool
+    # "ready", "not ready", "starting" or "draining".
+    status: str
+    probes: Dict[str, ProbeDTO] = {}
@@ -1,12 +1,72 @@
-from fastapi import APIRouter
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Request, Response
+
+from planet_diseases_backend.services.health import HealthMonitor
+from planet_diseases_backend.web.api.monitoring.schema import ProbeDTO, ReadinessDTO
+from planet_diseases_backend.web.lifetime import is_draining
 
 router = APIRouter()
 
 
 @router.get("/health")
-def health_check() -> None:
+def health_check(request: Request) -> None:
     """
     Checks the health of a project.
 
-    It returns 200 if the project is healthy.
+    It returns 200 if the project is healthy
+    and 503 when the worker is shutting down.
+
+    :param request: current request.
+    :raises HTTPException: if the worker is draining.
+    """
+    if is_draining(request.app):
+        raise HTTPException(status_code=503, detail="Shutting down")
+
+
+@router.get("/health/live")
+async def liveness_check() -> None:
+    """
+    Checks that the worker is alive.
+
+    It doesn't depend on the database or other services,
+    so their failures never make an orchestrator restart workers.
+    The handler is asynchronous, so it fails when the event loop is blocked.
+    """
+
+
+@router.get("/health/ready", response_model=ReadinessDTO)
+async def readiness_check(request: Request, response: Response) -> ReadinessDTO:
+    """
+    Checks that the worker can serve requests.
+
+    Results of probes are cached, so frequent checks
+    don't query the database every time.
+
+    :param request: current request.
+    :param response: current response.
+    :return: results of probes, with status 503 if any of them fails.
     """
+    monitor: Optional[HealthMonitor] = getattr(
+        request.app.state,
+        "health_monitor",
+        None,
+    )
+    if is_draining(request.app) or monitor is None:
+        response.status_code = 503
+        return ReadinessDTO(
+            ready=False,
+            status="draining" if is_draining(request.app) else "starting",
+        )
+    results = await monitor.check()
+    ready = all(result.ok for result in results.values())
+    if not ready:
+        response.status_code = 503
+    return ReadinessDTO(
+        ready=ready,
+        status="ready" if ready else "not ready",
+        probes={
+            name: ProbeDTO(ok=result.ok, latency=result.latency, detail=result.detail)
+            for name, result in results.items()
+        },
+    )
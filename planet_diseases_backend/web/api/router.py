@@ -1,6 +1,16 @@
 from fastapi.routing import APIRouter
 
-from planet_diseases_backend.web.api import docs, dummy, echo, monitoring, users
+from planet_diseases_backend.web.api import (
+    docs,
+    dummy,
+    echo,
+    images,
+    monitoring,
+    stats,
+    stream,
+    sync,
+    users,
+)
 
 api_router = APIRouter()
 api_router.include_router(monitoring.router)
@@ -8,3 +18,7 @@ api_router.include_router(users.router)
 api_router.include_router(docs.router)
 api_router.include_router(echo.router, prefix="/echo", tags=["echo"])
 api_router.include_router(dummy.router, prefix="/dummy", tags=["dummy"])
+api_router.include_router(images.router, prefix="/images", tags=["images"])
+api_router.include_router(stream.router, prefix="/stream", tags=["stream"])
+api_router.include_router(stats.router, prefix="/stats", tags=["stats"])
+api_router.include_router(sync.router, prefix="/sync", tags=["sync"])
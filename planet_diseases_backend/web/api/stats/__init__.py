@@ -0,0 +1,5 @@
+"""Statistics API for dashboards."""
+
+from planet_diseases_backend.web.api.stats.views import router
+
+__all__ = ["router"]
@@ -0,0 +1,30 @@
+from datetime import date, datetime
+from typing import List
+
+from pydantic import BaseModel
+
+
+class DiagnosisCountDTO(BaseModel):
+    """Number of diagnoses of a disease of a crop in a region."""
+
+    crop: str
+    disease: str
+    # Empty if the region is unknown.
+    region: str
+    count: int
+
+
+class DiagnosisStatsDTO(BaseModel):
+    """
+    DTO for diagnosis statistics.
+
+    Counts are as of ``refreshed_at``, they lag behind
+    by up to the refresh interval.
+    """
+
+    # The period, both days are included.
+    since: date
+    until: date
+    refreshed_at: datetime
+    total: int
+    counts: List[DiagnosisCountDTO]
@@ -0,0 +1,88 @@
+from datetime import timedelta
+from typing import Any, Dict, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+
+from planet_diseases_backend.services.shared_cache import (
+    SharedCache,
+    get_shared_cache,
+)
+from planet_diseases_backend.services.stats import StatsCache, get_stats_cache
+from planet_diseases_backend.settings import settings
+from planet_diseases_backend.web.api.stats.schema import (
+    DiagnosisCountDTO,
+    DiagnosisStatsDTO,
+)
+
+router = APIRouter()
+
+
+@router.get("/diagnoses", response_model=DiagnosisStatsDTO)
+async def get_diagnosis_stats(
+    response: Response,
+    days: int = Query(default=30, ge=1),
+    crop: Optional[str] = Query(default=None, max_length=64),
+    disease: Optional[str] = Query(default=None, max_length=64),
+    region: Optional[str] = Query(default=None, max_length=64),
+    stats: StatsCache = Depends(get_stats_cache),
+    shared_cache: SharedCache = Depends(get_shared_cache),
+) -> DiagnosisStatsDTO:
+    """
+    Counts diagnoses of the last days by crop, disease and region.
+
+    Counts are summed from the in-memory snapshot,
+    so dashboards never query the database. Results are shared
+    between workers until the next refresh, so every worker
+    returns the same numbers and sums them once.
+
+    :param response: current response.
+    :param days: number of days, including today.
+    :param crop: count only diagnoses of this crop.
+    :param disease: count only diagnoses of this disease.
+    :param region: count only diagnoses in this region.
+    :param stats: statistics cache.
+    :param shared_cache: cache shared between workers.
+    :return: numbers of diagnoses, most frequent first.
+    :raises HTTPException: if the period is too long
+        or statistics are not loaded yet.
+    """
+    if days > stats.max_days:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Statistics are kept for {stats.max_days} days",
+        )
+    snapshot = stats.snapshot
+    if snapshot is None:
+        raise HTTPException(
+            status_code=503,
+            detail="Statistics are not loaded yet",
+            headers={"Retry-After": "5"},
+        )
+
+    async def _compute() -> Dict[str, Any]:
+        counts = [
+            DiagnosisCountDTO(crop=crop, disease=disease, region=region, count=count)
+            for (crop, disease, region), count in snapshot.counts(
+                days,
+                crop=crop,
+                disease=disease,
+                region=region,
+            )
+        ]
+        return DiagnosisStatsDTO(
+            since=snapshot.today - timedelta(days=days - 1),
+            until=snapshot.today,
+            refreshed_at=snapshot.refreshed_at,
+            total=sum(count.count for count in counts),
+            counts=counts,
+        ).model_dump(mode="json")
+
+    result = await shared_cache.get_or_compute(
+        f"stats:diagnoses:{snapshot.today}:{days}:{crop}:{disease}:{region}",
+        settings.stats_refresh_interval,
+        _compute,
+    )
+    response.headers["Cache-Control"] = (
+        f"public, max-age={int(settings.stats_refresh_interval)}"
+    )
+    return DiagnosisStatsDTO.model_validate(result)
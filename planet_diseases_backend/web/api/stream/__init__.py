@@ -0,0 +1,5 @@
+"""Streaming of user events."""
+
+from planet_diseases_backend.web.api.stream.views import router
+
+__all__ = ["router"]
@@ -0,0 +1,206 @@
+"""
+Streams of job states and results.
+
+Browsers can't set headers of EventSource and WebSocket requests,
+so the token may also be passed in ``access_token`` query parameter.
+"""
+
+import asyncio
+from typing import Any, AsyncIterator, Optional
+
+import ujson
+from fastapi import (
+    APIRouter,
+    Depends,
+    HTTPException,
+    Request,
+    WebSocket,
+    WebSocketException,
+    status,
+)
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.requests import HTTPConnection
+from starlette.types import Receive, Scope, Send
+
+from planet_diseases_backend.db.dependencies import get_db_session
+from planet_diseases_backend.db.models.users import (
+    User,
+    UserManager,
+    get_jwt_strategy,
+    get_user_manager,
+)
+from planet_diseases_backend.services.notifications import (
+    STREAM_EVENTS,
+    NotificationHub,
+    Subscription,
+    TooManyStreamsError,
+    get_notification_hub,
+)
+from planet_diseases_backend.settings import settings
+
+router = APIRouter()
+
+
+async def stream_user(
+    connection: HTTPConnection,
+    access_token: Optional[str] = None,
+    user_manager: UserManager = Depends(get_user_manager),
+    session: AsyncSession = Depends(get_db_session),
+) -> User:
+    """
+    Authenticates a streaming client with the strategy of the JWT backend.
+
+    The session is committed right away, so streams
+    don't hold database connections while they are open.
+
+    :param connection: current request or websocket.
+    :param access_token: token from the query.
+    :param user_manager: user manager.
+    :param session: database session.
+    :return: active user.
+    :raises HTTPException: if the token is invalid.
+    :raises WebSocketException: if the token of a websocket is invalid.
+    """
+    scheme, _, token = connection.headers.get("Authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        token = access_token or ""
+    strategy = get_jwt_strategy()
+    user = await strategy.read_token(token, user_manager) if token else None
+    await session.commit()
+    if user is None or not user.is_active:
+        if connection.scope["type"] == "websocket":
+            raise WebSocketException(code=status.WS_1008_POLICY_VIOLATION)
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    return user
+
+
+class EventStreamResponse(StreamingResponse):
+    """Server-sent events that close the subscription when they end."""
+
+    def __init__(self, subscription: Subscription) -> None:
+        super().__init__(
+            self._events(subscription),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+        self.subscription = subscription
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        """
+        Sends the stream.
+
+        The subscription is closed even if the client
+        disconnects before the stream starts.
+
+        :param scope: connection scope.
+        :param receive: ASGI receive callable.
+        :param send: ASGI send callable.
+        """
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.subscription.close()
+
+    @staticmethod
+    async def _events(subscription: Subscription) -> AsyncIterator[str]:
+        # Reconnecting clients wait for the workers to restart.
+        yield "retry: 5000\n\n"
+        while True:
+            try:
+                event = await asyncio.wait_for(
+                    subscription.get(),
+                    settings.stream_heartbeat_seconds,
+                )
+            except asyncio.TimeoutError:
+                # Comments keep proxies from closing idle connections.
+                yield ": ping\n\n"
+                continue
+            if event is None:
+                return
+            STREAM_EVENTS.labels("sent").inc()
+            yield f"event: {event['type']}\ndata: {ujson.dumps(event)}\n\n"
+
+
+@router.get("/events", response_class=EventStreamResponse)
+async def stream_events(
+    request: Request,
+    user: User = Depends(stream_user),
+    hub: NotificationHub = Depends(get_notification_hub),
+) -> EventStreamResponse:
+    """
+    Streams events of the current user as server-sent events.
+
+    Every event has the name of its type and JSON data.
+
+    :param request: current request.
+    :param user: current user.
+    :param hub: notification hub.
+    :return: stream of events.
+    :raises HTTPException: if the worker has too many streams.
+    """
+    try:
+        subscription = hub.subscribe(user.id)
+    except TooManyStreamsError:
+        raise HTTPException(
+            status_code=503,
+            detail="Too many streams",
+            headers={"Retry-After": "5"},
+        ) from None
+    return EventStreamResponse(subscription)
+
+
+async def _wait_disconnect(websocket: WebSocket) -> None:
+    while (await websocket.receive())["type"] != "websocket.disconnect":
+        pass
+
+
+async def _send_events(
+    websocket: WebSocket,
+    subscription: Subscription,
+    disconnect: "asyncio.Future[Any]",
+) -> None:
+    while True:
+        event = asyncio.ensure_future(subscription.get())
+        await asyncio.wait({event, disconnect}, return_when=asyncio.FIRST_COMPLETED)
+        if disconnect.done():
+            event.cancel()
+            return
+        if event.result() is None:
+            await websocket.close(code=status.WS_1001_GOING_AWAY)
+            return
+        await websocket.send_text(ujson.dumps(event.result()))
+        STREAM_EVENTS.labels("sent").inc()
+
+
+@router.websocket("/ws")
+async def stream_websocket(
+    websocket: WebSocket,
+    user: User = Depends(stream_user),
+    hub: NotificationHub = Depends(get_notification_hub),
+) -> None:
+    """
+    Streams events of the current user as websocket JSON messages.
+
+    Messages from the client are ignored.
+
+    :param websocket: current websocket.
+    :param user: current user.
+    :param hub: notification hub.
+    """
+    try:
+        subscription = hub.subscribe(user.id)
+    except TooManyStreamsError:
+        await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
+        return
+    try:
+        await websocket.accept()
+        # The connect message is received by accept, so watching
+        # for disconnect starts after it.
+        disconnect = asyncio.ensure_future(_wait_disconnect(websocket))
+        try:
+            await _send_events(websocket, subscription, disconnect)
+        finally:
+            disconnect.cancel()
+    finally:
+        subscription.close()
@@ -0,0 +1,5 @@
+"""Offline sync API for field apps."""
+
+from planet_diseases_backend.web.api.sync.views import router
+
+__all__ = ["router"]
@@ -0,0 +1,28 @@
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel
+
+
+class ChangeDTO(BaseModel):
+    """Changed or deleted row."""
+
+    seq: int
+    id: str
+    deleted: bool
+    # Current values of the row, None if it's deleted.
+    data: Optional[Dict[str, Any]]
+
+
+class SyncPageDTO(BaseModel):
+    """
+    DTO for a page of changes.
+
+    Clients keep ``next`` and send it as ``since``
+    with the next request.
+    """
+
+    changes: List[ChangeDTO]
+    # The largest sequence number in the page.
+    next: int
+    # True if there are more changes after this page.
+    has_more: bool
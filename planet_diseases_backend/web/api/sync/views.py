@@ -0,0 +1,93 @@
+import gzip
+from datetime import timedelta
+from typing import Any, Dict, List, Literal
+
+import ujson
+from anyio import to_thread
+from fastapi import APIRouter, Depends, Query, Request, Response
+
+from planet_diseases_backend.db.dao.sync_dao import Change, SyncDAO
+from planet_diseases_backend.db.models.users import User, current_active_user
+from planet_diseases_backend.settings import settings
+from planet_diseases_backend.web.api.sync.schema import SyncPageDTO
+
+router = APIRouter()
+
+# Smaller bodies hardly shrink, compressing them isn't worth it.
+_MIN_GZIP_SIZE = 1024
+# Larger bodies are compressed in a thread, not to block the event loop.
+_THREAD_GZIP_SIZE = 64 * 1024
+
+
+async def _encode(request: Request, page: Dict[str, Any]) -> Response:
+    """
+    Serializes the page and compresses it if the client accepts gzip.
+
+    :param request: current request.
+    :param page: page of changes.
+    :return: response.
+    """
+    body = ujson.dumps(page, ensure_ascii=False).encode()
+    headers = {"Vary": "Accept-Encoding", "Cache-Control": "private, no-cache"}
+    accepts_gzip = "gzip" in request.headers.get("accept-encoding", "")
+    if accepts_gzip and len(body) >= _MIN_GZIP_SIZE:
+        if len(body) >= _THREAD_GZIP_SIZE:
+            body = await to_thread.run_sync(gzip.compress, body)
+        else:
+            body = gzip.compress(body)
+        headers["Content-Encoding"] = "gzip"
+    return Response(body, media_type="application/json", headers=headers)
+
+
+@router.get("/{collection}", response_model=SyncPageDTO)
+async def get_changes(
+    collection: Literal["catalogue", "diagnoses"],
+    request: Request,
+    since: int = Query(default=0, ge=0),
+    limit: int = Query(default=500, ge=1, le=5000),
+    user: User = Depends(current_active_user),
+    sync_dao: SyncDAO = Depends(),
+) -> Response:
+    """
+    Sends changes made after the client's last sync.
+
+    The first sync starts with ``since=0``. Every page has the largest
+    sequence number in it, the client stores it together with the rows
+    and sends it with the next request, so only new changes are sent.
+    Deleted rows are sent as changes without data. Diagnoses recorded
+    before sync was added are never sent.
+
+    :param collection: "catalogue" or the user's own "diagnoses".
+    :param request: current request.
+    :param since: the largest sequence number the client has.
+    :param limit: limit of changes.
+    :param user: current user.
+    :param sync_dao: DAO for changes.
+    :return: page of changes, compressed with gzip if it's accepted.
+    """
+    if collection == "catalogue":
+        changes = await sync_dao.catalogue_changes(since, limit + 1)
+    else:
+        changes = await sync_dao.diagnosis_changes(
+            user.id,
+            since,
+            limit + 1,
+            timedelta(seconds=settings.events_max_delay),
+        )
+    page: List[Change] = changes[:limit]
+    return await _encode(
+        request,
+        {
+            "changes": [
+                {
+                    "seq": change.seq,
+                    "id": change.id,
+                    "deleted": change.data is None,
+                    "data": change.data,
+                }
+                for change in page
+            ],
+            "next": page[-1].seq if page else since,
+            "has_more": len(changes) > limit,
+        },
+    )
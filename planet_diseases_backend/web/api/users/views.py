@@ -11,15 +11,18 @@ Routes:
     - /auth/reset-password: Password reset
     - /auth/verify: Email verification
     - /users: User profile management
+    - /users/import: Bulk import of users by superusers
+    - /users/search: Search of users by superusers
 """  # noqa: D205
 
-from typing import List
+from typing import List, Optional
 
-from fastapi import APIRouter, Depends, Response
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from planet_diseases_backend.db.dependencies import get_db_session
+from planet_diseases_backend.db.dao.user_dao import UserDAO
+from planet_diseases_backend.db.dependencies import get_readonly_session
 from planet_diseases_backend.db.models.users import (
     User,
     UserCreate,
@@ -27,38 +30,137 @@ from planet_diseases_backend.db.models.users import (
     UserUpdate,
     api_users,
     auth_jwt,
+    current_superuser,
 )
+from planet_diseases_backend.services.single_flight import SingleFlight
+from planet_diseases_backend.services.user_import import (
+    FORMATS,
+    ImportReport,
+    UserImporter,
+    iter_lines,
+)
+from planet_diseases_backend.settings import settings
 from planet_diseases_backend.web.api.users.schema import UserResponseModel
 
 router = APIRouter()
 
 test_router = APIRouter()
 
+# Included before the users router, so its paths
+# aren't taken for user ids.
+admin_router = APIRouter(dependencies=[Depends(current_superuser)])
+
+_user_pages = SingleFlight("user_list", settings.single_flight_max_keys)
+
 
 @test_router.get("/", response_model=List[UserResponseModel])
 async def get_user_models(
     response: Response,
     limit: int = 10,
     offset: int = 0,
-    db: AsyncSession = Depends(get_db_session),
+    db: AsyncSession = Depends(get_readonly_session),
 ) -> List[UserResponseModel]:
     """
     Retrieve a list of user models from the database.
 
+    Columns are selected instead of entities, so users
+    aren't tracked by the session.
+
     Args:
         response (Response): The HTTP response object, used to set response headers.
         limit (int, optional): The maximum number of users to retrieve. Defaults to 10.
         offset (int, optional): The number of user models to skip. Defaults to 0.
-        db (AsyncSession, optional): The database session dependency.
+        db (AsyncSession, optional): The read-only database session dependency.
 
     Returns:
         List[User]: A list of user models.
     """
-    result = await db.execute(select(User).offset(offset).limit(limit))
-    users = result.scalars().all()
+
+    async def _load() -> List[UserResponseModel]:
+        columns = [User.__table__.c[name] for name in UserResponseModel.model_fields]
+        result = await db.execute(select(*columns).offset(offset).limit(limit))
+        return [UserResponseModel.model_validate(row) for row in result]
+
+    # Concurrent requests for the same page share one query.
+    users = await _user_pages.do((offset, limit), _load)
     response.headers["X-Total-Count"] = str(len(users))
-    return [UserResponseModel.model_validate(user) for user in users]
+    return users
+
+
+@admin_router.post("/import", response_model=ImportReport)
+async def import_users(request: Request, user_dao: UserDAO = Depends()) -> ImportReport:
+    """
+    Import users from a CSV or NDJSON upload.
+
+    The body is streamed, the format is chosen by Content-Type:
+    text/csv with a header line or application/x-ndjson.
+    Fields are email, password and optional is_active and is_verified.
+    Quoted CSV fields may span lines, errors refer to their first lines.
+    Users with taken emails are skipped, invalid lines are reported.
+
+    Args:
+        request (Request): The HTTP request with the upload as the body.
+        user_dao (UserDAO): DAO for users.
+
+    Returns:
+        ImportReport: Numbers of created, skipped and invalid users.
+
+    Raises:
+        HTTPException: If the format is not supported.
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    if content_type not in FORMATS:
+        raise HTTPException(
+            status_code=415,
+            detail=f"Supported formats: {', '.join(FORMATS)}",
+        )
+    importer = UserImporter(
+        user_dao,
+        FORMATS[content_type],
+        settings.users_import_batch_size,
+        settings.users_import_max_record_length,
+    )
+    return await importer.run(
+        iter_lines(request.stream(), settings.users_import_max_record_length),
+    )
+
+
+@admin_router.get("/search", response_model=List[UserRead])
+async def search_users(
+    email: Optional[str] = Query(default=None, max_length=320),
+    is_active: Optional[bool] = None,
+    is_verified: Optional[bool] = None,
+    after: Optional[str] = Query(default=None, max_length=320),
+    limit: int = Query(default=50, ge=1, le=200),
+    user_dao: UserDAO = Depends(),
+) -> List[User]:
+    """
+    Search users ordered by lowercased email.
+
+    Pages are requested with the email of the last user
+    of the previous page, so deep pages are as cheap as the first one.
+
+    Args:
+        email (str, optional): Case-insensitive prefix of emails.
+        is_active (bool, optional): Required value of is_active.
+        is_verified (bool, optional): Required value of is_verified.
+        after (str, optional): Email of the last user of the previous page.
+        limit (int, optional): The maximum number of users. Defaults to 50.
+        user_dao (UserDAO): DAO for users.
+
+    Returns:
+        List[User]: Found users.
+    """
+    return await user_dao.search(
+        email=email,
+        is_active=is_active,
+        is_verified=is_verified,
+        after=after,
+        limit=limit,
+    )
+
 
+router.include_router(admin_router, prefix="/users", tags=["users"])
 
 router.include_router(
     api_users.get_register_router(UserRead, UserCreate),
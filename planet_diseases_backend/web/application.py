@@ -2,26 +2,54 @@ import logging
 from importlib import metadata
 from pathlib import Path
 
-import sentry_sdk
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import UJSONResponse
 from fastapi.staticfiles import StaticFiles
-from sentry_sdk.integrations.fastapi import FastApiIntegration
-from sentry_sdk.integrations.logging import LoggingIntegration
-from sentry_sdk.integrations.sqlalchemy import SqlalchemyIntegration
 
 from planet_diseases_backend.log import configure_logging
 from planet_diseases_backend.settings import settings
+from planet_diseases_backend.web.admission import AdmissionMiddleware
 from planet_diseases_backend.web.api.router import api_router
 from planet_diseases_backend.web.lifetime import (
     register_shutdown_event,
     register_startup_event,
 )
+from planet_diseases_backend.web.media import router as media_router
+from planet_diseases_backend.web.timing import TimingMiddleware, instrument_routes
 
 APP_ROOT = Path(__file__).parent.parent
 
 
+def _setup_sentry() -> None:  # pragma: no cover
+    """
+    Enables sentry integration.
+
+    Sentry SDK is imported only when it's enabled,
+    so workers without DSN don't pay for its import.
+    """
+    import sentry_sdk
+    from sentry_sdk.integrations.fastapi import FastApiIntegration
+    from sentry_sdk.integrations.logging import LoggingIntegration
+    from sentry_sdk.integrations.sqlalchemy import SqlalchemyIntegration
+
+    sentry_sdk.init(
+        dsn=settings.sentry_dsn,
+        traces_sample_rate=settings.sentry_sample_rate,
+        environment=settings.environment,
+        integrations=[
+            FastApiIntegration(transaction_style="endpoint"),
+            LoggingIntegration(
+                level=logging.getLevelName(
+                    settings.log_level.value,
+                ),
+                event_level=logging.ERROR,
+            ),
+            SqlalchemyIntegration(),
+        ],
+    )
+
+
 def get_app() -> FastAPI:
     """
     Get FastAPI application.
@@ -32,22 +60,7 @@ def get_app() -> FastAPI:
     """
     configure_logging()
     if settings.sentry_dsn:
-        # Enables sentry integration.
-        sentry_sdk.init(
-            dsn=settings.sentry_dsn,
-            traces_sample_rate=settings.sentry_sample_rate,
-            environment=settings.environment,
-            integrations=[
-                FastApiIntegration(transaction_style="endpoint"),
-                LoggingIntegration(
-                    level=logging.getLevelName(
-                        settings.log_level.value,
-                    ),
-                    event_level=logging.ERROR,
-                ),
-                SqlalchemyIntegration(),
-            ],
-        )
+        _setup_sentry()
     app = FastAPI(
         title="planet_diseases_backend",
         version=metadata.version("planet_diseases_backend"),
@@ -61,17 +74,22 @@ def get_app() -> FastAPI:
     register_startup_event(app)
     register_shutdown_event(app)
 
+    app.add_middleware(TimingMiddleware)
+    app.add_middleware(AdmissionMiddleware)
     app.add_middleware(
         CORSMiddleware,
         allow_origins=["*"],
         allow_methods=["*"],
         allow_headers=["*"],
-        expose_headers=["X-Total-Count"],
+        expose_headers=["X-Total-Count", "Server-Timing"],
     )
     # Main router for the API.
     app.include_router(router=api_router, prefix="/api")
+    instrument_routes(app)
     # Adds static directory.
     # This directory is used to access swagger files.
     app.mount("/static", StaticFiles(directory=APP_ROOT / "static"), name="static")
+    # Uploaded images and their derivatives.
+    app.include_router(media_router, prefix="/media", include_in_schema=False)
 
     return app
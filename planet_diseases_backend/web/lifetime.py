@@ -1,42 +1,435 @@
-from typing import Awaitable, Callable
+"""
+Startup and graceful shutdown of workers.
 
+Subsystems are registered in a :class:`Lifecycle` with priorities.
+They are started in ascending order of priorities
+and stopped in the reverse order, so the database engine
+outlives the queues that write to it.
+
+Shutdown of a worker has three phases:
+
+1. Draining. Readiness check starts failing, so load balancers
+   stop sending new requests, and long-lived streams are ended.
+   Under gunicorn the worker keeps accepting requests
+   for ``shutdown_delay`` seconds, until balancers notice it.
+2. The server closes listeners and waits for in-flight requests.
+3. Subsystems are stopped within ``shutdown_timeout`` seconds:
+   queues are flushed, then engines are disposed.
+"""
+
+import asyncio
+import functools
+import inspect
+import os
+import time
+import weakref
+from typing import Any, Awaitable, Callable, List, NamedTuple, Optional
+
+from anyio import to_thread
 from fastapi import FastAPI
-from prometheus_fastapi_instrumentator.instrumentation import (
-    PrometheusFastApiInstrumentator,
-)
+from loguru import logger
+from prometheus_client import Histogram
 from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 
+from planet_diseases_backend.db.dependencies import readonly_sessionmaker
+from planet_diseases_backend.db.instrumentation import instrument_engine
+from planet_diseases_backend.db.partitions import PartitionMaintainer
+from planet_diseases_backend.db.utils import engine_options
+from planet_diseases_backend.process import (
+    auto_threads_count,
+    boot_elapsed,
+    get_memory_usage,
+)
+from planet_diseases_backend.services.events import EventRecorder
+from planet_diseases_backend.services.health import (
+    HealthMonitor,
+    backlog_probe,
+    db_probe,
+    state_probe,
+)
+from planet_diseases_backend.services.image_store import create_image_store
+from planet_diseases_backend.services.notifications import NotificationHub
+from planet_diseases_backend.services.preload import load_state
+from planet_diseases_backend.services.shared_cache import SharedCache
+from planet_diseases_backend.services.stats import StatsCache
+from planet_diseases_backend.services.storage import create_storage
 from planet_diseases_backend.settings import settings
 
+SHUTDOWN_DURATION = Histogram(
+    "worker_shutdown_duration_seconds",
+    "Time spent stopping every subsystem of a worker.",
+    ["subsystem"],
+    buckets=(0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30),
+)
+
+Hook = Callable[[], Any]
+
+
+class Subsystem(NamedTuple):
+    """Part of the application with its own startup and shutdown."""
+
+    name: str
+    start: Hook
+    stop: Optional[Hook]
+    # Called when the worker starts draining, before in-flight requests end.
+    drain: Optional[Hook]
+    priority: int
+
+
+async def _call(hook: Hook) -> None:
+    result = hook()
+    if inspect.isawaitable(result):
+        await result
+
+
+class Lifecycle:
+    """Ordered startup, draining and shutdown of subsystems."""
+
+    def __init__(self) -> None:
+        self.draining = False
+        self._subsystems: List[Subsystem] = []
+        self._started: List[Subsystem] = []
+
+    def register(
+        self,
+        name: str,
+        start: Hook,
+        stop: Optional[Hook] = None,
+        drain: Optional[Hook] = None,
+        priority: int = 0,
+    ) -> None:
+        """
+        Registers a subsystem.
+
+        Hooks may be functions or coroutine functions.
+
+        :param name: name of the subsystem for logs and metrics.
+        :param start: starts the subsystem.
+        :param stop: stops it, flushing everything it holds.
+        :param drain: prepares it for shutdown, e.g. ends streams.
+        :param priority: subsystems with lower priorities
+            are started earlier and stopped later.
+        """
+        self._subsystems.append(Subsystem(name, start, stop, drain, priority))
+
+    async def start(self) -> None:
+        """
+        Starts all subsystems in order of priorities.
+
+        The server doesn't run shutdown after a failed startup,
+        so if a subsystem fails to start, those already started
+        are stopped here in reverse order.
+
+        :raises Exception: error of the subsystem that failed to start.
+        """
+        for subsystem in sorted(self._subsystems, key=lambda item: item.priority):
+            try:
+                await _call(subsystem.start)
+            except Exception as exc:
+                logger.error("Cannot start {}: {}", subsystem.name, exc)
+                await self.stop(settings.shutdown_timeout)
+                raise
+            self._started.append(subsystem)
+        _running.add(self)
+
+    async def drain(self) -> None:
+        """Fails readiness and drains subsystems, it runs only once."""
+        if self.draining:
+            return
+        self.draining = True
+        logger.info("Worker {} is draining", os.getpid())
+        for subsystem in reversed(self._started):
+            if subsystem.drain is None:
+                continue
+            try:
+                await _call(subsystem.drain)
+            except Exception as exc:
+                logger.error("Cannot drain {}: {}", subsystem.name, exc)
+
+    async def stop(self, timeout: float) -> None:
+        """
+        Stops started subsystems in reverse order within the deadline.
+
+        Waiting for a subsystem that doesn't stop in time is cancelled,
+        so the remaining ones still get a chance to stop.
+
+        :param timeout: seconds for all subsystems to stop.
+        """
+        await self.drain()
+        _running.discard(self)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        started = time.perf_counter()
+        durations = []
+        while self._started:
+            subsystem = self._started.pop()
+            if subsystem.stop is None:
+                continue
+            before = time.perf_counter()
+            try:
+                # Synchronous hooks always run, only waiting is limited.
+                result = subsystem.stop()
+                if inspect.isawaitable(result):
+                    await asyncio.wait_for(result, max(deadline - loop.time(), 0))
+            except asyncio.TimeoutError:
+                logger.error("{} didn't stop in time", subsystem.name)
+            except Exception as exc:
+                logger.error("Cannot stop {}: {}", subsystem.name, exc)
+            elapsed = time.perf_counter() - before
+            SHUTDOWN_DURATION.labels(subsystem.name).observe(elapsed)
+            durations.append(f"{subsystem.name} {elapsed:.3f}s")
+        total = time.perf_counter() - started
+        SHUTDOWN_DURATION.labels("total").observe(total)
+        logger.info(
+            "Worker {} stopped in {:.3f}s ({})",
+            os.getpid(),
+            total,
+            ", ".join(durations),
+        )
+
+
+# Started lifecycles of the process, the server drains them on exit.
+_running: "weakref.WeakSet[Lifecycle]" = weakref.WeakSet()
+
+
+async def drain_all() -> None:
+    """Drains all applications running in the process."""
+    for lifecycle in list(_running):
+        await lifecycle.drain()
+
+
+def is_draining(app: FastAPI) -> bool:
+    """
+    Checks if the application is shutting down.
+
+    :param app: current application.
+    :return: True when the application must not get new requests.
+    """
+    lifecycle: Optional[Lifecycle] = getattr(app.state, "lifecycle", None)
+    return lifecycle is not None and lifecycle.draining
+
 
 def _setup_db(app: FastAPI) -> None:  # pragma: no cover
     """
     Creates connection to the database.
 
     This function creates SQLAlchemy engine instance,
-    session_factory for creating sessions
+    factories of read-write and read-only sessions
     and stores them in the application's state property.
 
     :param app: fastAPI application.
     """
-    engine = create_async_engine(str(settings.db_url), echo=settings.db_echo)
+    engine = create_async_engine(str(settings.db_url), **engine_options())
+    instrument_engine(engine)
     session_factory = async_sessionmaker(
         engine,
         expire_on_commit=False,
     )
     app.state.db_engine = engine
     app.state.db_session_factory = session_factory
+    app.state.db_readonly_session_factory = readonly_sessionmaker(engine)
+
+
+def _setup_threads() -> None:  # pragma: no cover
+    """Sets size of the thread pool used for blocking calls."""
+    threads = settings.threads_count
+    if threads == "auto":
+        threads = auto_threads_count()
+    to_thread.current_default_thread_limiter().total_tokens = threads
+
+
+def _setup_events(app: FastAPI) -> None:  # pragma: no cover
+    """
+    Starts writing usage events in background.
+
+    :param app: fastAPI application.
+    """
+    recorder = EventRecorder(
+        app.state.db_engine,
+        queue_size=settings.events_queue_size,
+        batch_size=settings.events_batch_size,
+        flush_interval=settings.events_flush_interval,
+    )
+    recorder.start()
+    app.state.event_recorder = recorder
+
+
+def _setup_partitions(app: FastAPI) -> None:  # pragma: no cover
+    """
+    Starts partition maintenance in background.
+
+    :param app: fastAPI application.
+    """
+    maintainer = PartitionMaintainer(
+        app.state.db_engine,
+        interval=settings.partitions_maintenance_interval,
+    )
+    maintainer.start()
+    app.state.partition_maintainer = maintainer
+
+
+def _setup_notifications(app: FastAPI) -> None:  # pragma: no cover
+    """
+    Starts listening to notifications for streaming clients.
+
+    :param app: fastAPI application.
+    """
+    hub = NotificationHub(
+        app.state.db_engine,
+        max_connections=settings.stream_max_connections,
+        queue_size=settings.stream_queue_size,
+    )
+    hub.start()
+    app.state.notification_hub = hub
+
+
+def _setup_stats(app: FastAPI) -> None:  # pragma: no cover
+    """
+    Starts refreshing statistics in background.
+
+    :param app: fastAPI application.
+    """
+    cache = StatsCache(
+        app.state.db_engine,
+        max_days=settings.stats_max_days,
+        interval=settings.stats_refresh_interval,
+    )
+    cache.start()
+    app.state.stats_cache = cache
+
+
+def _setup_health(app: FastAPI) -> None:  # pragma: no cover
+    """
+    Starts readiness probes in background.
+
+    :param app: fastAPI application.
+    """
+    monitor = HealthMonitor(
+        {
+            "db": db_probe(app.state.db_engine),
+            "state": state_probe(),
+            "events": backlog_probe(
+                app.state.event_recorder,
+                settings.health_max_event_backlog,
+            ),
+        },
+        interval=settings.health_interval,
+        ttl=settings.health_ttl,
+        timeout=settings.health_probe_timeout,
+    )
+    monitor.start()
+    app.state.health_monitor = monitor
+
+
+def _setup_shared_cache(app: FastAPI) -> None:  # pragma: no cover
+    """
+    Maps the cache shared between workers.
+
+    :param app: fastAPI application.
+    """
+    app.state.shared_cache = SharedCache(
+        settings.shared_cache_dir / "cache.bin",
+        slots=settings.shared_cache_slots,
+        slot_size=settings.shared_cache_slot_size,
+    )
 
 
 def setup_prometheus(app: FastAPI) -> None:  # pragma: no cover
     """
     Enables prometheus integration.
 
+    The instrumentator is imported only when prometheus is enabled.
+    Metrics are exposed with a cached handler,
+    so frequent scrapes don't merge metric files every time.
+
     :param app: current application.
     """
-    PrometheusFastApiInstrumentator(should_group_status_codes=False).instrument(
-        app,
-    ).expose(app, should_gzip=True, name="prometheus_metrics")
+    from prometheus_fastapi_instrumentator.instrumentation import (
+        PrometheusFastApiInstrumentator,
+    )
+
+    from planet_diseases_backend.web.metrics import expose_metrics
+
+    PrometheusFastApiInstrumentator(should_group_status_codes=False).instrument(app)
+    expose_metrics(app, settings.prometheus_cache_seconds)
+
+
+def _report_boot() -> None:  # pragma: no cover
+    """Logs worker's boot time and memory usage."""
+    resident, shared = get_memory_usage()
+    elapsed = boot_elapsed()
+    logger.info(
+        "Worker {} started{}. RSS: {:.1f} MiB, shared: {:.1f} MiB",
+        os.getpid(),
+        "" if elapsed is None else f" in {elapsed:.3f}s",
+        resident / 2**20,
+        shared / 2**20,
+    )
+
+
+def _register_subsystems(app: FastAPI, lifecycle: Lifecycle) -> None:
+    """
+    Registers subsystems of the application.
+
+    :param app: fastAPI application.
+    :param lifecycle: lifecycle of the application.
+    """
+    state = app.state
+    lifecycle.register(
+        "db",
+        functools.partial(_setup_db, app),
+        stop=lambda: state.db_engine.dispose(),
+    )
+    lifecycle.register(
+        "shared_cache",
+        functools.partial(_setup_shared_cache, app),
+        stop=lambda: state.shared_cache.close(),
+    )
+    lifecycle.register(
+        "events",
+        functools.partial(_setup_events, app),
+        stop=lambda: state.event_recorder.stop(),
+        priority=10,
+    )
+    lifecycle.register(
+        "partitions",
+        functools.partial(_setup_partitions, app),
+        stop=lambda: state.partition_maintainer.stop(),
+        priority=10,
+    )
+    lifecycle.register(
+        "storage",
+        lambda: setattr(state, "storage", create_storage()),
+        stop=lambda: state.storage.close(),
+    )
+    lifecycle.register(
+        "images",
+        lambda: setattr(state, "image_store", create_image_store(state.storage)),
+        # Running resizes are finished before the interpreter exits.
+        stop=lambda: state.image_store.executor.shutdown(wait=False),
+        priority=10,
+    )
+    lifecycle.register(
+        "stats",
+        functools.partial(_setup_stats, app),
+        stop=lambda: state.stats_cache.stop(),
+        priority=10,
+    )
+    lifecycle.register(
+        "notifications",
+        functools.partial(_setup_notifications, app),
+        stop=lambda: state.notification_hub.stop(),
+        # Streams never end by themselves, so they'd hold
+        # the server until the graceful timeout.
+        drain=lambda: state.notification_hub.stop(),
+        priority=20,
+    )
+    lifecycle.register(
+        "health",
+        functools.partial(_setup_health, app),
+        stop=lambda: state.health_monitor.stop(),
+        priority=30,
+    )
 
 
 def register_startup_event(
@@ -55,9 +448,17 @@ def register_startup_event(
     @app.on_event("startup")
     async def _startup() -> None:
         app.middleware_stack = None
-        _setup_db(app)
-        setup_prometheus(app)
+        load_state()
+        _setup_threads()
+        lifecycle = Lifecycle()
+        _register_subsystems(app, lifecycle)
+        # Set before starting, so shutdown finds it even if startup fails.
+        app.state.lifecycle = lifecycle
+        await lifecycle.start()
+        if settings.prometheus_enabled:
+            setup_prometheus(app)
         app.middleware_stack = app.build_middleware_stack()
+        _report_boot()
 
     return _startup
 
@@ -74,6 +475,6 @@ def register_shutdown_event(
 
     @app.on_event("shutdown")
     async def _shutdown() -> None:
-        await app.state.db_engine.dispose()
+        await app.state.lifecycle.stop(settings.shutdown_timeout)
 
     return _shutdown
@@ -0,0 +1,134 @@
+"""
+Serving of stored images.
+
+Images are read from the object storage. They never change,
+because they are named by their content.
+So the digest is a strong ETag and responses may be cached forever.
+Single byte ranges are supported, so clients can resume
+downloads of large originals.
+
+Media URLs are public capabilities: anyone who knows the digest
+can fetch the image, so no authentication is required and shared
+caches may keep the responses. A digest is the SHA-256 of the
+content and can't be guessed, it's only known to those who
+uploaded the image or were given its URL. Identical uploads of
+different users share one digest, so per-user access control
+isn't possible here anyway.
+"""
+
+import re
+from typing import Optional, Tuple
+
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+
+from planet_diseases_backend.services.image_store import (
+    ORIGINAL,
+    ImageStore,
+    get_image_store,
+)
+
+router = APIRouter()
+
+_RANGE = re.compile(r"bytes=(\d*)-(\d*)")
+# Magic bytes of formats Pillow accepts from clients.
+_SIGNATURES = (
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF8", "image/gif"),
+    (b"BM", "image/bmp"),
+)
+
+
+def _content_type(head: bytes) -> str:
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    for signature, content_type in _SIGNATURES:
+        if head.startswith(signature):
+            return content_type
+    return "application/octet-stream"
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parses a single byte range.
+
+    :param header: value of Range header.
+    :param size: size of the file.
+    :return: first and last byte, None if the header isn't supported
+        and the whole file must be sent.
+    :raises HTTPException: if the range is not satisfiable.
+    """
+    match = _RANGE.fullmatch(header.strip())
+    if match is None or match[1] == match[2] == "":
+        return None
+    if match[1] == "":
+        # Suffix range: the last N bytes.
+        start, end = max(size - int(match[2]), 0), size - 1
+    else:
+        start = int(match[1])
+        end = min(int(match[2]), size - 1) if match[2] else size - 1
+    if start > end or start >= size:
+        raise HTTPException(
+            status_code=416,
+            headers={"Content-Range": f"bytes */{size}"},
+        )
+    return start, end
+
+
+@router.get("/{variant}/{digest}", name="get_media")
+async def get_media(
+    variant: str,
+    digest: str,
+    request: Request,
+    store: ImageStore = Depends(get_image_store),
+) -> Response:
+    """
+    Sends a stored image or its derivative.
+
+    :param variant: "originals" or a derivative name.
+    :param digest: SHA-256 of the original.
+    :param request: current request.
+    :param store: image store.
+    :return: the file or its range.
+    :raises HTTPException: if the file isn't found.
+    """
+    try:
+        size = await store.size(digest, variant)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Image not found") from None
+    etag = f'"{digest}-{variant}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "public, max-age=31536000, immutable",
+        "Accept-Ranges": "bytes",
+    }
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    if variant == ORIGINAL:
+        head = b"".join([chunk async for chunk in store.read(digest, end=15)])
+        media_type = _content_type(head)
+    else:
+        media_type = "image/jpeg"
+
+    byte_range = None
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (if_range is None or if_range == etag):
+        byte_range = parse_range(range_header, size)
+    if byte_range is None:
+        headers["Content-Length"] = str(size)
+        return StreamingResponse(
+            store.read(digest, variant),
+            headers=headers,
+            media_type=media_type,
+        )
+    start, end = byte_range
+    headers["Content-Length"] = str(end - start + 1)
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    return StreamingResponse(
+        store.read(digest, variant, start, end),
+        status_code=206,
+        headers=headers,
+        media_type=media_type,
+    )
@@ -0,0 +1,88 @@
+"""
+Cached prometheus exposition.
+
+In multiprocess mode every scrape reads and merges files of all workers.
+Prometheus and its replicas may scrape several workers within seconds,
+so the rendered payload, plain and gzipped, is reused for a short window.
+"""
+
+import gzip
+import os
+import threading
+import time
+from typing import Optional, Tuple
+
+from fastapi import FastAPI, Request, Response
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    generate_latest,
+)
+from prometheus_client.multiprocess import MultiProcessCollector
+
+
+def _registry() -> CollectorRegistry:
+    if "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+        return REGISTRY
+    registry = CollectorRegistry()
+    MultiProcessCollector(registry)
+    return registry
+
+
+class ExpositionCache:
+    """Rendered metrics, regenerated at most once per ``ttl`` seconds."""
+
+    def __init__(
+        self,
+        ttl: float,
+        registry: Optional[CollectorRegistry] = None,
+    ) -> None:
+        self.ttl = ttl
+        self.registry = _registry() if registry is None else registry
+        self._lock = threading.Lock()
+        self._rendered = -float("inf")
+        self._payload: Tuple[bytes, bytes] = (b"", b"")
+
+    def get(self, gzipped: bool) -> bytes:
+        """
+        Returns rendered metrics.
+
+        Only one thread renders metrics at a time,
+        concurrent scrapes wait for it and reuse the result.
+
+        :param gzipped: whether gzip-compressed payload is needed.
+        :return: metrics in text exposition format.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if now - self._rendered >= self.ttl:
+                plain = generate_latest(self.registry)
+                self._payload = (plain, gzip.compress(plain, compresslevel=6))
+                self._rendered = now
+            plain, compressed = self._payload
+        return compressed if gzipped else plain
+
+
+def expose_metrics(app: FastAPI, ttl: float) -> None:
+    """
+    Adds /metrics route with cached exposition.
+
+    The handler is sync, so rendering doesn't block the event loop.
+
+    :param app: current application.
+    :param ttl: seconds to reuse rendered metrics, 0 disables caching.
+    """
+    cache = ExpositionCache(ttl)
+
+    @app.get("/metrics", name="prometheus_metrics", include_in_schema=False)
+    def metrics(request: Request) -> Response:
+        gzipped = "gzip" in request.headers.get("Accept-Encoding", "")
+        response = Response(
+            content=cache.get(gzipped),
+            media_type=CONTENT_TYPE_LATEST,
+            headers={"Vary": "Accept-Encoding"},
+        )
+        if gzipped:
+            response.headers["Content-Encoding"] = "gzip"
+        return response
@@ -0,0 +1,137 @@
+"""
+Request latency breakdown.
+
+:class:`TimingMiddleware` creates statistics for every HTTP request,
+observes time spent in every stage when the request is finished
+and optionally reports it to the client in ``Server-Timing`` header.
+
+Handler time is measured by wrapping endpoints of all API routes
+with :func:`instrument_routes`.
+"""
+
+import asyncio
+import functools
+import time
+from typing import Any, Callable
+
+from fastapi import FastAPI
+from fastapi.routing import APIRoute
+from prometheus_client import Histogram
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from planet_diseases_backend.db.instrumentation import report_repeated_queries
+from planet_diseases_backend.request_stats import (
+    RequestStats,
+    bind_request_stats,
+    current_request_stats,
+    reset_request_stats,
+)
+from planet_diseases_backend.settings import settings
+
+STAGE_DURATION = Histogram(
+    "http_request_stage_duration_seconds",
+    "Time spent by requests in different stages.",
+    ["handler", "stage"],
+)
+
+
+def _server_timing(stats: RequestStats, now: float) -> str:
+    return ", ".join(
+        f"{stage};dur={seconds * 1000:.2f}"
+        for stage, seconds in stats.breakdown(now).items()
+    )
+
+
+class TimingMiddleware:
+    """Middleware that measures time spent in request stages."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        """
+        Handles ASGI request.
+
+        :param scope: connection scope.
+        :param receive: function to receive messages.
+        :param send: function to send messages.
+        """
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = bind_request_stats(stats)
+
+        async def _send(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                stats.response_started = time.perf_counter()
+                if settings.server_timing_enabled:
+                    headers = MutableHeaders(scope=message)
+                    headers.append(
+                        "Server-Timing",
+                        _server_timing(stats, stats.response_started),
+                    )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            reset_request_stats(token)
+            route = scope.get("route")
+            handler = getattr(route, "path", "none")
+            for stage, seconds in stats.breakdown().items():
+                STAGE_DURATION.labels(handler, stage).observe(seconds)
+            report_repeated_queries(stats, handler)
+
+
+def _mark_handler_started() -> None:
+    stats = current_request_stats()
+    if stats is not None:
+        stats.handler_started = time.perf_counter()
+
+
+def _mark_handler_finished() -> None:
+    stats = current_request_stats()
+    if stats is not None:
+        stats.handler_finished = time.perf_counter()
+        stats.add("handler", stats.handler_finished - (stats.handler_started or 0))
+
+
+def _timed_endpoint(call: Callable[..., Any]) -> Callable[..., Any]:
+    if asyncio.iscoroutinefunction(call):
+
+        @functools.wraps(call)
+        async def _async_endpoint(*args: Any, **kwargs: Any) -> Any:
+            _mark_handler_started()
+            try:
+                return await call(*args, **kwargs)
+            finally:
+                _mark_handler_finished()
+
+        return _async_endpoint
+
+    @functools.wraps(call)
+    def _sync_endpoint(*args: Any, **kwargs: Any) -> Any:
+        _mark_handler_started()
+        try:
+            return call(*args, **kwargs)
+        finally:
+            _mark_handler_finished()
+
+    return _sync_endpoint
+
+
+def instrument_routes(app: FastAPI) -> None:
+    """
+    Wraps endpoints of all API routes to measure handler time.
+
+    FastAPI calls ``route.dependant.call`` on every request,
+    so replacing it doesn't require rebuilding routes.
+
+    :param app: application with all routes included.
+    """
+    for route in app.routes:
+        if isinstance(route, APIRoute) and route.dependant.call is not None:
+            route.dependant.call = _timed_endpoint(route.dependant.call)
@@ -0,0 +1 @@
+"""Benchmarks for API hot paths."""
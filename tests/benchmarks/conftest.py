@@ -0,0 +1,256 @@
+import asyncio
+import json
+import random
+import time
+from pathlib import Path
+from typing import Any, AsyncGenerator, Awaitable, Callable, Dict, Iterator, List
+
+import pytest
+from fastapi import FastAPI
+from fastapi_users.password import PasswordHelper
+from httpx import ASGITransport, AsyncClient, Response
+from sqlalchemy import insert, text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
+
+from planet_diseases_backend.db.dependencies import (
+    get_db_session,
+    get_readonly_session,
+    readonly_sessionmaker,
+)
+from planet_diseases_backend.db.models.dummy_model import DummyModel
+from planet_diseases_backend.db.models.users import User
+from planet_diseases_backend.web.application import get_app
+
+SEED = 42
+DUMMIES_COUNT = 1000
+USERS_COUNT = 100
+USER_EMAIL = "benchmark@example.com"
+USER_PASSWORD = "benchmark"  # noqa: S105
+
+BenchmarkRequest = Callable[[AsyncClient], Awaitable[Response]]
+BenchmarkResults = Dict[str, Dict[str, float]]
+
+
+def percentile(latencies: List[float], fraction: float) -> float:
+    """
+    Nearest-rank percentile.
+
+    :param latencies: sorted latencies.
+    :param fraction: percentile as a fraction of one.
+    :return: latency at the percentile.
+    """
+    index = max(int(round(fraction * len(latencies))) - 1, 0)
+    return latencies[index]
+
+
+@pytest.fixture(scope="session")
+def benchmark_results(request: pytest.FixtureRequest) -> Iterator[BenchmarkResults]:
+    """
+    Results of all benchmarks.
+
+    They are written to the JSON file when the session finishes.
+
+    :param request: pytest request.
+    :yield: results by benchmark name.
+    """
+    results: BenchmarkResults = {}
+    yield results
+    if results:
+        output = Path(request.config.getoption("--benchmark-json"))
+        output.write_text(json.dumps(results, indent=2, sort_keys=True))
+
+
+@pytest.fixture(scope="session")
+def benchmark_baseline(request: pytest.FixtureRequest) -> BenchmarkResults:
+    """
+    Results of a previous run.
+
+    :param request: pytest request.
+    :return: results by benchmark name, empty if there is no baseline.
+    """
+    baseline = request.config.getoption("--benchmark-baseline")
+    if baseline is None:
+        return {}
+    return json.loads(Path(baseline).read_text())
+
+
+@pytest.fixture(scope="module")
+async def seeded_engine(
+    _engine: AsyncEngine,
+) -> AsyncGenerator[AsyncEngine, None]:
+    """
+    Fills the database with a fixed dataset.
+
+    :param _engine: current engine.
+    :yield: engine with seeded database.
+    """
+    rng = random.Random(SEED)  # noqa: S311
+    hashed_password = PasswordHelper().hash(USER_PASSWORD)
+    users = [
+        {
+            "email": USER_EMAIL if index == 0 else f"user{index}@example.com",
+            "hashed_password": hashed_password,
+            "is_active": True,
+            "is_superuser": False,
+            "is_verified": rng.random() > 0.5,
+        }
+        for index in range(USERS_COUNT)
+    ]
+    dummies = [
+        {"name": f"{rng.choice(['apple', 'tomato', 'wheat'])}-{rng.getrandbits(32)}"}
+        for _ in range(DUMMIES_COUNT)
+    ]
+    async with _engine.begin() as conn:
+        await conn.execute(insert(User), users)
+        await conn.execute(insert(DummyModel), dummies)
+
+    try:
+        yield _engine
+    finally:
+        async with _engine.begin() as conn:
+            await conn.execute(text('TRUNCATE "user", dummy_model'))
+
+
+@pytest.fixture(scope="module")
+def benchmark_app(seeded_engine: AsyncEngine) -> FastAPI:
+    """
+    Application with real database sessions.
+
+    Unlike functional tests, requests run concurrently,
+    so every request gets its own session, as in production.
+
+    :param seeded_engine: engine with seeded database.
+    :return: application.
+    """
+    session_factory = async_sessionmaker(seeded_engine, expire_on_commit=False)
+
+    async def _get_db_session() -> AsyncGenerator[AsyncSession, None]:
+        session = session_factory()
+        try:
+            yield session
+        finally:
+            await session.commit()
+            await session.close()
+
+    readonly_session_factory = readonly_sessionmaker(seeded_engine)
+
+    async def _get_readonly_session() -> AsyncGenerator[AsyncSession, None]:
+        async with readonly_session_factory() as session:
+            yield session
+
+    application = get_app()
+    application.dependency_overrides[get_db_session] = _get_db_session
+    application.dependency_overrides[get_readonly_session] = _get_readonly_session
+    return application
+
+
+@pytest.fixture(scope="module")
+async def benchmark_client(
+    benchmark_app: FastAPI,
+) -> AsyncGenerator[AsyncClient, None]:
+    """
+    Client that calls the application in-process.
+
+    :param benchmark_app: application.
+    :yield: client for the app.
+    """
+    transport = ASGITransport(app=benchmark_app)  # type: ignore[arg-type]
+    async with AsyncClient(transport=transport, base_url="http://test") as client:
+        yield client
+
+
+@pytest.fixture(scope="module")
+async def auth_headers(
+    benchmark_app: FastAPI,
+    benchmark_client: AsyncClient,
+) -> Dict[str, str]:
+    """
+    Headers of the authenticated benchmark user.
+
+    :param benchmark_app: application.
+    :param benchmark_client: client for the app.
+    :return: headers with JWT.
+    """
+    response = await benchmark_client.post(
+        benchmark_app.url_path_for("auth:jwt.login"),
+        data={"username": USER_EMAIL, "password": USER_PASSWORD},
+    )
+    response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+@pytest.fixture
+def benchmark(
+    request: pytest.FixtureRequest,
+    benchmark_client: AsyncClient,
+    benchmark_results: BenchmarkResults,
+    benchmark_baseline: BenchmarkResults,
+) -> Callable[[str, BenchmarkRequest], Awaitable[Dict[str, float]]]:
+    """
+    Runs benchmark of a single request type.
+
+    The request is sent --benchmark-requests times
+    with --benchmark-concurrency requests in flight.
+    If there is a baseline, the result must not be worse
+    than the baseline by more than --benchmark-tolerance.
+
+    :param request: pytest request.
+    :param benchmark_client: client for the app.
+    :param benchmark_results: results of all benchmarks.
+    :param benchmark_baseline: results of a previous run.
+    :return: function that runs benchmark.
+    """
+    total = request.config.getoption("--benchmark-requests")
+    concurrency = request.config.getoption("--benchmark-concurrency")
+    tolerance = request.config.getoption("--benchmark-tolerance")
+
+    async def _run(name: str, send: BenchmarkRequest) -> Dict[str, float]:
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies: List[float] = []
+
+        async def _send_one(record: bool) -> None:
+            async with semaphore:
+                started = time.perf_counter()
+                response = await send(benchmark_client)
+                elapsed = time.perf_counter() - started
+            assert response.is_success, response.text
+            if record:
+                latencies.append(elapsed)
+
+        # Warm up caches and connection pool.
+        await asyncio.gather(*(_send_one(False) for _ in range(concurrency)))
+        started = time.perf_counter()
+        await asyncio.gather(*(_send_one(True) for _ in range(total)))
+        elapsed = time.perf_counter() - started
+
+        latencies.sort()
+        result = {
+            "requests": total,
+            "concurrency": concurrency,
+            "rps": total / elapsed,
+            "p50_ms": percentile(latencies, 0.5) * 1000,
+            "p95_ms": percentile(latencies, 0.95) * 1000,
+            "p99_ms": percentile(latencies, 0.99) * 1000,
+        }
+        benchmark_results[name] = result
+        _check_regression(name, result, benchmark_baseline.get(name), tolerance)
+        return result
+
+    return _run
+
+
+def _check_regression(
+    name: str,
+    result: Dict[str, Any],
+    baseline: Any,
+    tolerance: float,
+) -> None:
+    if not baseline:
+        return
+    assert result["p95_ms"] <= baseline["p95_ms"] * (1 + tolerance), (
+        f"{name}: p95 {result['p95_ms']:.2f} ms, "
+        f"baseline {baseline['p95_ms']:.2f} ms"
+    )
+    assert result["rps"] >= baseline["rps"] * (
+        1 - tolerance
+    ), f"{name}: {result['rps']:.1f} rps, baseline {baseline['rps']:.1f} rps"
@@ -0,0 +1,67 @@
+import random
+from typing import Awaitable, Callable, Dict
+
+import pytest
+from fastapi import FastAPI
+from httpx import AsyncClient, Response
+
+from tests.benchmarks.conftest import SEED, BenchmarkRequest
+
+Benchmark = Callable[[str, BenchmarkRequest], Awaitable[Dict[str, float]]]
+
+pytestmark = [pytest.mark.benchmark, pytest.mark.anyio]
+
+
+async def test_echo(benchmark_app: FastAPI, benchmark: Benchmark) -> None:
+    """Benchmarks echo route, which doesn't touch the database."""
+    url = benchmark_app.url_path_for("send_echo_message")
+
+    async def _send(client: AsyncClient) -> Response:
+        return await client.post(url, json={"message": "benchmark"})
+
+    await benchmark("echo", _send)
+
+
+async def test_dummy_list(benchmark_app: FastAPI, benchmark: Benchmark) -> None:
+    """Benchmarks listing of dummy models."""
+    url = benchmark_app.url_path_for("get_dummy_models")
+
+    async def _send(client: AsyncClient) -> Response:
+        return await client.get(url, params={"limit": 50, "offset": 100})
+
+    await benchmark("dummy_list", _send)
+
+
+async def test_dummy_create(benchmark_app: FastAPI, benchmark: Benchmark) -> None:
+    """Benchmarks creation of dummy models."""
+    url = benchmark_app.url_path_for("create_dummy_model")
+    rng = random.Random(SEED)  # noqa: S311
+
+    async def _send(client: AsyncClient) -> Response:
+        return await client.put(url, json={"name": f"new-{rng.getrandbits(32)}"})
+
+    await benchmark("dummy_create", _send)
+
+
+async def test_user_list(benchmark_app: FastAPI, benchmark: Benchmark) -> None:
+    """Benchmarks listing of users."""
+    url = benchmark_app.url_path_for("get_user_models")
+
+    async def _send(client: AsyncClient) -> Response:
+        return await client.get(url, params={"limit": 50})
+
+    await benchmark("user_list", _send)
+
+
+async def test_current_user(
+    benchmark_app: FastAPI,
+    benchmark: Benchmark,
+    auth_headers: Dict[str, str],
+) -> None:
+    """Benchmarks route authenticated with JWT."""
+    url = benchmark_app.url_path_for("users:current_user")
+
+    async def _send(client: AsyncClient) -> Response:
+        return await client.get(url, headers=auth_headers)
+
+    await benchmark("current_user", _send)
@@ -0,0 +1,83 @@
+import statistics
+import time
+import tracemalloc
+from typing import Any, Callable, List
+
+import numpy as np
+import pytest
+from numpy.typing import NDArray
+from PIL import Image
+
+from planet_diseases_backend.services.preprocessing import create_preprocessor
+from planet_diseases_backend.settings import settings
+from tests.benchmarks.conftest import SEED, BenchmarkResults
+
+pytestmark = pytest.mark.benchmark
+
+BATCHES = 20
+
+Preprocess = Callable[[List[Image.Image]], NDArray[np.float32]]
+
+
+def _per_image(images: List[Image.Image]) -> NDArray[np.float32]:
+    """Normalizes images one by one with temporary arrays."""
+    mean = np.asarray(settings.image_model_mean, dtype=np.float32)
+    std = np.asarray(settings.image_model_std, dtype=np.float32)
+    return np.stack(
+        [
+            ((np.asarray(image, dtype=np.float32) / 255 - mean) / std).transpose(
+                2,
+                0,
+                1,
+            )
+            for image in images
+        ],
+    )
+
+
+def _measure(preprocess: Preprocess, images: List[Image.Image]) -> Any:
+    preprocess(images)
+    durations = []
+    for _ in range(BATCHES):
+        started = time.perf_counter()
+        preprocess(images)
+        durations.append(time.perf_counter() - started)
+    tracemalloc.start()
+    try:
+        preprocess(images)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    median = statistics.median(durations)
+    return {
+        "batch": len(images),
+        "median_ms": median * 1000,
+        "images_per_second": len(images) / median,
+        "peak_kib": peak / 1024,
+    }
+
+
+def test_preprocessing(benchmark_results: BenchmarkResults) -> None:
+    """Benchmarks normalization of a batch image by image and at once."""
+    preprocessor = create_preprocessor()
+    size = settings.image_model_input_size
+    rng = np.random.default_rng(SEED)
+    images = [
+        Image.fromarray(rng.integers(0, 256, (size, size, 3), dtype=np.uint8))
+        for _ in range(preprocessor.batch_size)
+    ]
+
+    def _batched(batch: List[Image.Image]) -> NDArray[np.float32]:
+        with preprocessor.batch(batch) as tensor:
+            # Inference would read the tensor here.
+            return tensor
+
+    per_image = _measure(_per_image, images)
+    batched = _measure(_batched, images)
+    benchmark_results["preprocessing_per_image"] = per_image
+    benchmark_results["preprocessing_batched"] = batched
+
+    with preprocessor.batch(images) as tensor:
+        np.testing.assert_allclose(tensor, _per_image(images), atol=1e-5)
+    assert preprocessor.pool.created == 1
+    assert batched["peak_kib"] < per_image["peak_kib"]
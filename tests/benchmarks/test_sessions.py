@@ -0,0 +1,96 @@
+import statistics
+import time
+import tracemalloc
+from typing import Any, AsyncGenerator, Awaitable, Callable, List
+
+import pytest
+from sqlalchemy import insert, select, text
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker
+
+from planet_diseases_backend.db.dependencies import readonly_sessionmaker
+from planet_diseases_backend.db.models.users import User
+from planet_diseases_backend.web.api.users.schema import UserResponseModel
+from tests.benchmarks.conftest import BenchmarkResults
+
+pytestmark = [pytest.mark.benchmark, pytest.mark.anyio]
+
+ROWS_COUNT = 10_000
+ROUNDS = 5
+
+Listing = Callable[[], Awaitable[List[UserResponseModel]]]
+
+
+@pytest.fixture(scope="module")
+async def users_engine(_engine: AsyncEngine) -> AsyncGenerator[AsyncEngine, None]:
+    """
+    Fills the user table with many rows.
+
+    :param _engine: current engine.
+    :yield: engine with seeded database.
+    """
+    users = [
+        {
+            "email": f"listed{index}@example.com",
+            "hashed_password": "-",
+            "is_active": True,
+            "is_superuser": False,
+            "is_verified": index % 2 == 0,
+        }
+        for index in range(ROWS_COUNT)
+    ]
+    async with _engine.begin() as conn:
+        await conn.execute(insert(User), users)
+
+    try:
+        yield _engine
+    finally:
+        async with _engine.begin() as conn:
+            await conn.execute(text('TRUNCATE "user"'))
+
+
+async def _measure(listing: Listing) -> Any:
+    await listing()
+    durations = []
+    for _ in range(ROUNDS):
+        started = time.perf_counter()
+        assert len(await listing()) == ROWS_COUNT
+        durations.append(time.perf_counter() - started)
+    # Memory is measured separately, tracing slows allocations down.
+    tracemalloc.start()
+    try:
+        await listing()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "rows": ROWS_COUNT,
+        "median_ms": statistics.median(durations) * 1000,
+        "peak_kib": peak / 1024,
+    }
+
+
+async def test_session_profiles(
+    users_engine: AsyncEngine,
+    benchmark_results: BenchmarkResults,
+) -> None:
+    """Benchmarks listing of users in read-write and read-only sessions."""
+    session_factory = async_sessionmaker(users_engine, expire_on_commit=False)
+    readonly_session_factory = readonly_sessionmaker(users_engine)
+    columns = [User.__table__.c[name] for name in UserResponseModel.model_fields]
+
+    async def _list_entities() -> List[UserResponseModel]:
+        async with session_factory() as session:
+            rows = await session.execute(select(User))
+            return [UserResponseModel.model_validate(user) for user in rows.scalars()]
+
+    async def _list_rows() -> List[UserResponseModel]:
+        async with readonly_session_factory() as session:
+            rows = await session.execute(select(*columns))
+            return [UserResponseModel.model_validate(row) for row in rows]
+
+    write = await _measure(_list_entities)
+    readonly = await _measure(_list_rows)
+    benchmark_results["session_write_10k"] = write
+    benchmark_results["session_readonly_10k"] = readonly
+
+    assert readonly["peak_kib"] < write["peak_kib"]
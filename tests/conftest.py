@@ -1,8 +1,12 @@
-from typing import Any, AsyncGenerator
+import hashlib
+import os
+from pathlib import Path
+from typing import Any, AsyncGenerator, List
 
 import pytest
 from fastapi import FastAPI
 from httpx import AsyncClient
+from sqlalchemy import text
 from sqlalchemy.ext.asyncio import (
     AsyncEngine,
     AsyncSession,
@@ -10,11 +14,86 @@ from sqlalchemy.ext.asyncio import (
     create_async_engine,
 )
 
-from planet_diseases_backend.db.dependencies import get_db_session
-from planet_diseases_backend.db.utils import create_database, drop_database
+from planet_diseases_backend.db.dependencies import (
+    get_db_session,
+    get_readonly_session,
+)
+from planet_diseases_backend.db.instrumentation import instrument_engine
+from planet_diseases_backend.db.utils import (
+    create_database,
+    database_exists,
+    databases_lock,
+    drop_database,
+    engine_options,
+    quote_database,
+)
 from planet_diseases_backend.settings import settings
 from planet_diseases_backend.web.application import get_app
 
+# Name of the database before workers get their own ones.
+DB_BASE = settings.db_base
+
+
+def pytest_configure(config: pytest.Config) -> None:
+    """
+    Gives every pytest-xdist worker its own database.
+
+    :param config: pytest config.
+    """
+    worker = os.environ.get("PYTEST_XDIST_WORKER")
+    if worker:
+        settings.db_base = f"{DB_BASE}_{worker}"
+
+
+def pytest_addoption(parser: pytest.Parser) -> None:
+    """
+    Adds options for benchmarks.
+
+    :param parser: pytest options parser.
+    """
+    group = parser.getgroup("benchmark")
+    group.addoption(
+        "--benchmark",
+        action="store_true",
+        help="run benchmarks, they are skipped by default",
+    )
+    group.addoption(
+        "--benchmark-json",
+        default="benchmark.json",
+        help="file to write benchmark results to",
+    )
+    group.addoption(
+        "--benchmark-baseline",
+        default=None,
+        help="results of a previous run to compare with",
+    )
+    group.addoption(
+        "--benchmark-tolerance",
+        type=float,
+        default=0.2,
+        help="allowed relative regression compared to the baseline",
+    )
+    group.addoption("--benchmark-requests", type=int, default=500)
+    group.addoption("--benchmark-concurrency", type=int, default=16)
+
+
+def pytest_collection_modifyitems(
+    config: pytest.Config,
+    items: List[pytest.Item],
+) -> None:
+    """
+    Skips benchmarks unless they are explicitly requested.
+
+    :param config: pytest config.
+    :param items: collected tests.
+    """
+    if config.getoption("--benchmark"):
+        return
+    skip = pytest.mark.skip(reason="benchmarks run only with --benchmark")
+    for item in items:
+        if "benchmark" in item.keywords:
+            item.add_marker(skip)
+
 
 @pytest.fixture(scope="session")
 def anyio_backend() -> str:
@@ -26,23 +105,102 @@ def anyio_backend() -> str:
     return "asyncio"
 
 
+def _schema_fingerprint() -> str:
+    """
+    Hash of the code that defines the schema.
+
+    Models, DDL events and partitions are all in the db package.
+
+    :return: short hex digest.
+    """
+    from planet_diseases_backend.db import meta
+
+    sha256 = hashlib.sha256()
+    root = Path(meta.__file__).parent
+    for path in sorted(root.rglob("*.py")):
+        sha256.update(str(path.relative_to(root)).encode())
+        sha256.update(path.read_bytes())
+    return sha256.hexdigest()[:12]
+
+
+async def _build_template(name: str) -> None:
+    """
+    Creates a database with the schema.
+
+    :param name: name of the database.
+    """
+    from planet_diseases_backend.db.meta import meta
+    from planet_diseases_backend.db.partitions import maintain_partitions
+
+    await create_database(name)
+    db_url = str(settings.db_url.with_path(f"/{name}"))
+    engine = create_async_engine(db_url, **engine_options())
+    try:
+        async with engine.begin() as conn:
+            await conn.run_sync(meta.create_all)
+        await maintain_partitions(engine)
+    finally:
+        await engine.dispose()
+
+
+async def _template_database() -> str:
+    """
+    Returns the template database of the current schema.
+
+    The template is built by the first worker of the first run
+    and reused until the schema changes, templates of other
+    schemas are dropped. Workers clone it instead of creating
+    the schema, which takes seconds as the number of tables grows.
+
+    :return: name of the template.
+    """
+    prefix = f"{DB_BASE}_template_"
+    name = f"{prefix}{_schema_fingerprint()}"
+    async with databases_lock() as conn:
+        if await database_exists(name):
+            return name
+        stale = await conn.execute(
+            text(
+                "SELECT datname FROM pg_database "
+                "WHERE starts_with(datname, :prefix) AND datname <> :name",
+            ),
+            {"prefix": prefix, "name": name},
+        )
+        for (database,) in stale:
+            await drop_database(database)
+        building = f"{name}_building"
+        await _build_template(building)
+        await conn.execute(
+            text(
+                f"ALTER DATABASE {quote_database(building)} "
+                f"RENAME TO {quote_database(name)}",
+            ),
+        )
+    return name
+
+
 @pytest.fixture(scope="session")
 async def _engine() -> AsyncGenerator[AsyncEngine, None]:
     """
     Create engine and databases.
 
+    Every worker gets its own copy of the template database.
+
     :yield: new engine.
     """
-    from planet_diseases_backend.db.meta import meta
     from planet_diseases_backend.db.models import load_all_models
+    from planet_diseases_backend.db.partitions import maintain_partitions
 
     load_all_models()
 
-    await create_database()
+    template = await _template_database()
+    async with databases_lock():
+        await create_database(template=template)
 
-    engine = create_async_engine(str(settings.db_url))
-    async with engine.begin() as conn:
-        await conn.run_sync(meta.create_all)
+    engine = create_async_engine(str(settings.db_url), **engine_options())
+    instrument_engine(engine)
+    # Partitions of the template may be months old.
+    await maintain_partitions(engine)
 
     try:
         yield engine
@@ -92,6 +250,7 @@ def fastapi_app(
     """
     application = get_app()
     application.dependency_overrides[get_db_session] = lambda: dbsession
+    application.dependency_overrides[get_readonly_session] = lambda: dbsession
     return application
 
 
@@ -0,0 +1,192 @@
+"""
+In-process stand-in for an S3-compatible service.
+
+It keeps objects of any bucket in memory and supports what
+:class:`~planet_diseases_backend.services.storage.S3Storage` uses:
+single PUT, multipart uploads, GET with a byte range, HEAD and DELETE.
+Every request must be signed with the expected credentials.
+"""
+
+import asyncio
+import hashlib
+import re
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, Optional, Set
+
+import httpx
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.routing import Route
+
+from planet_diseases_backend.services.storage import S3Storage, sign_v4
+
+ACCESS_KEY = "test-access-key"
+SECRET_KEY = "test-secret-key"  # noqa: S105
+REGION = "us-east-1"
+
+_AUTHORIZATION = re.compile(
+    r"AWS4-HMAC-SHA256 Credential=[^,]+, SignedHeaders=([^,]+), Signature=\w+",
+)
+_PART = re.compile(r"<PartNumber>(\d+)</PartNumber><ETag>([^<]+)</ETag>")
+_RANGE = re.compile(r"bytes=(\d+)-(\d*)")
+
+
+class FakeS3:
+    """Objects, uploads and observations of the fake service."""
+
+    def __init__(self) -> None:
+        self.objects: Dict[str, bytes] = {}
+        self.uploads: Dict[str, Dict[int, bytes]] = {}
+        # Part numbers that fail with 500.
+        self.failing_parts: Set[int] = set()
+        self.active_parts = 0
+        self.max_active_parts = 0
+        self.app = Starlette(
+            routes=[
+                Route(
+                    "/{bucket}/{key:path}",
+                    self.handle,
+                    methods=["GET", "HEAD", "PUT", "POST", "DELETE"],
+                ),
+            ],
+        )
+
+    def storage(self, secret_key: str = SECRET_KEY) -> S3Storage:
+        """
+        Storage that sends requests to the service.
+
+        :param secret_key: secret key to sign requests with.
+        :return: storage with small parts, so uploads are split.
+        """
+        transport = httpx.ASGITransport(app=self.app)  # type: ignore[arg-type]
+        return S3Storage(
+            httpx.AsyncClient(transport=transport, base_url="http://s3.test"),
+            bucket="bucket",
+            region=REGION,
+            access_key=ACCESS_KEY,
+            secret_key=secret_key,
+            part_size=1024,
+            concurrency=3,
+        )
+
+    def _is_signed(self, request: Request, body: bytes) -> bool:
+        """
+        Checks the signature as the real service does.
+
+        :param request: incoming request.
+        :param body: body of the request.
+        :return: True if the signature is valid.
+        """
+        match = _AUTHORIZATION.fullmatch(request.headers.get("authorization", ""))
+        payload_hash = request.headers.get("x-amz-content-sha256")
+        if match is None or payload_hash != hashlib.sha256(body).hexdigest():
+            return False
+        query = request.scope["query_string"].decode()
+        expected = httpx.Request(
+            request.method,
+            f"http://{request.headers['host']}{request.scope['raw_path'].decode()}"
+            + (f"?{query}" if query else ""),
+            headers={
+                name: request.headers[name]
+                for name in match[1].split(";")
+                if not name.startswith("x-amz-")
+            },
+        )
+        sign_v4(
+            expected,
+            REGION,
+            ACCESS_KEY,
+            SECRET_KEY,
+            payload_hash,
+            datetime.strptime(
+                request.headers["x-amz-date"],
+                "%Y%m%dT%H%M%SZ",
+            ).replace(tzinfo=timezone.utc),
+        )
+        return expected.headers["authorization"] == request.headers["authorization"]
+
+    async def handle(self, request: Request) -> Response:
+        """
+        Handles any request for an object.
+
+        :param request: incoming request.
+        :return: response like S3 sends.
+        """
+        body = await request.body()
+        if not self._is_signed(request, body):
+            return Response(status_code=403)
+        key = f"{request.path_params['bucket']}/{request.path_params['key']}"
+        params = request.query_params
+        if request.method == "POST":
+            return self._post(key, params.get("uploadId"), body)
+        if request.method == "PUT" and "uploadId" in params:
+            return await self._put_part(
+                params["uploadId"],
+                int(params["partNumber"]),
+                body,
+            )
+        if request.method == "PUT":
+            self.objects[key] = body
+            return Response()
+        if request.method == "DELETE":
+            if "uploadId" in params:
+                self.uploads.pop(params["uploadId"], None)
+            else:
+                self.objects.pop(key, None)
+            return Response(status_code=204)
+        return self._get(request, key)
+
+    def _post(self, key: str, upload_id: Optional[str], body: bytes) -> Response:
+        if upload_id is None:
+            upload_id = uuid.uuid4().hex
+            self.uploads[upload_id] = {}
+            return Response(
+                "<InitiateMultipartUploadResult>"
+                f"<UploadId>{upload_id}</UploadId>"
+                "</InitiateMultipartUploadResult>",
+                media_type="application/xml",
+            )
+        parts = self.uploads.pop(upload_id)
+        self.objects[key] = b"".join(
+            parts[int(number)] for number, _ in _PART.findall(body.decode())
+        )
+        return Response(
+            "<CompleteMultipartUploadResult/>",
+            media_type="application/xml",
+        )
+
+    async def _put_part(self, upload_id: str, number: int, body: bytes) -> Response:
+        self.active_parts += 1
+        self.max_active_parts = max(self.max_active_parts, self.active_parts)
+        try:
+            # Parts take a while, so uploads overlap.
+            await asyncio.sleep(0.01)
+        finally:
+            self.active_parts -= 1
+        if number in self.failing_parts:
+            return Response(status_code=500)
+        self.uploads[upload_id][number] = body
+        etag = hashlib.md5(body).hexdigest()  # noqa: S324
+        return Response(headers={"ETag": f'"{etag}"'})
+
+    def _get(self, request: Request, key: str) -> Response:
+        content = self.objects.get(key)
+        if content is None:
+            return Response(status_code=404)
+        headers = {"Content-Length": str(len(content))}
+        if request.method == "HEAD":
+            return Response(headers=headers)
+        match = _RANGE.fullmatch(request.headers.get("range", ""))
+        if match is None:
+            return Response(content)
+        start = int(match[1])
+        if start >= len(content):
+            return Response(status_code=416)
+        end = min(int(match[2] or len(content)), len(content) - 1)
+        return Response(
+            content[start : end + 1],
+            status_code=206,
+            headers={"Content-Range": f"bytes {start}-{end}/{len(content)}"},
+        )
@@ -0,0 +1,87 @@
+from pathlib import Path
+
+import pytest
+from fastapi import FastAPI
+from fastapi_users.jwt import generate_jwt
+from httpx import AsyncClient
+from starlette import status
+
+from planet_diseases_backend.services.shared_cache import SharedCache
+from planet_diseases_backend.settings import settings
+from planet_diseases_backend.web.admission import (
+    ConcurrencyLimits,
+    SharedTokenBuckets,
+    TokenBuckets,
+)
+
+
+def _token(user_id: str) -> str:
+    return generate_jwt(
+        {"sub": user_id, "aud": ["fastapi-users:auth"]},
+        settings.users_secret,
+        lifetime_seconds=60,
+    )
+
+
+@pytest.mark.anyio
+async def test_rate_limit(
+    fastapi_app: FastAPI,
+    client: AsyncClient,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Tests that clients over their rate get 429 with Retry-After."""
+    monkeypatch.setattr(settings, "rate_limit_per_second", 0.1)
+    monkeypatch.setattr(settings, "rate_limit_burst", 2)
+    url = fastapi_app.url_path_for("send_echo_message")
+    first = {"Authorization": f"Bearer {_token('first')}"}
+
+    for _ in range(2):
+        response = await client.post(url, json={"message": "a"}, headers=first)
+        assert response.status_code == status.HTTP_200_OK
+
+    response = await client.post(url, json={"message": "a"}, headers=first)
+    assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+    assert response.headers["Retry-After"] == "10"
+
+    # Other users and health checks are not affected.
+    second = {"Authorization": f"Bearer {_token('second')}"}
+    response = await client.post(url, json={"message": "a"}, headers=second)
+    assert response.status_code == status.HTTP_200_OK
+    response = await client.get(fastapi_app.url_path_for("health_check"))
+    assert response.status_code == status.HTTP_200_OK
+
+
+def test_token_buckets_are_bounded() -> None:
+    """Tests that least recently used buckets are dropped."""
+    buckets = TokenBuckets(max_keys=2)
+    assert buckets.acquire("a", rate=0.001, burst=1) == 0
+    assert buckets.acquire("a", rate=0.001, burst=1) > 0
+    buckets.acquire("b", rate=0.001, burst=1)
+    buckets.acquire("c", rate=0.001, burst=1)
+
+    assert buckets.acquire("a", rate=0.001, burst=1) == 0
+
+
+def test_shared_token_buckets(tmp_path: Path) -> None:
+    """Tests that buckets in the shared cache are common for all workers."""
+    path = tmp_path / "cache.bin"
+    first = SharedTokenBuckets(SharedCache(path, slots=64, slot_size=256))
+    second = SharedTokenBuckets(SharedCache(path, slots=64, slot_size=256))
+
+    assert first.acquire("user:a", rate=0.1, burst=2) == 0
+    assert second.acquire("user:a", rate=0.1, burst=2) == 0
+    assert first.acquire("user:a", rate=0.1, burst=2) == pytest.approx(10, abs=0.1)
+    assert second.acquire("user:b", rate=0.1, burst=2) == 0
+
+
+def test_concurrency_limits() -> None:
+    """Tests that the longest matching prefix limits in-flight requests."""
+    limits = {"/api": 10, "/api/dummy": 1}
+    concurrency = ConcurrencyLimits()
+
+    assert concurrency.match("/api/dummy/1", limits) == "/api/dummy"
+    assert concurrency.match("/static/x", limits) is None
+    assert concurrency.acquire("/api/dummy", 1)
+    assert not concurrency.acquire("/api/dummy", 1)
+    concurrency.release("/api/dummy")
+    assert concurrency.acquire("/api/dummy", 1)
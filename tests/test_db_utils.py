@@ -0,0 +1,17 @@
+import pytest
+
+from planet_diseases_backend.db.utils import create_database, quote_database
+
+pytestmark = pytest.mark.anyio
+
+
+def test_database_names_are_quoted() -> None:
+    """Tests that plain identifiers are quoted."""
+    assert quote_database("app_test_gw0") == '"app_test_gw0"'
+
+
+@pytest.mark.parametrize("name", ["", 'a" TEMPLATE "b', "a;b", "0db", "a" * 64])
+async def test_invalid_database_names(name: str) -> None:
+    """Tests that other names never reach DDL statements."""
+    with pytest.raises(ValueError, match="Invalid database name"):
+        await create_database(name or "app", template=name)
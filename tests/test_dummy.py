@@ -3,10 +3,12 @@ import uuid
 import pytest
 from fastapi import FastAPI
 from httpx import AsyncClient
+from sqlalchemy import insert, text
 from sqlalchemy.ext.asyncio import AsyncSession
 from starlette import status
 
 from planet_diseases_backend.db.dao.dummy_dao import DummyDAO
+from planet_diseases_backend.db.models.dummy_model import DummyModel
 
 
 @pytest.mark.anyio
@@ -43,3 +45,60 @@ async def test_getting(
     assert response.status_code == status.HTTP_200_OK
     assert len(dummies) == 1
     assert dummies[0]["name"] == test_name
+
+
+@pytest.mark.anyio
+async def test_search(
+    fastapi_app: FastAPI,
+    client: AsyncClient,
+    dbsession: AsyncSession,
+) -> None:
+    """Tests substring and prefix search ranked by similarity."""
+    dao = DummyDAO(dbsession)
+    for name in ("tomato blight", "tomato", "potato", "late tomato rot", "100%_x"):
+        await dao.create_dummy_model(name=name)
+    await dbsession.flush()
+    url = fastapi_app.url_path_for("search_dummy_models")
+
+    response = await client.get(url, params={"q": "TOMATO"})
+    assert response.status_code == status.HTTP_200_OK
+    assert [dummy["name"] for dummy in response.json()] == [
+        "tomato",
+        "tomato blight",
+        "late tomato rot",
+    ]
+
+    response = await client.get(url, params={"q": "tomato", "prefix": True})
+    assert [dummy["name"] for dummy in response.json()] == ["tomato", "tomato blight"]
+
+    # LIKE wildcards in the query are matched literally.
+    response = await client.get(url, params={"q": "0%_"})
+    assert [dummy["name"] for dummy in response.json()] == ["100%_x"]
+
+    response = await client.get(url, params={"q": "to"})
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+@pytest.mark.anyio
+async def test_search_uses_trigram_index(dbsession: AsyncSession) -> None:
+    """Tests that search on a seeded table doesn't scan the whole table."""
+    await dbsession.execute(
+        insert(DummyModel),
+        [{"name": f"plant-{uuid.uuid4().hex}"} for _ in range(5000)],
+    )
+    # Fresh rows are in GIN pending list, which is costly to scan,
+    # autovacuum moves them to the index in production.
+    await dbsession.execute(
+        text("SELECT gin_clean_pending_list('ix_dummy_model_name_trgm')"),
+    )
+    await dbsession.execute(text("ANALYZE dummy_model"))
+
+    plan = await dbsession.execute(
+        text(
+            "EXPLAIN SELECT * FROM dummy_model WHERE name ILIKE :pattern "
+            "ORDER BY similarity(name, :query) DESC LIMIT 10",
+        ),
+        {"pattern": "%tomato%", "query": "tomato"},
+    )
+
+    assert "ix_dummy_model_name_trgm" in "\n".join(plan.scalars())
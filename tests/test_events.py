@@ -0,0 +1,92 @@
+import asyncio
+import uuid
+from typing import Any, AsyncGenerator, List, Tuple
+
+import pytest
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from planet_diseases_backend.db.models.usage_event import UsageEvent
+from planet_diseases_backend.services.events import EventRecorder
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def recorder(_engine: AsyncEngine) -> AsyncGenerator[EventRecorder, None]:
+    """
+    Event recorder with a small queue.
+
+    Events are committed by the recorder,
+    so they are deleted after the test.
+
+    :param _engine: current engine.
+    :yield: event recorder.
+    """
+    recorder = EventRecorder(_engine, queue_size=3, batch_size=2, flush_interval=0.05)
+    yield recorder
+    async with _engine.begin() as conn:
+        await conn.execute(delete(UsageEvent))
+
+
+async def _events(engine: AsyncEngine) -> List[Tuple[Any, ...]]:
+    async with engine.connect() as conn:
+        rows = await conn.execute(
+            select(UsageEvent.kind, UsageEvent.user_id, UsageEvent.payload).order_by(
+                UsageEvent.id,
+            ),
+        )
+        return [tuple(row) for row in rows]
+
+
+async def test_events_are_flushed_in_background(
+    recorder: EventRecorder,
+    _engine: AsyncEngine,
+) -> None:
+    """Tests that queued events are written by the background task."""
+    user_id = uuid.uuid4()
+    recorder.start()
+    assert recorder.record("login", user_id)
+    assert recorder.record("diagnosis", user_id, {"disease": "blight"})
+    assert recorder.record("login")
+
+    for _ in range(50):
+        if len(await _events(_engine)) == 3:
+            break
+        await asyncio.sleep(0.02)
+    await recorder.stop()
+
+    assert await _events(_engine) == [
+        ("login", user_id, None),
+        ("diagnosis", user_id, {"disease": "blight"}),
+        ("login", None, None),
+    ]
+
+
+async def test_queued_events_are_flushed_on_stop(
+    recorder: EventRecorder,
+    _engine: AsyncEngine,
+) -> None:
+    """Tests that stop writes queued events and overflow is dropped."""
+    for _ in range(3):
+        assert recorder.record("login")
+    assert not recorder.record("login")
+
+    await recorder.stop()
+
+    assert len(await _events(_engine)) == 3
+
+
+async def test_collected_batch_is_flushed_on_stop(_engine: AsyncEngine) -> None:
+    """Tests that events taken by the background task are written on stop."""
+    recorder = EventRecorder(_engine, queue_size=3, batch_size=2, flush_interval=60)
+    recorder.start()
+    recorder.record("login")
+    # Let the background task take the event and wait for more.
+    await asyncio.sleep(0.01)
+
+    await recorder.stop()
+
+    assert await _events(_engine) == [("login", None, None)]
+    async with _engine.begin() as conn:
+        await conn.execute(delete(UsageEvent))
@@ -0,0 +1,127 @@
+import asyncio
+from typing import List, Optional
+
+import pytest
+from fastapi import FastAPI
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from planet_diseases_backend.services.events import EventRecorder
+from planet_diseases_backend.services.health import (
+    HealthMonitor,
+    backlog_probe,
+    db_probe,
+)
+from planet_diseases_backend.web.lifetime import Lifecycle
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_liveness(client: AsyncClient) -> None:
+    """Tests that liveness doesn't depend on started services."""
+    assert (await client.get("/api/health/live")).status_code == 200
+
+
+async def test_readiness_uses_cached_probes(
+    client: AsyncClient,
+    fastapi_app: FastAPI,
+    _engine: AsyncEngine,
+) -> None:
+    """Tests that concurrent readiness checks share one run of probes."""
+    calls: List[int] = []
+
+    async def _probe() -> Optional[str]:
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return None
+
+    fastapi_app.state.health_monitor = HealthMonitor(
+        {"db": db_probe(_engine), "counted": _probe},
+        interval=60,
+        ttl=60,
+        timeout=1,
+    )
+
+    responses = await asyncio.gather(
+        *(client.get("/api/health/ready") for _ in range(10)),
+    )
+
+    assert [response.status_code for response in responses] == [200] * 10
+    assert calls == [1]
+    body = responses[0].json()
+    assert body["ready"]
+    assert body["probes"]["db"]["ok"]
+    assert body["probes"]["db"]["latency"] > 0
+
+
+async def test_failing_probes(client: AsyncClient, fastapi_app: FastAPI) -> None:
+    """Tests that failed and stuck probes make the worker not ready."""
+
+    async def _stuck() -> Optional[str]:
+        await asyncio.sleep(10)
+        return None
+
+    async def _broken() -> Optional[str]:
+        raise ConnectionError("Connection refused")
+
+    recorder = EventRecorder(None, queue_size=2, batch_size=1, flush_interval=1)  # type: ignore
+    recorder.record("login")
+    recorder.record("login")
+    fastapi_app.state.health_monitor = HealthMonitor(
+        {
+            "stuck": _stuck,
+            "broken": _broken,
+            "events": backlog_probe(recorder, 0.9),
+        },
+        interval=60,
+        ttl=60,
+        timeout=0.05,
+    )
+
+    response = await client.get("/api/health/ready")
+
+    assert response.status_code == 503
+    assert response.json()["status"] == "not ready"
+    probes = response.json()["probes"]
+    assert probes["stuck"]["detail"] == "Timed out after 0.05s"
+    assert probes["broken"]["detail"] == "Connection refused"
+    assert probes["events"]["detail"] == "Event queue is 100% full"
+
+
+async def test_background_refresh(fastapi_app: FastAPI) -> None:
+    """Tests that probes run in background until the monitor is stopped."""
+    calls: List[int] = []
+
+    async def _probe() -> Optional[str]:
+        calls.append(1)
+        return None
+
+    monitor = HealthMonitor({"counted": _probe}, interval=0.01, ttl=60, timeout=1)
+    monitor.start()
+    await asyncio.sleep(0.05)
+    await monitor.stop()
+    stopped = len(calls)
+    await asyncio.sleep(0.03)
+
+    assert stopped > 2
+    assert len(calls) == stopped
+
+
+async def test_not_ready_while_starting_or_draining(
+    client: AsyncClient,
+    fastapi_app: FastAPI,
+) -> None:
+    """Tests readiness before startup and after draining starts."""
+    starting = await client.get("/api/health/ready")
+    lifecycle = Lifecycle()
+    await lifecycle.start()
+    await lifecycle.drain()
+    fastapi_app.state.lifecycle = lifecycle
+    fastapi_app.state.health_monitor = HealthMonitor({}, 60, 60, 1)
+
+    draining = await client.get("/api/health/ready")
+
+    assert starting.status_code == draining.status_code == 503
+    assert starting.json()["status"] == "starting"
+    assert draining.json()["status"] == "draining"
+    await lifecycle.stop(timeout=1)
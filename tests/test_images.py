@@ -0,0 +1,192 @@
+import hashlib
+import io
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import AsyncGenerator, AsyncIterator
+
+import pytest
+from fastapi import FastAPI
+from httpx import AsyncClient
+from PIL import Image
+
+from planet_diseases_backend.db.models.users import User, current_active_user
+from planet_diseases_backend.services.image_store import ORIGINAL, ImageStore
+from planet_diseases_backend.services.storage import LocalStorage, Storage
+from planet_diseases_backend.settings import settings
+from tests.fake_s3 import FakeS3
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture(params=["local", "s3"])
+async def store(
+    request: pytest.FixtureRequest,
+    fastapi_app: FastAPI,
+    tmp_path: Path,
+) -> AsyncGenerator[ImageStore, None]:
+    """
+    Image store in the storage of every backend.
+
+    :param request: pytest request.
+    :param fastapi_app: current application.
+    :param tmp_path: temporary directory.
+    :yield: image store used by the application.
+    """
+    storage: Storage = (
+        LocalStorage(tmp_path / "storage")
+        if request.param == "local"
+        else FakeS3().storage()
+    )
+    executor = ThreadPoolExecutor(max_workers=2)
+    fastapi_app.state.image_store = ImageStore(
+        storage,
+        tmp_path / "incoming",
+        executor,
+    )
+    fastapi_app.dependency_overrides[current_active_user] = lambda: User(
+        id=uuid.uuid4(),
+        email="uploader@example.com",
+    )
+    yield fastapi_app.state.image_store
+    executor.shutdown()
+    await storage.close()
+
+
+def _png(width: int, height: int) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), "green").save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+async def _read(store: ImageStore, digest: str, variant: str = ORIGINAL) -> bytes:
+    return b"".join([chunk async for chunk in store.read(digest, variant)])
+
+
+async def _is_stored(store: ImageStore, content: bytes) -> bool:
+    try:
+        await store.size(hashlib.sha256(content).hexdigest())
+    except KeyError:
+        return False
+    return True
+
+
+async def test_upload_is_deduplicated(client: AsyncClient, store: ImageStore) -> None:
+    """Tests that an image is stored once with its derivatives."""
+    content = _png(800, 600)
+
+    first = await client.post("/api/images/", content=content)
+    second = await client.post("/api/images/", content=content)
+
+    assert first.status_code == second.status_code == 201
+    digest = first.json()["digest"]
+    assert first.json()["created"]
+    assert not second.json()["created"]
+    assert second.json()["digest"] == digest
+    assert second.json()["urls"]["thumbnail"].endswith(f"/media/thumbnail/{digest}")
+    key = store.key(digest)
+    assert key == f"images/originals/{digest[:2]}/{digest[2:4]}/{digest}"
+    assert await _read(store, digest) == content
+    thumbnail = await _read(store, digest, "thumbnail")
+    with Image.open(io.BytesIO(thumbnail)) as image:
+        assert image.size == (256, 192)
+    model_input = await _read(store, digest, "model")
+    with Image.open(io.BytesIO(model_input)) as image:
+        assert image.size == (224, 224)
+    assert not any(store.incoming.iterdir())
+
+
+async def test_invalid_uploads_are_rejected(
+    client: AsyncClient,
+    store: ImageStore,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Tests that only images within the size limit are stored."""
+    content = _png(100, 100)
+
+    async def body() -> AsyncIterator[bytes]:
+        for start in range(0, len(content), 64):
+            yield content[start : start + 64]
+
+    not_image = await client.post("/api/images/", content=b"text")
+    monkeypatch.setattr(settings, "image_max_bytes", 100)
+    too_large = await client.post("/api/images/", content=content)
+    streamed = await client.post("/api/images/", content=body())
+
+    assert not_image.status_code == 422
+    assert too_large.status_code == streamed.status_code == 413
+    assert "content-length" not in streamed.request.headers
+    assert not await _is_stored(store, b"text")
+    assert not await _is_stored(store, content)
+    assert not any(store.incoming.iterdir())
+
+
+async def test_truncated_upload_is_rejected(
+    client: AsyncClient,
+    store: ImageStore,
+) -> None:
+    """Tests that an image with missing pixel data is not stored."""
+    buffer = io.BytesIO()
+    Image.effect_noise((400, 300), 64).convert("RGB").save(buffer, "JPEG")
+    truncated = buffer.getvalue()[: buffer.tell() // 2]
+
+    first = await client.post("/api/images/", content=truncated)
+    second = await client.post("/api/images/", content=truncated)
+
+    assert first.status_code == second.status_code == 422
+    assert not await _is_stored(store, truncated)
+    assert not any(store.incoming.iterdir())
+
+
+async def test_missing_derivatives_are_regenerated(
+    client: AsyncClient,
+    store: ImageStore,
+) -> None:
+    """Tests that uploading a stored image restores its derivatives."""
+    content = _png(800, 600)
+    digest = (await client.post("/api/images/", content=content)).json()["digest"]
+    await store.storage.delete(store.key(digest, "thumbnail"))
+
+    response = await client.post("/api/images/", content=content)
+
+    assert response.status_code == 201
+    assert not response.json()["created"]
+    thumbnail = await _read(store, digest, "thumbnail")
+    with Image.open(io.BytesIO(thumbnail)) as image:
+        assert image.size == (256, 192)
+
+
+async def test_media_ranges_and_etags(client: AsyncClient, store: ImageStore) -> None:
+    """Tests conditional and range requests of stored images."""
+    content = _png(64, 64)
+    upload = await client.post("/api/images/", content=content)
+    url = f"/media/originals/{upload.json()['digest']}"
+
+    full = await client.get(url)
+    etag = full.headers["etag"]
+    not_modified = await client.get(url, headers={"If-None-Match": etag})
+    head = await client.get(url, headers={"Range": "bytes=0-9"})
+    tail = await client.get(url, headers={"Range": "bytes=-5"})
+    stale = await client.get(url, headers={"Range": "bytes=0-9", "If-Range": '"x"'})
+    unsatisfiable = await client.get(url, headers={"Range": "bytes=100000-"})
+
+    assert full.status_code == 200
+    assert full.content == content
+    assert full.headers["content-type"] == "image/png"
+    assert not_modified.status_code == 304
+    assert head.status_code == 206
+    assert head.content == content[:10]
+    assert head.headers["content-range"] == f"bytes 0-9/{len(content)}"
+    assert tail.content == content[-5:]
+    assert stale.status_code == 200
+    assert unsatisfiable.status_code == 416
+    assert unsatisfiable.headers["content-range"] == f"bytes */{len(content)}"
+
+
+async def test_unknown_media(client: AsyncClient, store: ImageStore) -> None:
+    """Tests that unknown digests and variants are not found."""
+    digest = "0" * 64
+
+    assert (await client.get(f"/media/originals/{digest}")).status_code == 404
+    assert (await client.get("/media/originals/..")).status_code == 404
+    assert (await client.get(f"/media/other/{digest}")).status_code == 404
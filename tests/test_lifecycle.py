@@ -0,0 +1,122 @@
+import asyncio
+from typing import List
+
+import pytest
+from fastapi import FastAPI
+from httpx import AsyncClient
+from prometheus_client import REGISTRY
+
+from planet_diseases_backend.web.lifetime import Lifecycle, drain_all
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_subsystems_are_ordered() -> None:
+    """Tests that subsystems stop in reverse order of their start."""
+    calls: List[str] = []
+    lifecycle = Lifecycle()
+
+    async def _stop_queue() -> None:
+        await asyncio.sleep(0)
+        calls.append("stop queue")
+
+    lifecycle.register(
+        "queue",
+        lambda: calls.append("start queue"),
+        stop=_stop_queue,
+        drain=lambda: calls.append("drain queue"),
+        priority=10,
+    )
+    lifecycle.register(
+        "db",
+        lambda: calls.append("start db"),
+        stop=lambda: calls.append("stop db"),
+    )
+
+    await lifecycle.start()
+    await lifecycle.stop(timeout=1)
+
+    assert calls == [
+        "start db",
+        "start queue",
+        "drain queue",
+        "stop queue",
+        "stop db",
+    ]
+
+
+async def test_failed_start_stops_started() -> None:
+    """Tests that only subsystems started before a failure are stopped."""
+    calls: List[str] = []
+    lifecycle = Lifecycle()
+
+    def _fail() -> None:
+        raise RuntimeError("no broker")
+
+    lifecycle.register("db", lambda: None, stop=lambda: calls.append("stop db"))
+    lifecycle.register(
+        "cache",
+        lambda: None,
+        stop=lambda: calls.append("stop cache"),
+        priority=1,
+    )
+    lifecycle.register(
+        "queue",
+        _fail,
+        stop=lambda: calls.append("stop queue"),
+        priority=2,
+    )
+    lifecycle.register(
+        "stats",
+        lambda: calls.append("start stats"),
+        stop=lambda: calls.append("stop stats"),
+        priority=3,
+    )
+
+    with pytest.raises(RuntimeError):
+        await lifecycle.start()
+    await lifecycle.stop(timeout=1)
+
+    assert calls == ["stop cache", "stop db"]
+
+
+async def test_stop_has_deadline() -> None:
+    """Tests that a stuck subsystem doesn't prevent others from stopping."""
+    stopped: List[str] = []
+    lifecycle = Lifecycle()
+    lifecycle.register("db", lambda: None, stop=lambda: stopped.append("db"))
+    lifecycle.register("stuck", lambda: None, stop=asyncio.Event().wait, priority=1)
+    before = REGISTRY.get_sample_value(
+        "worker_shutdown_duration_seconds_count",
+        {"subsystem": "stuck"},
+    )
+
+    await lifecycle.start()
+    await lifecycle.stop(timeout=0.05)
+
+    assert stopped == ["db"]
+    after = REGISTRY.get_sample_value(
+        "worker_shutdown_duration_seconds_count",
+        {"subsystem": "stuck"},
+    )
+    assert after == (before or 0) + 1
+
+
+async def test_readiness_fails_while_draining(
+    client: AsyncClient,
+    fastapi_app: FastAPI,
+) -> None:
+    """Tests that health check fails once the worker starts draining."""
+    drained: List[str] = []
+    lifecycle = Lifecycle()
+    lifecycle.register("streams", lambda: None, drain=lambda: drained.append("x"))
+    await lifecycle.start()
+    fastapi_app.state.lifecycle = lifecycle
+
+    assert (await client.get("/api/health")).status_code == 200
+    await drain_all()
+    await drain_all()
+
+    assert (await client.get("/api/health")).status_code == 503
+    assert drained == ["x"]
+    await lifecycle.stop(timeout=1)
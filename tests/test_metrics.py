@@ -0,0 +1,92 @@
+import gzip
+from pathlib import Path
+from typing import Any, Dict, Tuple
+
+import pytest
+from prometheus_client import CollectorRegistry, Counter
+from prometheus_client.mmap_dict import MmapedDict, mmap_key
+from prometheus_client.multiprocess import MultiProcessCollector
+
+from planet_diseases_backend.metrics import compact_dead_process
+from planet_diseases_backend.web.metrics import ExpositionCache
+
+
+def _write(path: Path, values: Dict[Tuple[str, str], float]) -> None:
+    mmaped = MmapedDict(str(path))
+    for (name, label), value in values.items():
+        key = mmap_key("requests", name, ["handler"], [label], "Requests.")
+        mmaped.write_value(key, value, 0)
+    mmaped.close()
+
+
+def _collect(directory: Path) -> Dict[Tuple[str, str], float]:
+    registry = CollectorRegistry()
+    MultiProcessCollector(registry, path=str(directory))
+    return {
+        (sample.name, str(sample.labels.get("handler"))): sample.value
+        for metric in registry.collect()
+        for sample in metric.samples
+    }
+
+
+def test_compact_dead_process(tmp_path: Path) -> None:
+    """Tests that compaction removes files of dead workers and keeps totals."""
+    _write(tmp_path / "counter_1.db", {("requests_total", "/a"): 1})
+    _write(tmp_path / "counter_2.db", {("requests_total", "/a"): 2})
+    _write(
+        tmp_path / "counter_3.db",
+        {("requests_total", "/a"): 4, ("requests_total", "/b"): 8},
+    )
+    expected = _collect(tmp_path)
+
+    assert compact_dead_process(1, tmp_path) == 1
+    assert compact_dead_process(2, tmp_path) == 1
+    assert compact_dead_process(2, tmp_path) == 0
+
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        "counter_3.db",
+        "counter_archive.db",
+    ]
+    assert _collect(tmp_path) == expected
+    assert expected[("requests_total", "/a")] == 7
+
+
+def test_compaction_never_counts_twice(
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Tests that scrapes during compaction never see inflated totals."""
+    _write(tmp_path / "counter_1.db", {("requests_total", "/a"): 1})
+    _write(tmp_path / "counter_2.db", {("requests_total", "/a"): 2})
+    expected = _collect(tmp_path)
+    scraped = []
+    replace = Path.replace
+
+    def _replace(path: Path, target: Any) -> Path:
+        result = replace(path, target)
+        scraped.append(_collect(tmp_path).get(("requests_total", "/a"), 0))
+        return result
+
+    monkeypatch.setattr(Path, "replace", _replace)
+
+    compact_dead_process(1, tmp_path)
+
+    assert scraped
+    assert max(scraped) <= expected[("requests_total", "/a")]
+    assert _collect(tmp_path) == expected
+
+
+def test_exposition_cache() -> None:
+    """Tests that rendered metrics are reused until they expire."""
+    registry = CollectorRegistry()
+    counter = Counter("scraped", "Test counter.", registry=registry)
+    cache = ExpositionCache(ttl=60, registry=registry)
+
+    first = cache.get(gzipped=False)
+    counter.inc()
+
+    assert cache.get(gzipped=False) == first
+    assert gzip.decompress(cache.get(gzipped=True)) == first
+
+    cache.ttl = 0
+    assert b"scraped_total 1.0" in cache.get(gzipped=False)
@@ -0,0 +1,171 @@
+import asyncio
+from datetime import date, datetime, timezone
+
+import pytest
+from sqlalchemy import func, insert, select, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+from planet_diseases_backend.db.models.usage_event import UsageEvent
+from planet_diseases_backend.db.partitions import (
+    PartitionMaintainer,
+    add_months,
+    create_partition,
+    is_partition,
+    list_partitions,
+    maintain_partitions,
+    month_start,
+    partition_name,
+)
+from planet_diseases_backend.settings import settings
+
+pytestmark = pytest.mark.anyio
+
+_EXPIRED = date(2020, 1, 1)
+
+
+def test_add_months() -> None:
+    """Tests shifting months across years."""
+    assert add_months(date(2026, 11, 1), 2) == date(2027, 1, 1)
+    assert add_months(date(2026, 1, 1), -1) == date(2025, 12, 1)
+    assert add_months(date(2026, 5, 1), -24) == date(2024, 5, 1)
+
+
+def test_is_partition() -> None:
+    """Tests that only partitions of maintained tables are recognized."""
+    assert is_partition("usage_event_p202610")
+    assert not is_partition("usage_event")
+    assert not is_partition("dummy_model_p202610")
+
+
+async def test_upcoming_partitions_are_created(_engine: AsyncEngine) -> None:
+    """Tests that partitions exist for the current and upcoming months."""
+    current = month_start(datetime.now(timezone.utc))
+    async with _engine.connect() as conn:
+        partitions = await list_partitions(conn, "usage_event")
+
+    for offset in range(settings.partitions_premake_months + 1):
+        assert add_months(current, offset) in partitions
+
+
+@pytest.mark.parametrize("detach_only", [False, True])
+async def test_expired_partitions_are_removed(
+    _engine: AsyncEngine,
+    monkeypatch: pytest.MonkeyPatch,
+    detach_only: bool,
+) -> None:
+    """Tests that partitions older than the retention period are removed."""
+    monkeypatch.setattr(settings, "partitions_detach_only", detach_only)
+    async with _engine.begin() as conn:
+        await create_partition(conn, "usage_event", _EXPIRED)
+        await conn.execute(
+            insert(UsageEvent).values(
+                kind="login",
+                created_at=datetime(2020, 1, 15, tzinfo=timezone.utc),
+            ),
+        )
+
+    await maintain_partitions(_engine)
+
+    async with _engine.begin() as conn:
+        assert _EXPIRED not in await list_partitions(conn, "usage_event")
+        table = await conn.execute(text("SELECT to_regclass('usage_event_p202001')"))
+        if not detach_only:
+            assert table.scalar() is None
+            return
+        # Detached partition is kept as a plain table with its rows.
+        rows = await conn.execute(text("SELECT count(*) FROM usage_event_p202001"))
+        assert rows.scalar() == 1
+        await conn.execute(text("DROP TABLE usage_event_p202001"))
+
+
+async def test_interrupted_detach_is_finalized(_engine: AsyncEngine) -> None:
+    """Tests that a partition left detach pending is removed."""
+    async with _engine.begin() as conn:
+        await create_partition(conn, "usage_event", _EXPIRED)
+    autocommit = _engine.execution_options(isolation_level="AUTOCOMMIT")
+    async with _engine.connect() as reader, autocommit.connect() as conn:
+        # Concurrent detach waits for transactions that use the table.
+        await reader.execute(select(func.count()).select_from(UsageEvent))
+        await conn.execute(text("SET statement_timeout = '200ms'"))
+        try:
+            with pytest.raises(DBAPIError, match="statement timeout"):
+                await conn.execute(
+                    text(
+                        "ALTER TABLE usage_event "
+                        "DETACH PARTITION usage_event_p202001 CONCURRENTLY",
+                    ),
+                )
+        finally:
+            await conn.execute(text("RESET statement_timeout"))
+        await reader.rollback()
+        assert (await list_partitions(conn, "usage_event"))[_EXPIRED].detach_pending
+
+    await maintain_partitions(_engine)
+
+    async with _engine.connect() as conn:
+        assert _EXPIRED not in await list_partitions(conn, "usage_event")
+        table = await conn.execute(text("SELECT to_regclass('usage_event_p202001')"))
+        assert table.scalar() is None
+
+
+async def test_maintenance_is_exclusive(_engine: AsyncEngine) -> None:
+    """Tests that maintenance is skipped while another process runs it."""
+    async with _engine.connect() as conn:
+        await conn.execute(text("SELECT pg_advisory_lock(hashtext('partitions'))"))
+        assert not await maintain_partitions(_engine)
+        await conn.execute(text("SELECT pg_advisory_unlock(hashtext('partitions'))"))
+
+    assert await maintain_partitions(_engine)
+
+
+async def test_maintainer_creates_partitions(_engine: AsyncEngine) -> None:
+    """Tests that workers create missing partitions in background."""
+    last = add_months(
+        month_start(datetime.now(timezone.utc)),
+        settings.partitions_premake_months,
+    )
+    async with _engine.begin() as conn:
+        await conn.execute(text(f"DROP TABLE {partition_name('usage_event', last)}"))
+    maintainer = PartitionMaintainer(_engine, interval=60)
+
+    maintainer.start()
+    try:
+        for _ in range(100):
+            async with _engine.connect() as conn:
+                if last in await list_partitions(conn, "usage_event"):
+                    break
+            await asyncio.sleep(0.05)
+    finally:
+        await maintainer.stop()
+
+    async with _engine.connect() as conn:
+        assert last in await list_partitions(conn, "usage_event")
+
+
+async def test_partitions_are_pruned(dbsession: AsyncSession) -> None:
+    """Tests that a query bounded by created_at scans only matching partitions."""
+    conn = await dbsession.connection()
+    await create_partition(conn, "usage_event", _EXPIRED)
+    since = datetime.combine(
+        month_start(datetime.now(timezone.utc)),
+        datetime.min.time(),
+        timezone.utc,
+    )
+    query = (
+        select(UsageEvent.kind, func.count())
+        .where(UsageEvent.created_at >= since)
+        .group_by(UsageEvent.kind)
+    )
+    compiled = query.compile(
+        dialect=postgresql.dialect(),
+        compile_kwargs={"literal_binds": True},
+    )
+
+    plan = "\n".join(
+        (await conn.execute(text(f"EXPLAIN {compiled}"))).scalars(),
+    )
+
+    assert "usage_event_p202001" not in plan
+    assert f"usage_event_p{since:%Y%m}" in plan
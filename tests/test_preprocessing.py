@@ -0,0 +1,91 @@
+from typing import List
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from planet_diseases_backend.services.preprocessing import BufferPool, Preprocessor
+
+MEAN = (0.485, 0.456, 0.406)
+STD = (0.229, 0.224, 0.225)
+
+
+@pytest.fixture
+def preprocessor() -> Preprocessor:
+    """
+    Preprocessor of small images.
+
+    :return: preprocessor.
+    """
+    return Preprocessor(size=8, mean=MEAN, std=STD, batch_size=4, pool_size=1)
+
+
+def _images(count: int, size: int = 8) -> List[Image.Image]:
+    rng = np.random.default_rng(count)
+    return [
+        Image.fromarray(rng.integers(0, 256, (size, size, 3), dtype=np.uint8))
+        for _ in range(count)
+    ]
+
+
+def test_batch_is_normalized(preprocessor: Preprocessor) -> None:
+    """Tests that the batch matches images normalized one by one."""
+    images = _images(3)
+
+    with preprocessor.batch(images) as tensor:
+        result = tensor.copy()
+
+    expected = np.stack(
+        [
+            ((np.asarray(image) / 255 - MEAN) / STD).transpose(2, 0, 1)
+            for image in images
+        ],
+    )
+    assert result.dtype == np.float32
+    assert result.shape == (3, 3, 8, 8)
+    np.testing.assert_allclose(result, expected, atol=1e-5)
+
+
+def test_images_are_resized(preprocessor: Preprocessor) -> None:
+    """Tests that images of other sizes and modes are cropped to the input size."""
+    images = [Image.new("L", (20, 12), 255), Image.new("RGB", (8, 8), (0, 0, 0))]
+
+    with preprocessor.batch(images) as tensor:
+        np.testing.assert_allclose(
+            tensor[:, :, 0, 0],
+            [
+                [(1 - mean) / std for mean, std in zip(MEAN, STD)],
+                [-mean / std for mean, std in zip(MEAN, STD)],
+            ],
+            rtol=1e-5,
+        )
+
+
+def test_buffers_are_reused(preprocessor: Preprocessor) -> None:
+    """Tests that consecutive batches share the pooled buffer."""
+    with preprocessor.batch(_images(4)) as first:
+        first_buffer = first.base
+    with preprocessor.batch(_images(2)) as second:
+        second_buffer = second.base
+
+    assert second_buffer is first_buffer
+    assert preprocessor.pool.created == 1
+
+
+def test_large_batch_is_rejected(preprocessor: Preprocessor) -> None:
+    """Tests that batches larger than the buffers are rejected."""
+    with pytest.raises(ValueError, match="exceeds 4"), preprocessor.batch(_images(5)):
+        pass
+
+
+def test_pool_keeps_limited_buffers() -> None:
+    """Tests that buffers are created on demand and only some are kept."""
+    pool = BufferPool(object, size=1)
+
+    with pool.acquire() as first, pool.acquire() as second:
+        assert first is not second
+    with pool.acquire() as third:
+        pass
+
+    assert pool.created == 2
+    assert third is second
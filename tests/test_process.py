@@ -0,0 +1,28 @@
+import pytest
+
+from planet_diseases_backend import process
+
+
+def test_auto_workers_count(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Tests that workers count fits both CPUs and memory."""
+    monkeypatch.setattr(process, "available_cpus", lambda: 8)
+    monkeypatch.setattr(process, "memory_limit", lambda: 2 * 2**30)
+
+    assert process.auto_workers_count(512 * 2**20) == 4
+    assert process.auto_workers_count(128 * 2**20) == 8
+    assert process.auto_workers_count(4 * 2**30) == 1
+
+
+def test_memory_usage() -> None:
+    """Tests that memory usage of the current process is reported."""
+    resident, shared = process.get_memory_usage()
+    assert resident > 0
+    assert 0 <= shared <= resident
+
+
+def test_worker_rss_limit() -> None:
+    """Tests that jitter can't take more than half of the RSS limit."""
+    assert process.worker_rss_limit(512, 0) == 512 * 2**20
+    assert 256 * 2**20 <= process.worker_rss_limit(512, 100) <= 512 * 2**20
+    for _ in range(100):
+        assert process.worker_rss_limit(512, 1024) >= 256 * 2**20
@@ -0,0 +1,87 @@
+from typing import Iterator, List
+
+import pytest
+from loguru import logger
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from planet_diseases_backend.db.instrumentation import (
+    parameters_shape,
+    report_repeated_queries,
+)
+from planet_diseases_backend.db.models.dummy_model import DummyModel
+from planet_diseases_backend.request_stats import (
+    RequestStats,
+    bind_request_stats,
+    reset_request_stats,
+)
+from planet_diseases_backend.settings import settings
+
+
+@pytest.fixture
+def logs() -> Iterator[List[str]]:
+    """
+    Collects log messages.
+
+    :yield: list of logged messages.
+    """
+    messages: List[str] = []
+    handler_id = logger.add(messages.append, format="{message}")
+    yield messages
+    logger.remove(handler_id)
+
+
+def test_parameters_shape() -> None:
+    """Tests that parameters are described without values."""
+    assert parameters_shape(("secret", 1, None)) == ["str", "int", "NoneType"]
+    assert parameters_shape({"name": "secret"}) == {"name": "str"}
+    assert parameters_shape([("a", 1)] * 10) == [["str", "int"], "... 10 rows"]
+
+
+@pytest.mark.anyio
+async def test_repeated_queries(
+    dbsession: AsyncSession,
+    logs: List[str],
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Tests that the same statement executed many times is reported."""
+    monkeypatch.setattr(settings, "db_repeated_query_threshold", 3)
+    stats = RequestStats()
+    token = bind_request_stats(stats)
+    try:
+        for dummy_id in range(4):
+            await dbsession.execute(
+                select(DummyModel).where(DummyModel.id == dummy_id),
+            )
+    finally:
+        reset_request_stats(token)
+
+    assert stats.repeated_queries(3) == [
+        (
+            "SELECT dummy_model.id, dummy_model.name, dummy_model.change_seq "
+            "FROM dummy_model "
+            "WHERE dummy_model.id = ?::INTEGER",
+            4,
+        ),
+    ]
+    report_repeated_queries(stats, "/test")
+    assert any("Possible N+1 in /test" in message for message in logs)
+
+
+@pytest.mark.anyio
+async def test_slow_query_plan(
+    dbsession: AsyncSession,
+    logs: List[str],
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Tests that slow queries are logged with their plans."""
+    monkeypatch.setattr(settings, "db_slow_query_ms", 1e-6)
+    monkeypatch.setattr(settings, "db_explain_slow_queries", True)
+    await dbsession.execute(select(DummyModel).where(DummyModel.name == "secret"))
+
+    slow_queries = [message for message in logs if "Slow query" in message]
+    assert slow_queries
+    assert "secret" not in slow_queries[0]
+    assert any("Scan" in message and "on dummy_model" in message for message in logs)
+    # Transaction of the session must stay usable.
+    await dbsession.execute(select(DummyModel))
@@ -0,0 +1,65 @@
+from typing import Iterator, List
+
+import pytest
+from loguru import logger
+from sqlalchemy import func, select
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from starlette.requests import Request
+
+from planet_diseases_backend.db.dependencies import (
+    check_identity_map,
+    readonly_sessionmaker,
+)
+from planet_diseases_backend.db.models.dummy_model import DummyModel
+from planet_diseases_backend.settings import settings
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def logs() -> Iterator[List[str]]:
+    """
+    Collects warnings.
+
+    Statements are logged at INFO level the first time a process
+    runs them, so only warnings are collected.
+
+    :yield: list of logged warnings.
+    """
+    messages: List[str] = []
+    handler_id = logger.add(messages.append, format="{message}", level="WARNING")
+    yield messages
+    logger.remove(handler_id)
+
+
+async def test_readonly_session(_engine: AsyncEngine) -> None:
+    """Tests that read-only sessions don't flush and can't write."""
+    async with readonly_sessionmaker(_engine)() as session:
+        session.add(DummyModel(name="pending"))
+        count = await session.scalar(select(func.count()).select_from(DummyModel))
+        assert count == 0
+
+        with pytest.raises(DBAPIError, match="read-only transaction"):
+            await session.flush()
+
+
+async def test_identity_map_limit(
+    dbsession: AsyncSession,
+    logs: List[str],
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Tests that sessions tracking many objects are reported."""
+    monkeypatch.setattr(settings, "db_identity_map_limit", 2)
+    request = Request({"type": "http", "method": "GET", "path": "/big", "headers": []})
+    dbsession.add_all([DummyModel(name="first"), DummyModel(name="second")])
+    await dbsession.flush()
+    dbsession.expunge_all()
+
+    check_identity_map(request, dbsession)
+    # Loaded objects are counted even when they are released.
+    await dbsession.execute(select(DummyModel))
+    check_identity_map(request, dbsession)
+
+    assert len(logs) == 1
+    assert "GET /big tracked 4 objects" in logs[0]
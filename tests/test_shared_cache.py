@@ -0,0 +1,110 @@
+import multiprocessing
+import os
+import struct
+import time
+from pathlib import Path
+from typing import Optional
+
+import pytest
+
+from planet_diseases_backend.services.shared_cache import FILE_HEADER_SIZE, SharedCache
+
+
+def _write_in_child(path: Path) -> None:
+    cache = SharedCache(path, slots=64, slot_size=256)
+    cache.set_json("from-child", {"count": 42}, ttl=60)
+    cache.close()
+
+
+@pytest.fixture
+def cache(tmp_path: Path) -> SharedCache:
+    """
+    Small cache in a temporary directory.
+
+    :param tmp_path: temporary directory.
+    :return: shared cache.
+    """
+    return SharedCache(tmp_path / "cache.bin", slots=64, slot_size=256)
+
+
+def test_set_get(cache: SharedCache) -> None:
+    """Tests that stored values can be read back."""
+    assert cache.get("missing") is None
+    assert cache.set("key", b"value", ttl=60)
+    assert cache.get("key") == b"value"
+
+    cache.set("key", b"other", ttl=60)
+    assert cache.get("key") == b"other"
+
+    cache.delete("key")
+    assert cache.get("key") is None
+
+
+def test_update(cache: SharedCache) -> None:
+    """Tests that values are replaced with a function of the current value."""
+
+    def _increment(current: Optional[bytes]) -> bytes:
+        return str(int(current or b"0") + 1).encode()
+
+    assert cache.update("counter", _increment, ttl=60)
+    assert cache.update("counter", _increment, ttl=60)
+    assert cache.get("counter") == b"2"
+    assert not cache.update("counter", lambda _: b"x" * 1024, ttl=60)
+    assert cache.get("counter") == b"2"
+
+
+def test_expiration(cache: SharedCache, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Tests that expired values are not returned."""
+    cache.set("key", b"value", ttl=10)
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 11)
+    assert cache.get("key") is None
+
+
+def test_too_large_value(cache: SharedCache) -> None:
+    """Tests that values bigger than a slot are rejected."""
+    assert not cache.set("key", b"x" * (cache.capacity + 1), ttl=60)
+    assert cache.get("key") is None
+
+
+def test_recovers_from_dead_writer(tmp_path: Path) -> None:
+    """Tests that slots left mid-write by a dead process are writable again."""
+    path = tmp_path / "cache.bin"
+    cache = SharedCache(path, slots=2, slot_size=64, probes=2)
+    with path.open("r+b") as file:
+        for index in range(cache.slots):
+            os.pwrite(
+                file.fileno(),
+                struct.pack("<Q", 7),
+                FILE_HEADER_SIZE + index * cache.slot_size,
+            )
+
+    assert cache.set("key", b"value", ttl=60)
+    assert cache.get("key") == b"value"
+
+
+def test_eviction(tmp_path: Path) -> None:
+    """Tests that the value which expires first is evicted from busy slots."""
+    cache = SharedCache(tmp_path / "cache.bin", slots=2, slot_size=64, probes=2)
+    cache.set("first", b"1", ttl=10)
+    cache.set("second", b"2", ttl=100)
+    cache.set("third", b"3", ttl=100)
+
+    assert cache.get("first") is None
+    assert cache.get("second") == b"2"
+    assert cache.get("third") == b"3"
+
+
+def test_shared_between_processes(tmp_path: Path) -> None:
+    """Tests that values written by another process are visible."""
+    path = tmp_path / "cache.bin"
+    cache = SharedCache(path, slots=64, slot_size=256)
+
+    process = multiprocessing.get_context("fork").Process(
+        target=_write_in_child,
+        args=(path,),
+    )
+    process.start()
+    process.join()
+
+    assert cache.get_json("from-child") == {"count": 42}
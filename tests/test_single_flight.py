@@ -0,0 +1,116 @@
+import asyncio
+from typing import List
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker
+
+from planet_diseases_backend.db.dao.dummy_dao import DummyDAO
+from planet_diseases_backend.services.single_flight import SingleFlight
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_concurrent_calls_are_coalesced() -> None:
+    """Tests that concurrent calls with the same key run the function once."""
+    flight = SingleFlight("test", max_keys=10)
+    calls: List[int] = []
+
+    async def _load(value: int) -> int:
+        calls.append(value)
+        await asyncio.sleep(0.01)
+        return value
+
+    results = await asyncio.gather(
+        *(flight.do("a", lambda: _load(1)) for _ in range(5)),
+        flight.do("b", lambda: _load(2)),
+    )
+
+    assert results == [1, 1, 1, 1, 1, 2]
+    assert calls == [1, 2]
+    assert await flight.do("a", lambda: _load(3)) == 3
+
+
+async def test_errors_are_shared() -> None:
+    """Tests that waiting callers get the exception of the call."""
+    flight = SingleFlight("test", max_keys=10)
+
+    async def _fail() -> None:
+        await asyncio.sleep(0.01)
+        raise ValueError("failed")
+
+    results = await asyncio.gather(
+        flight.do("a", _fail),
+        flight.do("a", _fail),
+        return_exceptions=True,
+    )
+
+    assert [str(result) for result in results] == ["failed", "failed"]
+
+
+async def test_cancelled_call_is_retried() -> None:
+    """Tests that waiting callers run the function if the first one is cancelled."""
+    flight = SingleFlight("test", max_keys=10)
+
+    async def _load() -> str:
+        await asyncio.sleep(0.01)
+        return "loaded"
+
+    first = asyncio.ensure_future(flight.do("a", _load))
+    await asyncio.sleep(0)
+    second = asyncio.ensure_future(flight.do("a", _load))
+    await asyncio.sleep(0)
+    first.cancel()
+
+    assert await second == "loaded"
+    with pytest.raises(asyncio.CancelledError):
+        await first
+
+
+async def test_keys_are_bounded() -> None:
+    """Tests that calls over max_keys are not tracked."""
+    flight = SingleFlight("test", max_keys=1)
+    calls: List[str] = []
+
+    async def _load(key: str) -> str:
+        calls.append(key)
+        await asyncio.sleep(0.01)
+        return key
+
+    await asyncio.gather(
+        flight.do("a", lambda: _load("a")),
+        flight.do("b", lambda: _load("b")),
+        flight.do("b", lambda: _load("b")),
+    )
+
+    assert calls == ["a", "b", "b"]
+
+
+async def test_dao_reads_are_coalesced(_engine: AsyncEngine) -> None:
+    """Tests that equal reads of different sessions share detached rows."""
+    session_factory = async_sessionmaker(_engine)
+    async with session_factory() as first, session_factory() as second:
+        results = await asyncio.gather(
+            DummyDAO(first).get_dummy_rows(limit=10, offset=0),
+            DummyDAO(second).get_dummy_rows(limit=10, offset=0),
+        )
+
+        assert results[0] is results[1]
+        assert not first.identity_map
+        assert not second.identity_map
+
+
+async def test_entities_are_not_shared(_engine: AsyncEngine) -> None:
+    """Tests that every session reads its own entities with its own changes."""
+    session_factory = async_sessionmaker(_engine)
+    async with session_factory() as first, session_factory() as second:
+        await DummyDAO(second).create_dummy_model(name="uncommitted")
+        await second.flush()
+
+        results = await asyncio.gather(
+            DummyDAO(first).get_all_dummies(limit=10, offset=0),
+            DummyDAO(second).get_all_dummies(limit=10, offset=0),
+        )
+
+        assert not results[0]
+        assert [dummy.name for dummy in results[1]] == ["uncommitted"]
+        assert all(dummy in second for dummy in results[1])
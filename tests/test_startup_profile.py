@@ -0,0 +1,38 @@
+import io
+from typing import Any
+
+import pytest
+
+from planet_diseases_backend import startup_profile
+from planet_diseases_backend.startup_profile import ImportTime, parse_import_times
+
+
+def test_parse_import_times() -> None:
+    """Tests parsing of the interpreter's importtime output."""
+    output = (
+        "import time: self [us] | cumulative | imported package\n"
+        "import time:       120 |        120 |   ujson\n"
+        "import time:      3000 |       3120 | planet_diseases_backend.settings\n"
+        "unrelated line\n"
+    )
+
+    assert parse_import_times(output) == [
+        ImportTime("ujson", 120, 120),
+        ImportTime("planet_diseases_backend.settings", 3000, 3120),
+    ]
+
+
+def test_lifespan_is_skipped(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Tests that profiling doesn't touch the database unless it's asked to."""
+    monkeypatch.setattr(startup_profile, "measure_import_times", list)
+
+    def _run_lifespan(app: Any) -> None:
+        raise AssertionError("Lifespan must not run")
+
+    monkeypatch.setattr(startup_profile, "_run_lifespan", _run_lifespan)
+    out = io.StringIO()
+
+    startup_profile.profile_startup(out)
+
+    assert "get_app()" in out.getvalue()
+    assert "startup events" not in out.getvalue()
@@ -0,0 +1,44 @@
+from typing import Dict
+
+import pytest
+from prometheus_client import REGISTRY
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from planet_diseases_backend.db.dao.dummy_dao import DummyDAO
+
+pytestmark = pytest.mark.anyio
+
+
+def _cache_counters() -> Dict[str, float]:
+    return {
+        f"{name}_{result}": REGISTRY.get_sample_value(
+            f"db_{name}_cache_total",
+            {"result": result},
+        )
+        or 0.0
+        for name in ("compiled", "prepared_statement")
+        for result in ("hit", "miss")
+    }
+
+
+async def test_dao_queries_are_cached(dbsession: AsyncSession) -> None:
+    """Tests that repeated DAO queries skip compilation and preparation."""
+    dao = DummyDAO(dbsession)
+    for index in range(5):
+        await dao.create_dummy_model(name=f"cached-{index}")
+    await dbsession.flush()
+    await dao.get_all_dummies(limit=1, offset=0)
+    await dao.filter(name="cached-0")
+    before = _cache_counters()
+
+    page = await dao.get_all_dummies(limit=2, offset=3)
+    filtered = await dao.filter(name="cached-4")
+    after = _cache_counters()
+
+    # Parameters of lambda statements are substituted on every call.
+    assert [dummy.name for dummy in page] == ["cached-3", "cached-4"]
+    assert [dummy.name for dummy in filtered] == ["cached-4"]
+    assert after["compiled_hit"] - before["compiled_hit"] == 2
+    assert after["compiled_miss"] == before["compiled_miss"]
+    assert after["prepared_statement_hit"] - before["prepared_statement_hit"] == 2
+    assert after["prepared_statement_miss"] == before["prepared_statement_miss"]
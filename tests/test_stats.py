@@ -0,0 +1,179 @@
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+from typing import AsyncGenerator, Tuple
+
+import pytest
+import ujson
+from fastapi import FastAPI
+from httpx import AsyncClient
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from planet_diseases_backend.db.models.diagnosis_stats import DiagnosisStats
+from planet_diseases_backend.db.models.usage_event import UsageEvent
+from planet_diseases_backend.services.events import EventRecorder
+from planet_diseases_backend.services.shared_cache import SharedCache
+from planet_diseases_backend.services.stats import (
+    DIAGNOSIS,
+    StatsCache,
+    StatsSnapshot,
+    summarize,
+)
+
+pytestmark = pytest.mark.anyio
+
+NOW = datetime(2026, 10, 19, 12, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+async def stats_engine(_engine: AsyncEngine) -> AsyncGenerator[AsyncEngine, None]:
+    """
+    Engine for tests that commit statistics.
+
+    :param _engine: current engine.
+    :yield: engine, statistics and events are deleted after the test.
+    """
+    yield _engine
+    async with _engine.begin() as conn:
+        await conn.execute(delete(DiagnosisStats))
+        await conn.execute(delete(UsageEvent))
+
+
+def _diagnosis(
+    payload: object,
+    created_at: datetime = NOW,
+) -> Tuple[str, None, str, datetime]:
+    return (DIAGNOSIS, None, ujson.dumps(payload), created_at)
+
+
+def test_summarize() -> None:
+    """Tests that diagnoses are counted by day and normalized keys."""
+    yesterday = NOW - timedelta(days=1)
+    batch = [
+        _diagnosis({"crop": "Tomato ", "disease": "Blight", "region": "North"}),
+        _diagnosis({"crop": "tomato", "disease": "blight", "region": "north"}),
+        _diagnosis({"crop": "wheat", "disease": "rust"}, yesterday),
+        _diagnosis({"crop": "wheat"}),
+        _diagnosis(["wheat", "rust"]),
+        ("login", None, None, NOW),
+    ]
+
+    assert summarize(batch) == [
+        {
+            "day": date(2026, 10, 18),
+            "crop": "wheat",
+            "disease": "rust",
+            "region": "",
+            "count": 1,
+        },
+        {
+            "day": date(2026, 10, 19),
+            "crop": "tomato",
+            "disease": "blight",
+            "region": "north",
+            "count": 2,
+        },
+    ]
+
+
+async def test_recorder_counts_diagnoses(stats_engine: AsyncEngine) -> None:
+    """Tests that counters are incremented by every written batch."""
+    recorder = EventRecorder(
+        stats_engine,
+        queue_size=10,
+        batch_size=2,
+        flush_interval=0.05,
+    )
+    for _ in range(3):
+        recorder.record(DIAGNOSIS, payload={"crop": "apple", "disease": "scab"})
+    recorder.record("login")
+
+    await recorder.stop()
+
+    async with stats_engine.connect() as conn:
+        rows = await conn.execute(
+            select(DiagnosisStats.crop, DiagnosisStats.disease, DiagnosisStats.count),
+        )
+        assert [tuple(row) for row in rows] == [("apple", "scab", 3)]
+
+
+async def test_refresh_is_incremental(stats_engine: AsyncEngine) -> None:
+    """Tests that refreshes read changed rows and swap snapshots."""
+    today = datetime.now(timezone.utc).date()
+    async with stats_engine.begin() as conn:
+        await conn.execute(
+            insert(DiagnosisStats),
+            [
+                {
+                    "day": today - timedelta(days=age),
+                    "crop": "apple",
+                    "disease": "scab",
+                    "region": "",
+                    "count": 10,
+                }
+                for age in (0, 1, 5)
+            ],
+        )
+    cache = StatsCache(stats_engine, max_days=3, interval=60)
+
+    await cache.refresh()
+    first = cache.snapshot
+    assert first is not None
+    assert sorted(first.days) == [today - timedelta(days=1), today]
+
+    async with stats_engine.begin() as conn:
+        await conn.execute(
+            update(DiagnosisStats)
+            .where(DiagnosisStats.day == today)
+            .values(count=11, updated_at=datetime.now(timezone.utc)),
+        )
+    await cache.refresh()
+
+    assert cache.snapshot is not first
+    assert first.counts(3) == [(("apple", "scab", ""), 20)]
+    assert cache.snapshot is not None
+    assert cache.snapshot.counts(3) == [(("apple", "scab", ""), 21)]
+    assert cache.snapshot.counts(1) == [(("apple", "scab", ""), 11)]
+
+
+async def test_stats_api(
+    client: AsyncClient,
+    fastapi_app: FastAPI,
+    tmp_path: Path,
+) -> None:
+    """Tests that statistics are served from the snapshot."""
+    cache = StatsCache(None, max_days=30, interval=30)  # type: ignore[arg-type]
+    fastapi_app.state.stats_cache = cache
+    shared_cache = SharedCache(tmp_path / "cache.bin", slots=64, slot_size=4096)
+    fastapi_app.state.shared_cache = shared_cache
+    url = fastapi_app.url_path_for("get_diagnosis_stats")
+
+    assert (await client.get(url)).status_code == 503
+
+    cache.snapshot = StatsSnapshot(
+        {
+            date(2026, 10, 19): {
+                ("tomato", "blight", "north"): 2,
+                ("wheat", "rust", ""): 1,
+            },
+            date(2026, 10, 10): {("tomato", "blight", "north"): 5},
+        },
+        NOW,
+    )
+    week = await client.get(url, params={"days": 7})
+    tomato = await client.get(url, params={"days": 30, "crop": "Tomato"})
+    too_long = await client.get(url, params={"days": 31})
+
+    assert week.status_code == 200
+    assert week.json()["since"] == "2026-10-13"
+    assert week.json()["total"] == 3
+    assert [count["crop"] for count in week.json()["counts"]] == ["tomato", "wheat"]
+    assert tomato.json()["counts"] == [
+        {"crop": "tomato", "disease": "blight", "region": "north", "count": 7},
+    ]
+    assert too_long.status_code == 422
+
+    # Other workers get results of the first one until the next refresh.
+    cache.snapshot = StatsSnapshot({}, NOW)
+    assert (await client.get(url, params={"days": 7})).json() == week.json()
+    shared_cache.close()
@@ -0,0 +1,241 @@
+import asyncio
+import uuid
+from typing import Any, List, Tuple
+
+import pytest
+import ujson
+from fastapi import FastAPI
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from starlette.types import Message
+
+from planet_diseases_backend.db.models.users import User, get_jwt_strategy
+from planet_diseases_backend.services.notifications import (
+    NotificationHub,
+    TooManyStreamsError,
+    notify,
+)
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def hub(fastapi_app: FastAPI) -> NotificationHub:
+    """
+    Notification hub that isn't listening to the database.
+
+    :param fastapi_app: current application.
+    :return: hub used by the application.
+    """
+    fastapi_app.state.notification_hub = NotificationHub(
+        None,  # type: ignore
+        max_connections=2,
+        queue_size=3,
+    )
+    return fastapi_app.state.notification_hub
+
+
+@pytest.fixture
+async def user_token(dbsession: AsyncSession) -> Tuple[User, str]:
+    """
+    User with a JWT token.
+
+    :param dbsession: database session.
+    :return: user and token.
+    """
+    user = User(email="streamer@example.com", hashed_password="-")  # noqa: S106
+    dbsession.add(user)
+    await dbsession.flush()
+    return user, await get_jwt_strategy().write_token(user)
+
+
+async def _connect(
+    app: FastAPI,
+    scope_type: str,
+    path: str,
+    token: str,
+) -> Tuple["asyncio.Queue[Message]", asyncio.Event, "asyncio.Task[None]"]:
+    """
+    Calls the application with a connection that stays open.
+
+    :param app: application.
+    :param scope_type: "http" or "websocket".
+    :param path: requested path.
+    :param token: access token.
+    :return: sent messages, event that disconnects the client and the app task.
+    """
+    sent: "asyncio.Queue[Message]" = asyncio.Queue()
+    disconnected = asyncio.Event()
+    connected = False
+
+    async def receive() -> Message:
+        nonlocal connected
+        if scope_type == "websocket" and not connected:
+            connected = True
+            return {"type": "websocket.connect"}
+        await disconnected.wait()
+        return {"type": f"{scope_type}.disconnect", "code": 1000}
+
+    async def send(message: Message) -> None:
+        await sent.put(message)
+
+    scope = {
+        "type": scope_type,
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http" if scope_type == "http" else "ws",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": f"access_token={token}".encode(),
+        "headers": [(b"host", b"test")],
+        "server": ("test", 80),
+        "client": ("127.0.0.1", 5000),
+    }
+    task = asyncio.ensure_future(app(scope, receive, send))
+    return sent, disconnected, task
+
+
+async def _receive(sent: "asyncio.Queue[Message]") -> Message:
+    return await asyncio.wait_for(sent.get(), 2)
+
+
+async def test_hub_receives_notifications(_engine: AsyncEngine) -> None:
+    """Tests that committed notifications reach subscriptions of the user."""
+    hub = NotificationHub(_engine, max_connections=3, queue_size=10)
+    hub.start()
+    await asyncio.wait_for(hub.listening.wait(), 2)
+    user_id = uuid.uuid4()
+    first, second = hub.subscribe(user_id), hub.subscribe(user_id)
+    other = hub.subscribe(uuid.uuid4())
+
+    async with _engine.connect() as conn:
+        await notify(conn, user_id, {"type": "job", "state": "rolled back"})
+        await conn.rollback()
+        await notify(conn, user_id, {"type": "job", "state": "done"})
+        await conn.commit()
+
+    assert await asyncio.wait_for(first.get(), 2) == {"type": "job", "state": "done"}
+    assert await asyncio.wait_for(second.get(), 2) == {"type": "job", "state": "done"}
+    with pytest.raises(TooManyStreamsError):
+        hub.subscribe(user_id)
+    await hub.stop()
+    assert await other.get() is None
+    for subscription in (first, second, other):
+        subscription.close()
+    assert not hub.listening.is_set()
+
+
+async def test_slow_subscription_drops_oldest(hub: NotificationHub) -> None:
+    """Tests that a full queue keeps the newest events."""
+    subscription = hub.subscribe("user")
+    for index in range(5):
+        hub.dispatch("user", {"type": "result", "index": index})
+
+    events: List[Any] = [await subscription.get() for _ in range(3)]
+
+    assert [event["index"] for event in events] == [2, 3, 4]
+
+
+async def test_server_sent_events(
+    fastapi_app: FastAPI,
+    hub: NotificationHub,
+    user_token: Tuple[User, str],
+) -> None:
+    """Tests that events of the user are streamed as server-sent events."""
+    user, token = user_token
+    sent, disconnected, task = await _connect(
+        fastapi_app,
+        "http",
+        "/api/stream/events",
+        token,
+    )
+
+    start = await _receive(sent)
+    assert start["status"] == 200
+    assert (b"content-type", b"text/event-stream; charset=utf-8") in start["headers"]
+    assert (await _receive(sent))["body"] == b"retry: 5000\n\n"
+    hub.dispatch(str(user.id), {"type": "job", "state": "running"})
+    assert (await _receive(sent))["body"] == (
+        b'event: job\ndata: {"type":"job","state":"running"}\n\n'
+    )
+
+    disconnected.set()
+    await asyncio.wait_for(task, 2)
+    # The subscription is released when the client goes away.
+    assert hub.subscribe("user")
+    assert hub.subscribe("user")
+
+
+async def test_websocket(
+    fastapi_app: FastAPI,
+    hub: NotificationHub,
+    user_token: Tuple[User, str],
+) -> None:
+    """Tests that events are sent to websockets and the stream ends on stop."""
+    user, token = user_token
+    sent, _, task = await _connect(fastapi_app, "websocket", "/api/stream/ws", token)
+
+    assert (await _receive(sent))["type"] == "websocket.accept"
+    hub.dispatch(str(user.id), {"type": "result", "image": "a"})
+    message = await _receive(sent)
+    await hub.stop()
+
+    assert ujson.loads(message["text"]) == {"type": "result", "image": "a"}
+    assert await _receive(sent) == {
+        "type": "websocket.close",
+        "code": 1001,
+        "reason": "",
+    }
+    await asyncio.wait_for(task, 2)
+
+
+async def test_streams_require_token(
+    client: AsyncClient,
+    fastapi_app: FastAPI,
+    hub: NotificationHub,
+) -> None:
+    """Tests that streams reject clients without valid tokens."""
+    response = await client.get("/api/stream/events?access_token=invalid")
+    sent, _, task = await _connect(fastapi_app, "websocket", "/api/stream/ws", "")
+
+    assert response.status_code == 401
+    assert (await _receive(sent))["code"] == 1008
+    await asyncio.wait_for(task, 2)
+
+
+async def test_streams_are_limited(
+    client: AsyncClient,
+    hub: NotificationHub,
+    user_token: Tuple[User, str],
+) -> None:
+    """Tests that the worker rejects streams over the limit."""
+    hub.subscribe("a")
+    hub.subscribe("b")
+
+    response = await client.get(
+        "/api/stream/events",
+        headers={"Authorization": f"Bearer {user_token[1]}"},
+    )
+
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "5"
+
+
+async def test_streams_are_rejected_after_stop(
+    client: AsyncClient,
+    hub: NotificationHub,
+    user_token: Tuple[User, str],
+) -> None:
+    """Tests that a draining worker doesn't open streams that never end."""
+    await hub.stop()
+
+    response = await client.get(
+        "/api/stream/events",
+        headers={"Authorization": f"Bearer {user_token[1]}"},
+    )
+
+    assert response.status_code == 503
+    with pytest.raises(TooManyStreamsError):
+        hub.subscribe("user")
@@ -0,0 +1,207 @@
+import asyncio
+import uuid
+from datetime import datetime, time, timedelta, timezone
+from typing import AsyncGenerator
+
+import pytest
+from fastapi import FastAPI
+from httpx import AsyncClient
+from sqlalchemy import delete, insert, text, update
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+from planet_diseases_backend.db.dao.sync_dao import SyncDAO
+from planet_diseases_backend.db.models.dummy_model import DummyModel
+from planet_diseases_backend.db.models.sync_tombstone import SyncTombstone
+from planet_diseases_backend.db.models.usage_event import UsageEvent
+from planet_diseases_backend.db.models.users import User, current_active_user
+from planet_diseases_backend.db.partitions import add_months, partition_name
+
+pytestmark = pytest.mark.anyio
+
+USER_ID = uuid.uuid4()
+
+
+@pytest.fixture
+def user(fastapi_app: FastAPI) -> None:
+    """
+    Authenticates requests.
+
+    :param fastapi_app: current application.
+    """
+    fastapi_app.dependency_overrides[current_active_user] = lambda: User(
+        id=USER_ID,
+        email="field@example.com",
+    )
+
+
+@pytest.fixture
+async def sync_engine(_engine: AsyncEngine) -> AsyncGenerator[AsyncEngine, None]:
+    """
+    Engine for tests that commit changes.
+
+    :param _engine: current engine.
+    :yield: engine, rows and tombstones are deleted after the test.
+    """
+    yield _engine
+    async with _engine.begin() as conn:
+        await conn.execute(delete(DummyModel))
+        await conn.execute(delete(SyncTombstone))
+
+
+async def test_catalogue_changes(
+    client: AsyncClient,
+    dbsession: AsyncSession,
+    user: None,
+) -> None:
+    """Tests that pages contain changes and tombstones in order."""
+    await dbsession.execute(
+        insert(DummyModel),
+        [{"name": "apple"}, {"name": "tomato"}, {"name": "wheat"}],
+    )
+    await dbsession.execute(
+        update(DummyModel).where(DummyModel.name == "apple").values(name="pear"),
+    )
+    await dbsession.execute(delete(DummyModel).where(DummyModel.name == "tomato"))
+
+    first = await client.get("/api/sync/catalogue", params={"limit": 2})
+    second = await client.get(
+        "/api/sync/catalogue",
+        params={"since": first.json()["next"]},
+    )
+    last = await client.get(
+        "/api/sync/catalogue",
+        params={"since": second.json()["next"]},
+    )
+
+    assert first.json()["has_more"]
+    assert not second.json()["has_more"]
+    changes = first.json()["changes"] + second.json()["changes"]
+    assert [change["seq"] for change in changes] == sorted(
+        change["seq"] for change in changes
+    )
+    assert [
+        (change["data"] or {}).get("name", change["deleted"]) for change in changes
+    ] == ["wheat", "pear", True]
+    assert last.json() == {
+        "changes": [],
+        "next": second.json()["next"],
+        "has_more": False,
+    }
+
+
+async def test_diagnosis_changes(
+    client: AsyncClient,
+    dbsession: AsyncSession,
+    user: None,
+) -> None:
+    """Tests that users get only their own diagnoses."""
+    await dbsession.execute(
+        insert(UsageEvent),
+        [
+            {"kind": "diagnosis", "user_id": USER_ID, "payload": {"crop": "apple"}},
+            {"kind": "login", "user_id": USER_ID},
+            {"kind": "diagnosis", "user_id": uuid.uuid4(), "payload": {}},
+        ],
+    )
+
+    response = await client.get("/api/sync/diagnoses")
+
+    changes = response.json()["changes"]
+    assert len(changes) == 1
+    assert changes[0]["data"]["payload"] == {"crop": "apple"}
+    assert response.json()["next"] == changes[0]["seq"]
+
+
+async def test_diagnosis_changes_prune_partitions(dbsession: AsyncSession) -> None:
+    """Tests that partitions before the client's last diagnosis aren't read."""
+    this_month = datetime.now(timezone.utc).date().replace(day=1)
+    later = datetime.combine(add_months(this_month, 2), time(1), timezone.utc)
+    # The second diagnosis happened earlier, but was written later.
+    rows = await dbsession.execute(
+        insert(UsageEvent).returning(
+            UsageEvent.change_seq,
+            sort_by_parameter_order=True,
+        ),
+        [
+            {"kind": "diagnosis", "user_id": USER_ID, "created_at": later},
+            {
+                "kind": "diagnosis",
+                "user_id": USER_ID,
+                "created_at": later - timedelta(hours=2),
+            },
+        ],
+    )
+    first, second = rows.scalars().all()
+    assert first is not None
+    query = SyncDAO.diagnosis_query(USER_ID, first, 10, timedelta(hours=3))
+
+    changes = await dbsession.execute(query)
+    plan = await dbsession.execute(
+        text(
+            "EXPLAIN (ANALYZE, COSTS OFF, TIMING OFF, SUMMARY OFF) "
+            + str(
+                query.compile(
+                    dialect=postgresql.dialect(),
+                    compile_kwargs={"literal_binds": True},
+                ),
+            ),
+        ),
+    )
+
+    assert [change.change_seq for change in changes] == [second]
+    lines = list(plan.scalars())
+    current = partition_name(UsageEvent.__tablename__, this_month)
+    assert any(current in line and "never executed" in line for line in lines)
+
+
+async def test_large_pages_are_compressed(
+    client: AsyncClient,
+    dbsession: AsyncSession,
+    user: None,
+) -> None:
+    """Tests that pages are compressed if the client accepts gzip."""
+    await dbsession.execute(
+        insert(DummyModel),
+        [{"name": f"crop-{index}"} for index in range(100)],
+    )
+
+    compressed = await client.get(
+        "/api/sync/catalogue",
+        headers={"Accept-Encoding": "gzip"},
+    )
+    plain = await client.get(
+        "/api/sync/catalogue",
+        headers={"Accept-Encoding": "identity"},
+    )
+
+    assert compressed.headers["content-encoding"] == "gzip"
+    assert int(compressed.headers["content-length"]) < len(plain.content)
+    assert compressed.json() == plain.json()
+    assert "content-encoding" not in plain.headers
+
+
+async def test_writers_commit_in_sequence_order(sync_engine: AsyncEngine) -> None:
+    """Tests that a writer waits until the previous one commits."""
+    async with sync_engine.connect() as first, sync_engine.connect() as second:
+        await first.begin()
+        first_seq = await first.scalar(
+            insert(DummyModel).values(name="first").returning(DummyModel.change_seq),
+        )
+
+        async def _write_second() -> int:
+            async with second.begin():
+                return await second.scalar(  # type: ignore[return-value]
+                    insert(DummyModel)
+                    .values(name="second")
+                    .returning(DummyModel.change_seq),
+                )
+
+        writing = asyncio.ensure_future(_write_second())
+        await asyncio.sleep(0.2)
+        assert not writing.done()
+
+        await first.commit()
+        second_seq = await writing
+
+    assert second_seq > first_seq  # type: ignore[operator]
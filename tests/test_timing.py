@@ -0,0 +1,45 @@
+import pytest
+from fastapi import FastAPI
+from httpx import AsyncClient
+from starlette import status
+
+from planet_diseases_backend.db.instrumentation import normalize_statement
+from planet_diseases_backend.settings import settings
+
+
+def test_normalize_statement() -> None:
+    """Tests that statements differing only by values are normalized equally."""
+    first = normalize_statement(
+        "SELECT * FROM dummy_model\n WHERE id IN ($1, $2, $3) AND name = 'a'",
+    )
+    second = normalize_statement(
+        "SELECT * FROM dummy_model WHERE id IN ($1) AND name = 'b''c' LIMIT 10",
+    )
+
+    assert first == "SELECT * FROM dummy_model WHERE id IN (?) AND name = ?"
+    assert second == first + " LIMIT ?"
+    assert normalize_statement(
+        "SELECT id FROM users WHERE email IN ($1::VARCHAR, $2::VARCHAR)",
+    ) == normalize_statement("SELECT id FROM users WHERE email IN ($1::VARCHAR)")
+    assert normalize_statement(
+        "INSERT INTO t (a, b) VALUES ($1::INTEGER, $2), ($3::INTEGER, $4)",
+    ) == normalize_statement("INSERT INTO t (a, b) VALUES ($1::INTEGER, $2)")
+
+
+@pytest.mark.anyio
+async def test_server_timing(
+    fastapi_app: FastAPI,
+    client: AsyncClient,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Tests that request stages are reported in Server-Timing header."""
+    monkeypatch.setattr(settings, "server_timing_enabled", True)
+    url = fastapi_app.url_path_for("get_dummy_models")
+    response = await client.get(url)
+
+    assert response.status_code == status.HTTP_200_OK
+    stages = {
+        metric.split(";")[0].strip()
+        for metric in response.headers["Server-Timing"].split(",")
+    }
+    assert {"db", "handler", "dependencies", "serialize", "total"} <= stages
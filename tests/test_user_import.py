@@ -0,0 +1,289 @@
+import uuid
+from typing import Any, AsyncIterator, Dict, List
+
+import pytest
+from fastapi import FastAPI
+from httpx import AsyncClient
+from sqlalchemy import select, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from planet_diseases_backend.db.dao.user_dao import UserDAO
+from planet_diseases_backend.db.models.users import (
+    User,
+    current_superuser,
+    email_key,
+    get_jwt_strategy,
+)
+from planet_diseases_backend.services.user_import import iter_lines
+from planet_diseases_backend.settings import settings
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def admin(fastapi_app: FastAPI) -> None:
+    """
+    Authenticates requests as a superuser.
+
+    :param fastapi_app: current application.
+    """
+    fastapi_app.dependency_overrides[current_superuser] = lambda: User(
+        id=uuid.uuid4(),
+        email="admin@example.com",
+        is_superuser=True,
+    )
+
+
+def _user(email: str, **fields: Any) -> User:
+    return User(email=email, hashed_password="-", **fields)  # noqa: S106
+
+
+async def _add_users(dbsession: AsyncSession, users: List[User]) -> None:
+    dbsession.add_all(users)
+    await dbsession.flush()
+
+
+async def test_import_csv(
+    client: AsyncClient,
+    dbsession: AsyncSession,
+    admin: None,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Tests that taken, repeated and invalid lines are skipped."""
+    monkeypatch.setattr(settings, "users_import_batch_size", 2)
+    await _add_users(
+        dbsession,
+        [_user("taken@example.com")],
+    )
+    upload = (
+        "email,password,is_superuser,is_verified\r\n"
+        "New@Example.com,secret,true,true\r\n"
+        "TAKEN@example.com,secret,false,false\r\n"
+        "new@example.com,secret,false,false\r\n"
+        "not-an-email,secret,false,false\r\n"
+        "other@example.com,secret\r\n"
+        "other@example.com,secret,false,false\r\n"
+    )
+
+    response = await client.post(
+        "/api/users/import",
+        content=upload.encode(),
+        headers={"Content-Type": "text/csv; charset=utf-8"},
+    )
+
+    assert response.status_code == 200
+    report = response.json()
+    assert report["created"] == 2
+    assert report["skipped"] == 2
+    assert report["invalid"] == 2
+    assert [error["line"] for error in report["errors"]] == [5, 6]
+    rows = await dbsession.execute(
+        select(User).where(email_key.in_(["new@example.com", "other@example.com"])),
+    )
+    users = {user.email.lower(): user for user in rows.scalars()}
+    assert not users["new@example.com"].is_superuser
+    assert users["new@example.com"].is_verified
+    assert users["other@example.com"].hashed_password.startswith("$argon2")
+
+
+async def test_import_csv_with_quoted_line_breaks(
+    client: AsyncClient,
+    admin: None,
+) -> None:
+    """Tests that quoted fields may span lines."""
+    upload = (
+        "email,password\n"
+        'multiline@example.com,"first ""line""\nsecond line"\n'
+        "not-an-email,secret\n"
+    )
+
+    response = await client.post(
+        "/api/users/import",
+        content=upload.encode(),
+        headers={"Content-Type": "text/csv"},
+    )
+
+    assert response.json()["created"] == 1
+    assert [error["line"] for error in response.json()["errors"]] == [4]
+
+
+async def test_import_ndjson(
+    client: AsyncClient,
+    admin: None,
+) -> None:
+    """Tests that JSON lines are imported."""
+    upload = (
+        b'{"email": "json@example.com", "password": "secret"}\n'
+        b"[1, 2]\n"
+        b"\n"
+        b"{broken"
+    )
+
+    response = await client.post(
+        "/api/users/import",
+        content=upload,
+        headers={"Content-Type": "application/x-ndjson"},
+    )
+
+    assert response.status_code == 200
+    assert response.json()["created"] == 1
+    assert response.json()["invalid"] == 2
+
+
+async def test_import_skips_long_records(
+    client: AsyncClient,
+    admin: None,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Tests that records over the limit are reported without buffering."""
+    monkeypatch.setattr(settings, "users_import_max_record_length", 100)
+    upload = (
+        "email,password\n"
+        'open@example.com,"' + "x\n" * 20_000 + '"\n'
+        "first@example.com,secret\n"
+        "long@example.com," + "x" * 200 + "\n"
+        "second@example.com,secret\n"
+    )
+
+    csv_response = await client.post(
+        "/api/users/import",
+        content=upload.encode(),
+        headers={"Content-Type": "text/csv"},
+    )
+    ndjson_response = await client.post(
+        "/api/users/import",
+        content=b'{"email": "' + b"x" * 200 + b'"}\n{"email": "a@example.com"',
+        headers={"Content-Type": "application/x-ndjson"},
+    )
+
+    assert csv_response.json()["created"] == 2
+    errors = csv_response.json()["errors"]
+    assert [error["line"] for error in errors] == [2, 20_004]
+    assert errors[0]["error"] == "Record exceeds 100 characters"
+    assert [error["line"] for error in ndjson_response.json()["errors"]] == [1, 2]
+
+
+async def test_long_lines_are_dropped() -> None:
+    """Tests that lines over the limit are dropped across chunks."""
+
+    async def chunks() -> AsyncIterator[bytes]:
+        for chunk in (b"short\nlo", b"ng", b" line\r\nend\r\n", b"x" * 9):
+            yield chunk
+
+    lines = [line async for line in iter_lines(chunks(), max_length=5)]
+
+    assert lines == ["short", None, "end", None]
+
+
+async def test_import_unsupported_format(client: AsyncClient, admin: None) -> None:
+    """Tests that unknown formats are rejected."""
+    response = await client.post(
+        "/api/users/import",
+        content=b"<users/>",
+        headers={"Content-Type": "application/xml"},
+    )
+
+    assert response.status_code == 415
+
+
+async def test_admin_routes_require_superuser(
+    client: AsyncClient,
+    dbsession: AsyncSession,
+) -> None:
+    """Tests that regular users can't import or search users."""
+    user = _user("user@example.com")
+    await _add_users(dbsession, [user])
+    token = await get_jwt_strategy().write_token(user)
+    headers = {"Authorization": f"Bearer {token}"}
+
+    anonymous = await client.get("/api/users/search")
+    search = await client.get("/api/users/search", headers=headers)
+    upload = await client.post(
+        "/api/users/import",
+        content=b"",
+        headers={**headers, "Content-Type": "text/csv"},
+    )
+
+    assert anonymous.status_code == 401
+    assert search.status_code == upload.status_code == 403
+
+
+async def test_search(
+    client: AsyncClient,
+    dbsession: AsyncSession,
+    admin: None,
+) -> None:
+    """Tests prefix search, filters and keyset pagination."""
+    await _add_users(
+        dbsession,
+        [
+            _user("Ann@example.com"),
+            _user("anna@example.com", is_verified=True),
+            _user("andy@example.com", is_active=False),
+            _user("bob@example.com"),
+        ],
+    )
+
+    first = await client.get("/api/users/search", params={"email": "AN", "limit": 2})
+    second = await client.get(
+        "/api/users/search",
+        params={"email": "an", "after": first.json()[-1]["email"]},
+    )
+    pending = await client.get(
+        "/api/users/search",
+        params={"email": "an", "is_verified": False, "is_active": True},
+    )
+
+    assert [user["email"] for user in first.json()] == [
+        "andy@example.com",
+        "Ann@example.com",
+    ]
+    assert [user["email"] for user in second.json()] == ["anna@example.com"]
+    assert [user["email"] for user in pending.json()] == ["Ann@example.com"]
+
+
+@pytest.mark.parametrize("last", ["\ud7ff", "\U0010ffff"])
+async def test_search_prefix_with_last_characters(
+    dbsession: AsyncSession,
+    last: str,
+) -> None:
+    """Tests prefixes ending with characters that can't be incremented."""
+    await _add_users(dbsession, [_user(f"a{last}@example.com"), _user("b@example.com")])
+
+    users = await UserDAO(dbsession).search(email=f"a{last}")
+
+    assert [user.email for user in users] == [f"a{last}@example.com"]
+
+
+@pytest.mark.parametrize(
+    ("filters", "index"),
+    [
+        ({}, "ix_user_email_key"),
+        ({"is_verified": False}, "ix_user_pending_email_key"),
+    ],
+)
+async def test_search_uses_index(
+    dbsession: AsyncSession,
+    filters: Dict[str, Any],
+    index: str,
+) -> None:
+    """Tests that searches are planned with email key indexes."""
+    await _add_users(
+        dbsession,
+        [
+            # Pending users are a small part of all users.
+            _user(f"user{number}@example.com", is_verified=number % 10 > 0)
+            for number in range(1000)
+        ],
+    )
+    await dbsession.execute(text('ANALYZE "user"'))
+    # Tiny tables are scanned sequentially anyway.
+    await dbsession.execute(text("SET LOCAL enable_seqscan = off"))
+    query = UserDAO.search_query(email="user1", **filters).compile(
+        dialect=postgresql.dialect(),
+        compile_kwargs={"literal_binds": True},
+    )
+    plan = await dbsession.execute(text(f"EXPLAIN {query}"))
+
+    assert index in "\n".join(plan.scalars())